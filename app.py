@@ -1,92 +1,128 @@
-import os
 import logging
-from datetime import timedelta
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from assets import init_assets
+from cache import cache
+from compression import init_compression
+from images import init_images
+from config import default_profile, get_config
+from db_pool import engine_options
+from logging_setup import configure_logging
+from replica import REPLICA_BIND, RoutingSession
+from streaming import init_streaming
+from template_cache import configure_bytecode_cache
+from vendor import init_vendor
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 mail = Mail()
 login_manager = LoginManager()
-
-# create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "brunnsbo-musikklasser-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# CSRF and Session Configuration for Safari compatibility
-app.config['WTF_CSRF_TIME_LIMIT'] = None  # No time limit for CSRF tokens
-app.config['SESSION_COOKIE_SECURE'] = False  # Allow HTTP for development
-app.config['SESSION_COOKIE_HTTPONLY'] = False  # Allow JavaScript access for debugging
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Allow cross-site requests with proper referrer
-app.config['WTF_CSRF_SSL_STRICT'] = False  # Allow CSRF over HTTP for development
-app.config['SESSION_PERMANENT'] = True  # Make sessions permanent
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)  # Default 24 hour session lifetime
-app.config['WTF_CSRF_CHECK_DEFAULT'] = False  # Disable default CSRF for debugging
-app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=365)  # Remember me duration: 1 year
-
-# configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "postgresql://localhost/brunnsbo_musikklasser")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Mail configuration - configured for external SMTP (Gmail/SendGrid)
-app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', '587'))
-app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
-app.config['MAIL_USE_SSL'] = os.environ.get('MAIL_USE_SSL', 'false').lower() in ['true', 'on', '1']
-app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
-
-# Swish m-commerce payment configuration
-app.config['SWISH_TEST_MODE'] = os.environ.get('SWISH_TEST_MODE', 'true').lower() == 'true'
-app.config['SWISH_PAYEE_ALIAS'] = os.environ.get('SWISH_PAYEE_ALIAS', '123268258')  # Brunnsbo Musikklasser Swish number
-app.config['SWISH_CERT_PATH'] = os.environ.get('SWISH_CERT_PATH')
-app.config['SWISH_CERT_PASSWORD'] = os.environ.get('SWISH_CERT_PASSWORD')
-app.config['SWISH_CA_CERT_PATH'] = os.environ.get('SWISH_CA_CERT_PATH')
-
-# initialize the app with extensions
-db.init_app(app)
-mail.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 login_manager.login_message = 'Du måste logga in för att komma åt denna sida.'
 
-with app.app_context():
-    # Import models and routes
-    import models
-    import routes
-    
-    # Set up user loader for Flask-Login
-    @login_manager.user_loader
-    def load_user(user_id):
-        try:
-            user = models.User.query.get(int(user_id))
-            logging.debug(f"Loading user {user_id}: {user is not None}")
-            if user:
-                logging.debug(f"User {user_id} active: {user.active}")
-            return user
-        except Exception as e:
-            logging.error(f"Error loading user {user_id}: {e}")
-            return None
-    
-    # Create all tables
-    db.create_all()
-
-# Enable debug mode for development
-app.debug = True
+user_loader_log = logging.getLogger('app.user_loader')
+
+
+# Set up user loader for Flask-Login
+@login_manager.user_loader
+def load_user(user_id):
+    from identity import load_identity
+    try:
+        user = load_identity(int(user_id))
+        user_loader_log.debug("Loading user %s: found=%s active=%s",
+                              user_id, user is not None, user.active if user else None)
+        return user
+    except Exception as e:
+        user_loader_log.error("Error loading user %s: %s", user_id, e)
+        return None
+
+
+def create_app(profile=None):
+    """
+    Application factory.
+
+    Importing this module builds nothing; models, routes and blueprints are
+    imported here so a worker only pays for them when it actually creates the
+    app. Production skips db.create_all() - run `flask db upgrade` instead.
+    """
+    started = time.perf_counter()
+    profile = profile or default_profile()
+    config = get_config(profile)
+
+    # create the app
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config['APP_PROFILE'] = profile
+    if app.config.get('DB_POOL_PROFILE'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['DB_POOL_PROFILE'])
+    if app.config.get('REPLICA_DATABASE_URI'):
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: {'url': app.config['REPLICA_DATABASE_URI'],
+                           **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})},
+        }
+    configure_logging(app)
+    configure_bytecode_cache(app)
+    init_assets(app)
+    init_images(app)
+    init_vendor(app)
+    init_streaming(app)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    init_compression(app)
+
+    # initialize the app with extensions
+    db.init_app(app)
+    mail.init_app(app)
+    login_manager.init_app(app)
+    cache.init_app(app)
+
+    with app.app_context():
+        # Import models and routes
+        import models  # noqa: F401
+        import identity  # noqa: F401 - registers cache invalidation hooks
+        import homepage  # noqa: F401 - registers cache invalidation hooks
+        from routes import main
+        from google_auth import google_auth
+        from migrations import db_cli
+        from template_cache import templates_cli
+        from assets import assets, assets_cli
+        from images import images_command
+        from vendor import vendor_command
+        from instagram import instagram, instagram_cli
+
+        app.register_blueprint(main)
+        app.register_blueprint(google_auth, url_prefix='/auth')
+        app.register_blueprint(assets)
+        app.register_blueprint(instagram)
+        app.cli.add_command(db_cli)
+        app.cli.add_command(templates_cli)
+        assets_cli.add_command(images_command)
+        assets_cli.add_command(vendor_command)
+        app.cli.add_command(assets_cli)
+        app.cli.add_command(instagram_cli)
+
+        if app.config['AUTO_CREATE_SCHEMA']:
+            db.create_all()
+
+    app.debug = app.config['DEBUG']
+
+    startup_ms = (time.perf_counter() - started) * 1000
+    app.config['STARTUP_TIME_MS'] = round(startup_ms, 1)
+    if startup_ms > app.config['STARTUP_BUDGET_MS']:
+        app.logger.warning(f"App startup ({profile}) took {startup_ms:.1f} ms, "
+                           f"over the {app.config['STARTUP_BUDGET_MS']} ms budget")
+    else:
+        app.logger.info(f"App startup ({profile}) took {startup_ms:.1f} ms")
+
+    return app
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app('development').run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,210 @@
+"""
+Fingerprinted, precompressed static assets
+
+`flask --app main assets build` copies every file under static/ (except the
+output directory itself) to static/dist/ with a content hash in its name,
+e.g. css/style.css -> css/style.3f2a9c1b7d4e.css, writes gzip and brotli
+variants of text assets next to it, and records the mapping in
+static/dist/manifest.json. Relative url() references in stylesheets (fonts,
+images) are rewritten to the fingerprinted names, so a changed font also
+changes the name of the stylesheet that loads it.
+
+Templates call asset_url('css/style.css'). With ASSETS_USE_MANIFEST enabled
+and a manifest present, that resolves to /assets/css/style.<hash>.css, served
+by this module with the best precompressed variant the browser accepts and a
+one-year immutable Cache-Control. A changed file gets a new name, so browsers
+never need to revalidate. Without a manifest (development) asset_url() falls
+back to the plain static URL.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped; gzip still works
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.ico')
+# Variants in order of preference: (Accept-Encoding token, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+assets = Blueprint('assets', __name__)
+
+
+def fingerprint(path):
+    """Short content hash of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(logical_path, digest):
+    root, ext = os.path.splitext(logical_path)
+    return f'{root}.{digest}{ext}'
+
+
+def compress(path):
+    """Write .gz (and .br if available) next to a file; returns the variant paths"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = []
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 keeps the output byte-identical between builds
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    variants.append(path + '.gz')
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        variants.append(path + '.br')
+    return variants
+
+
+def iter_sources(static_folder):
+    """Logical paths (relative, forward slashes) of all source assets"""
+    for root, dirs, files in os.walk(static_folder):
+        relative_root = os.path.relpath(root, static_folder)
+        if relative_root == '.':
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            yield os.path.normpath(os.path.join(relative_root, name)).replace(os.sep, '/')
+
+
+def rewrite_css_urls(css, logical_path, manifest):
+    """Point relative url() references of a stylesheet at fingerprinted files"""
+    directory = posixpath.dirname(logical_path)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        referenced = posixpath.normpath(posixpath.join(directory, path))
+        if referenced not in manifest:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(manifest[referenced], directory)}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def build_assets(static_folder, output_dir=None):
+    """Fingerprint and precompress every asset; returns the manifest"""
+    output_dir = output_dir or os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    manifest = {}
+    # Stylesheets last, so the files they reference already have their names
+    for logical_path in sorted(iter_sources(static_folder), key=lambda path: path.endswith('.css')):
+        source = os.path.join(static_folder, logical_path)
+        if logical_path.endswith('.css'):
+            with open(source, encoding='utf-8') as f:
+                data = rewrite_css_urls(f.read(), logical_path, manifest).encode('utf-8')
+            target_name = hashed_name(logical_path, hashlib.sha256(data).hexdigest()[:HASH_LENGTH])
+        else:
+            target_name = hashed_name(logical_path, fingerprint(source))
+        target = os.path.join(output_dir, target_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if logical_path.endswith('.css'):
+            with open(target, 'wb') as f:
+                f.write(data)
+        else:
+            shutil.copyfile(source, target)
+        if logical_path.endswith(COMPRESSIBLE):
+            compress(target)
+        manifest[logical_path] = target_name
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(app):
+    """Read the manifest for an app, or None if assets have not been built"""
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def asset_url(logical_path):
+    """URL of an asset: fingerprinted when built, plain static otherwise"""
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest and logical_path in manifest:
+        return url_for('assets.asset', filename=manifest[logical_path])
+    return url_for('static', filename=logical_path)
+
+
+def init_assets(app):
+    """Load the manifest once and expose asset_url() to templates"""
+    manifest = load_manifest(app) if app.config.get('ASSETS_USE_MANIFEST') else None
+    if app.config.get('ASSETS_USE_MANIFEST') and manifest is None:
+        app.logger.warning("ASSETS_USE_MANIFEST is set but no manifest was found - "
+                           "run `flask assets build`; serving unversioned assets")
+    app.extensions['asset_manifest'] = manifest
+    app.add_template_global(asset_url)
+
+
+def accepted_encodings():
+    """Content codings the client accepts (quality > 0)"""
+    return {value for value, quality in request.accept_encodings if quality > 0}
+
+
+@assets.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a fingerprinted asset, precompressed when the client allows"""
+    directory = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding, served = None, filename
+    if filename.endswith(COMPRESSIBLE):
+        accepted = accepted_encodings()
+        for token, suffix in ENCODINGS:
+            if token in accepted and os.path.isfile(os.path.join(directory, filename + suffix)):
+                encoding, served = token, filename + suffix
+                break
+
+    response = send_from_directory(directory, served, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(COMPRESSIBLE):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+@click.group('assets')
+def assets_cli():
+    """Static asset pipeline"""
+
+
+@assets_cli.command('build')
+@with_appcontext
+def build_command():
+    """Fingerprint and precompress static files into static/dist"""
+    manifest = build_assets(current_app.static_folder)
+    if brotli is None:
+        click.echo('brotli is not installed - only gzip variants were written.')
+    click.echo(f'Built {len(manifest)} assets into {os.path.join(current_app.static_folder, DIST_DIR)}')
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for Brunnsbo Musikklasser
+
+Usage: python benchmarks.py <benchmark> [options]
+"""
+import argparse
+import sys
+
+
+def bench_passwords(args):
+    """Password verification throughput (logins per second per core)"""
+    from passwords import benchmark, DEFAULT_METHOD
+
+    methods = args.method or [DEFAULT_METHOD, 'scrypt:16384:8:1', 'pbkdf2:sha256:600000']
+    print(f"{'Method':<28} {'Verify (ms)':>12} {'Logins/s/core':>14}")
+    for method in methods:
+        result = benchmark(method, rounds=args.rounds)
+        print(f"{result['method']:<28} {result['verify_ms']:>12.1f} "
+              f"{result['logins_per_second_per_core']:>14.1f}")
+
+
+def bench_permissions(args):
+    """Role check: has_role scan vs bitmask, and per-request cost of the decorators"""
+    import time
+    import timeit
+    from sqlalchemy.orm import selectinload
+    from app import create_app, db
+    from config import TestConfig
+    from identity import identity_cache, load_identity
+    from models import Group, User
+    from permissions import admin_required, requires_any_role, role_mask
+
+    TestConfig.LOG_LEVEL = 'CRITICAL'
+    app = create_app('test')
+
+    def view():
+        return 'ok'
+
+    app.add_url_rule('/bench/open', 'bench_open', view)
+    app.add_url_rule('/bench/admin', 'bench_admin', admin_required(view))
+    app.add_url_rule('/bench/any-role', 'bench_any_role',
+                     requires_any_role('admin', 'event_manager', 'parent')(view))
+
+    with app.app_context():
+        user = User(first_name='Bench', last_name='Admin', email='admin@example.com', password_hash='-')
+        user.groups = [Group(name='parent'), Group(name='admin')]
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        # The check itself, as the decorators ran it before and after the role
+        # bitmask: has_role() over the User's loaded groups for each required
+        # role, against one AND with the mask of a warm cached identity
+        db.session.expunge_all()
+        user = db.session.scalars(db.select(User).options(selectinload(User.groups))
+                                  .filter_by(id=user_id)).one()
+        identity = load_identity(user_id)
+        identity = load_identity(user_id)  # from the identity cache
+        print(f"{'Required roles':<44} {'has_role scan ns':>17} {'bitmask ns':>11}")
+        for required in (('admin',), ('applications_manager', 'event_manager', 'parent')):
+            required_mask = role_mask(required)
+
+            def scan_check():
+                return any(user.has_role(role) for role in required)
+
+            def mask_check():
+                return bool(identity.role_mask & required_mask)
+
+            assert scan_check() and mask_check()
+            scan, mask = (min(timeit.repeat(check, number=args.number, repeat=5)) / args.number * 1e9
+                          for check in (scan_check, mask_check))
+            print(f"{', '.join(required):<44} {scan:>17.1f} {mask:>11.1f}")
+        print()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    def timed(path, cold):
+        timings = []
+        for _ in range(args.requests):
+            if cold:
+                identity_cache.invalidate()
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - started)
+            # Denied requests would flash into the session and grow the cookie
+            assert response.status_code == 200, response.status_code
+        timings.sort()
+        return timings[len(timings) // 2] * 1e6
+
+    # Every request goes through the Flask-Login user loader (load_identity)
+    # and the decorator; /bench/open is the same request without either
+    baseline = timed('/bench/open', cold=False)
+    print(f"{'Request':<30} {'Median us':>10} {'Overhead us':>12}")
+    print(f"{'undecorated':<30} {baseline:>10.1f} {0:>12.1f}")
+    for label, path, cold in (('admin_required', '/bench/admin', False),
+                              ('requires_any_role', '/bench/any-role', False),
+                              ('requires_any_role, cold cache', '/bench/any-role', True)):
+        median = timed(path, cold)
+        print(f"{label:<30} {median:>10.1f} {median - baseline:>12.1f}")
+
+
+def bench_templates(args):
+    """First-request latency of a fresh worker with and without template bytecode cache"""
+    import tempfile
+    import time
+    from app import create_app
+    from config import TestConfig
+    from template_cache import compile_templates
+
+    cache_dir = tempfile.mkdtemp(prefix='jinja_cache_')
+    modes = (
+        ('no cache', False, False),
+        ('bytecode (cold)', True, True),
+        ('bytecode (warm)', True, False),
+    )
+
+    def fresh_app(enabled, clear):
+        TestConfig.TEMPLATE_BYTECODE_CACHE = enabled
+        TestConfig.TEMPLATE_CACHE_DIR = cache_dir
+        TestConfig.LOG_LEVEL = 'CRITICAL'
+        app = create_app('test')
+        if clear:
+            app.jinja_env.bytecode_cache.clear()
+        return app
+
+    print(f"{'Mode':<18} {'Compile all (ms)':>17} {'First GET / (ms)':>17}")
+    for label, enabled, clear in modes:
+        compile_times, request_times = [], []
+        for _ in range(args.rounds):
+            client = fresh_app(enabled, clear).test_client()
+            started = time.perf_counter()
+            client.get('/')
+            request_times.append((time.perf_counter() - started) * 1000)
+
+            app = fresh_app(enabled, clear)
+            started = time.perf_counter()
+            compile_templates(app)
+            compile_times.append((time.perf_counter() - started) * 1000)
+        print(f"{label:<18} {min(compile_times):>17.1f} {min(request_times):>17.1f}")
+
+
+def bench_compression(args):
+    """Compression ratio and CPU time of rendered pages per gzip level / brotli quality"""
+    import time
+    from app import create_app
+    from config import TestConfig
+    from compression import BrotliEncoder, GzipEncoder, brotli
+
+    TestConfig.LOG_LEVEL = 'CRITICAL'
+    app = create_app('test')
+    client = app.test_client()
+    pages = {path: client.get(path).get_data() for path in args.path}
+
+    settings = [('gzip', level) for level in (1, 4, 6, 9)]
+    if brotli is not None:
+        settings += [('br', quality) for quality in (1, 4, 6, 9, 11)]
+    print(f"{'Page':<14} {'Size':>8} {'Encoding':<9} {'Out':>8} {'Ratio':>6} {'ms':>7}")
+    for path, body in pages.items():
+        for encoding, level in settings:
+            timings = []
+            for _ in range(args.rounds):
+                encoder = GzipEncoder(level) if encoding == 'gzip' else BrotliEncoder(level)
+                started = time.perf_counter()
+                out = encoder.chunk(body) + encoder.finish()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{path:<14} {len(body):>8} {encoding + ' ' + str(level):<9} {len(out):>8} "
+                  f"{len(out) / len(body):>6.3f} {min(timings):>7.2f}")
+
+
+def bench_streaming(args):
+    """Time to first byte and peak memory of /admin/events, streamed vs fully rendered"""
+    import time
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from flask import render_template
+    from flask_login import login_user
+    from sqlalchemy import insert, select
+    from app import create_app, db
+    from config import TestConfig
+    from models import Event, Group, User
+    from streaming import stream_page, stream_rows
+
+    TestConfig.LOG_LEVEL = 'CRITICAL'
+    app = create_app('test')
+    with app.app_context():
+        admin = User(first_name='Bench', last_name='Admin', email='admin@example.com', password_hash='-')
+        admin.groups.append(Group(name='admin'))
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+        started = datetime(2015, 1, 1)
+        db.session.execute(insert(Event), [{
+            'title': f'Konsert {number}', 'location': 'Aulan', 'is_active': True,
+            'event_date': started + timedelta(days=number), 'created_at': started,
+        } for number in range(args.rows)])
+        db.session.commit()
+        statement = select(Event).order_by(Event.event_date.desc())
+
+        def buffered():
+            events = db.session.scalars(statement).all()
+            return [render_template('admin_events.html', events=events)]
+
+        def streamed():
+            return stream_page('admin_events.html', events=stream_rows(statement)).response
+
+        print(f"{args.rows} events")
+        print(f"{'Rendering':<10} {'First byte ms':>14} {'Total ms':>9} {'Peak MB':>8} {'Bytes':>10}")
+        for label, render in (('buffered', buffered), ('streamed', streamed)):
+            with app.test_request_context('/admin/events'):
+                db.session.expunge_all()
+                login_user(db.session.get(User, admin_id))
+                tracemalloc.start()
+                begin = time.perf_counter()
+                first_byte, size = None, 0
+                for chunk in render():
+                    first_byte = first_byte or time.perf_counter()
+                    size += len(chunk)
+                total = time.perf_counter() - begin
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            print(f"{label:<10} {(first_byte - begin) * 1000:>14.1f} {total * 1000:>9.1f} "
+                  f"{peak / 2 ** 20:>8.1f} {size:>10}")
+
+
+BENCHMARKS = {
+    'passwords': bench_passwords,
+    'permissions': bench_permissions,
+    'templates': bench_templates,
+    'compression': bench_compression,
+    'streaming': bench_streaming,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    passwords = subparsers.add_parser('passwords', help=bench_passwords.__doc__)
+    passwords.add_argument('--method', action='append',
+                           help='werkzeug hash method to measure (repeatable)')
+    passwords.add_argument('--rounds', type=int, default=20)
+
+    permissions = subparsers.add_parser('permissions', help=bench_permissions.__doc__)
+    permissions.add_argument('--number', type=int, default=200000,
+                             help='iterations per role-check timing')
+    permissions.add_argument('--requests', type=int, default=2000)
+
+    templates = subparsers.add_parser('templates', help=bench_templates.__doc__)
+    templates.add_argument('--rounds', type=int, default=5)
+
+    compression = subparsers.add_parser('compression', help=bench_compression.__doc__)
+    compression.add_argument('--path', action='append', default=None,
+                             help='page to render and compress (repeatable, default: / /om-oss /evenemang)')
+    compression.add_argument('--rounds', type=int, default=5)
+
+    streaming = subparsers.add_parser('streaming', help=bench_streaming.__doc__)
+    streaming.add_argument('--rows', type=int, default=5000)
+
+    args = parser.parse_args()
+    if args.benchmark == 'compression' and not args.path:
+        args.path = ['/', '/om-oss', '/evenemang']
+    BENCHMARKS[args.benchmark](args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
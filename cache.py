@@ -0,0 +1,252 @@
+"""
+Application cache with pluggable backends
+
+One API, `cache`, in front of interchangeable backends picked by CACHE_BACKEND:
+
+- memory: bounded in-process LRU with per-entry TTL (default; per worker)
+- redis: an out-of-process key-value store shared by all workers (CACHE_URL,
+  needs the redis package)
+- null: caches nothing (handy when debugging)
+
+Keys are namespaced (`<CACHE_KEY_PREFIX>:<namespace>:<key>`), so one
+namespace can be cleared without touching the rest. Values are pickled, and
+anything larger than CACHE_MAX_VALUE_BYTES is not stored. Hits and misses are
+counted per namespace. `@cache.memoize(namespace, ttl)` caches a helper's
+return value by its arguments.
+
+Backend failures are logged and treated as misses, so a cache outage only
+costs speed.
+"""
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+cache_log = logging.getLogger('cache')
+
+
+class MemoryBackend:
+    """Thread-safe LRU of pickled values with per-entry expiry"""
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at or None, data)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, data)
+            self._bytes += len(data)
+            # Evict least recently used entries until both limits hold
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self, prefix=''):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def info(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+
+class RedisBackend:
+    """Shared store in Redis (or anything speaking its protocol)"""
+
+    def __init__(self, url, socket_timeout=0.5):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' needs the redis package (pip install redis)")
+        # RESP2 works with every Redis-compatible server (and the test stand-in)
+        self.client = redis.Redis.from_url(url, protocol=2, socket_timeout=socket_timeout,
+                                           socket_connect_timeout=socket_timeout)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, data, ttl=None):
+        self.client.set(key, data, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self, prefix=''):
+        keys = list(self.client.scan_iter(match=f'{prefix}*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def info(self):
+        return {'backend': 'redis', 'entries': self.client.dbsize()}
+
+
+class NullBackend:
+    """Stores nothing"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, data, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self, prefix=''):
+        pass
+
+    def info(self):
+        return {'backend': 'null'}
+
+
+class Cache:
+    """Namespaced cache API over a backend, with hit/miss counters"""
+
+    def __init__(self, backend=None, prefix='bm', default_ttl=300, max_value_bytes=512 * 1024):
+        self.backend = backend or MemoryBackend()
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.max_value_bytes = max_value_bytes
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the backend and limits from app.config"""
+        self.backend = create_backend(app.config)
+        self.prefix = app.config['CACHE_KEY_PREFIX']
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        self.max_value_bytes = app.config['CACHE_MAX_VALUE_BYTES']
+        self.reset_stats()
+        app.extensions['cache'] = self
+
+    def make_key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:{key}'
+
+    def _count(self, namespace, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def get(self, namespace, key, default=None):
+        """The cached value, or default on a miss"""
+        try:
+            data = self.backend.get(self.make_key(namespace, key))
+        except Exception as e:
+            cache_log.warning("Cache get failed for %s: %s", namespace, e)
+            data = None
+        if data is None:
+            self._count(namespace, 'misses')
+            return default
+        self._count(namespace, 'hits')
+        return pickle.loads(data)
+
+    def set(self, namespace, key, value, ttl=None):
+        """Store a value; returns False if it is over the size limit or the backend failed"""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_value_bytes:
+            cache_log.debug("Not caching %s:%s (%d bytes)", namespace, key, len(data))
+            return False
+        try:
+            self.backend.set(self.make_key(namespace, key), data,
+                             self.default_ttl if ttl is None else ttl)
+        except Exception as e:
+            cache_log.warning("Cache set failed for %s: %s", namespace, e)
+            return False
+        return True
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self.make_key(namespace, key))
+        except Exception as e:
+            cache_log.warning("Cache delete failed for %s: %s", namespace, e)
+
+    def clear(self, namespace=None):
+        """Drop one namespace, or everything under this app's prefix"""
+        prefix = f'{self.prefix}:' if namespace is None else f'{self.prefix}:{namespace}:'
+        try:
+            self.backend.clear(prefix)
+        except Exception as e:
+            cache_log.warning("Cache clear failed for %s: %s", namespace or '*', e)
+
+    def memoize(self, namespace, ttl=None):
+        """Cache a function's return value by its (repr'd) arguments"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                raw_key = repr((f.__module__, f.__qualname__, args, sorted(kwargs.items())))
+                key = hashlib.sha1(raw_key.encode()).hexdigest()
+                marker = object()
+                value = self.get(namespace, key, default=marker)
+                if value is marker:
+                    value = f(*args, **kwargs)
+                    self.set(namespace, key, value, ttl)
+                return value
+            decorated_function.uncached = f
+            return decorated_function
+        return decorator
+
+    def stats(self):
+        """Per-namespace hit/miss counters plus backend information"""
+        with self._lock:
+            namespaces = {name: dict(counters) for name, counters in self._counters.items()}
+        for counters in namespaces.values():
+            total = counters['hits'] + counters['misses']
+            counters['hit_rate'] = round(counters['hits'] / total, 3) if total else 0.0
+        try:
+            backend = self.backend.info()
+        except Exception as e:
+            backend = {'error': str(e)}
+        return {'backend': backend, 'namespaces': namespaces}
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters.clear()
+
+
+def create_backend(config):
+    """Build the backend named by CACHE_BACKEND"""
+    name = config['CACHE_BACKEND']
+    if name == 'memory':
+        return MemoryBackend(max_entries=config['CACHE_MAX_ENTRIES'], max_bytes=config['CACHE_MAX_BYTES'])
+    if name == 'redis':
+        if not config.get('CACHE_URL'):
+            raise ValueError("CACHE_BACKEND='redis' needs CACHE_URL")
+        return RedisBackend(config['CACHE_URL'])
+    if name == 'null':
+        return NullBackend()
+    raise ValueError(f"Unknown cache backend: {name!r} (expected memory, redis or null)")
+
+
+cache = Cache()
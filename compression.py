@@ -0,0 +1,280 @@
+"""
+Response compression middleware
+
+CompressionMiddleware wraps the WSGI app and compresses dynamic responses
+(HTML pages, JSON, ...) with brotli or gzip, whichever the client's
+Accept-Encoding prefers (brotli on a tie). Responses are left alone when
+they are smaller than COMPRESS_MIN_SIZE, have a type outside
+COMPRESS_MIMETYPES, are already encoded (the precompressed /assets/ files)
+or say Cache-Control: no-transform.
+
+Streamed responses are compressed chunk by chunk and flushed after every
+chunk, so the browser still receives the top of a page early. Without a
+Content-Length the first chunks are held back until COMPRESS_MIN_SIZE bytes
+have arrived, to tell small responses from large ones.
+
+compression_stats counts bytes in and out and the CPU time spent per
+encoding and content type; admins can read them at /admin/compression-stats
+to pick COMPRESS_GZIP_LEVEL and COMPRESS_BROTLI_QUALITY. `python
+benchmarks.py compression` measures the levels offline on rendered pages.
+"""
+import threading
+import time
+import zlib
+from itertools import chain
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+NOT_COMPRESSED_STATUSES = (204, 206, 304)
+
+
+def parse_accept_encoding(value):
+    """{coding: quality} from an Accept-Encoding header"""
+    codings = {}
+    for item in value.split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding.strip().lower()] = quality
+    return codings
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality, mode=brotli.MODE_TEXT)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionStats:
+    """Thread-safe byte and CPU-time counters per encoding and content type"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._encodings = {}
+            self._mimetypes = {}
+            self._skipped = {}
+
+    def record(self, encoding, mimetype, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            for table, key in ((self._encodings, encoding), (self._mimetypes, f'{mimetype} ({encoding})')):
+                counters = table.setdefault(key, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0})
+                counters['responses'] += 1
+                counters['bytes_in'] += bytes_in
+                counters['bytes_out'] += bytes_out
+                counters['cpu_ms'] += cpu_seconds * 1000
+
+    def skip(self, reason):
+        with self._lock:
+            self._skipped[reason] = self._skipped.get(reason, 0) + 1
+
+    @staticmethod
+    def _summary(counters):
+        summary = dict(counters, cpu_ms=round(counters['cpu_ms'], 3))
+        summary['ratio'] = round(counters['bytes_out'] / counters['bytes_in'], 3) if counters['bytes_in'] else None
+        kilobytes = counters['bytes_in'] / 1024
+        summary['cpu_ms_per_kb'] = round(counters['cpu_ms'] / kilobytes, 4) if kilobytes else None
+        return summary
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'encodings': {key: self._summary(value) for key, value in self._encodings.items()},
+                'mimetypes': {key: self._summary(value) for key, value in self._mimetypes.items()},
+                'skipped': dict(self._skipped),
+            }
+
+
+compression_stats = CompressionStats()
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """WSGI middleware that gzip/brotli-compresses eligible responses"""
+
+    def __init__(self, app, min_size=500, mimetypes=DEFAULT_MIMETYPES, gzip_level=6,
+                 brotli_quality=4, stats=None):
+        self.app = app
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats or compression_stats
+
+    def choose_encoding(self, accept_encoding):
+        """'br', 'gzip' or None for an Accept-Encoding header"""
+        codings = parse_accept_encoding(accept_encoding or '')
+        wildcard = codings.get('*', 0.0)
+        candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+        best, best_quality = None, 0.0
+        for coding in candidates:
+            quality = codings.get(coding, wildcard)
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def encoder(self, encoding):
+        if encoding == 'br':
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+    def skip_reason(self, status, headers):
+        """Why a response should not be compressed, or None if it should"""
+        code = int(status.split(None, 1)[0])
+        if code < 200 or code in NOT_COMPRESSED_STATUSES:
+            return 'status'
+        if _header(headers, 'Content-Encoding'):
+            return 'encoded'
+        if 'no-transform' in (_header(headers, 'Cache-Control') or ''):
+            return 'no-transform'
+        mimetype = (_header(headers, 'Content-Type') or '').split(';')[0].strip().lower()
+        if mimetype not in self.mimetypes:
+            return 'type'
+        length = _header(headers, 'Content-Length')
+        if length is not None and int(length) < self.min_size:
+            return 'small'
+        return None
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        response = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response.update(status=status, headers=list(headers), exc_info=exc_info)
+            return written.append  # legacy write(): sent before the body iterable
+
+        return self._respond(self.app(environ, capture), response, written, start_response, encoding)
+
+    def _respond(self, body, response, written, start_response, encoding):
+        try:
+            chunks = iter(body)
+            held, held_size = list(written), sum(len(chunk) for chunk in written)
+            # The app calls start_response at the latest with its first chunk
+            while 'status' not in response:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                held.append(chunk)
+                held_size += len(chunk)
+            status, headers = response['status'], response['headers']
+
+            reason = self.skip_reason(status, headers)
+            if reason is None and _header(headers, 'Content-Length') is None:
+                # Unknown length: wait for enough bytes to know it's worth it
+                while held_size < self.min_size:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        reason = 'small'
+                        break
+                    held.append(chunk)
+                    held_size += len(chunk)
+
+            if reason is not None:
+                self.stats.skip(reason)
+                response['started'] = True
+                start_response(status, headers, response['exc_info'])
+                yield from held
+                yield from chunks
+                return
+
+            headers = [(key, value) for key, value in headers if key.lower() != 'content-length']
+            vary = _header(headers, 'Vary')
+            headers = [(key, value) for key, value in headers if key.lower() != 'vary']
+            headers.append(('Vary', f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'))
+            headers.append(('Content-Encoding', encoding))
+            etag = _header(headers, 'ETag')
+            if etag and not etag.startswith('W/'):
+                # The compressed bytes differ from the identity representation
+                headers = [(key, f'W/{value}' if key.lower() == 'etag' else value) for key, value in headers]
+            response['started'] = True
+            start_response(status, headers, response['exc_info'])
+
+            encoder = self.encoder(encoding)
+            bytes_in = bytes_out = 0
+            cpu = 0.0
+            for chunk in chain(held, chunks):
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                data = encoder.chunk(chunk)
+                cpu += time.thread_time() - started
+                bytes_in += len(chunk)
+                bytes_out += len(data)
+                if data:
+                    yield data
+            started = time.thread_time()
+            data = encoder.finish()
+            cpu += time.thread_time() - started
+            bytes_out += len(data)
+            yield data
+            mimetype = (_header(headers, 'Content-Type') or '').split(';')[0].strip().lower()
+            self.stats.record(encoding, mimetype, bytes_in, bytes_out, cpu)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+def init_compression(app):
+    """Wrap app.wsgi_app in CompressionMiddleware if COMPRESS_ENABLED"""
+    if not app.config.get('COMPRESS_ENABLED'):
+        return None
+    middleware = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        mimetypes=app.config['COMPRESS_MIMETYPES'],
+        gzip_level=app.config['COMPRESS_GZIP_LEVEL'],
+        brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'],
+    )
+    app.wsgi_app = middleware
+    app.extensions['compression'] = middleware
+    return middleware
@@ -0,0 +1,138 @@
+"""
+Conditional GET for public pages
+
+@conditional(validators) gives a view an ETag and Last-Modified header. When
+the browser's If-None-Match still matches, it answers 304 Not Modified without
+running the view or rendering its template. If-Modified-Since alone is not
+trusted: deleting an older event changes a page without changing its newest
+timestamp, which only the ETag (covering row counts) notices.
+
+The validators function returns (last_modified, parts): the newest timestamp
+the page depends on and any extra values that change its output (row counts,
+the homepage reminder state, ...). The ETag also covers a hash of all
+template sources and, for logged-in users, the identity shown in the
+navigation. Views whose logged-in output depends on more than that (the
+events page shows tasks to parents) pass anonymous_only=True.
+
+Anonymous responses are marked `public, no-cache`; logged-in responses are
+`private, no-cache`. Both carry `Vary: Cookie`, so a shared cache never serves
+one to the other. Requests with pending flash messages are always rendered.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import case, func, select
+
+# Hash of the template sources, per template folder
+_template_versions = {}
+
+
+def template_version(app):
+    """Hash of every template's source and the asset manifest, computed once per process"""
+    folder = os.path.join(app.root_path, app.template_folder)
+    if folder not in _template_versions:
+        digest = hashlib.sha1()
+        for name in sorted(app.jinja_env.list_templates()):
+            source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+            digest.update(name.encode())
+            digest.update(source.encode())
+        # Pages embed fingerprinted asset URLs, which change with every asset build
+        digest.update(repr(sorted((app.extensions.get('asset_manifest') or {}).items())).encode())
+        _template_versions[folder] = digest.hexdigest()[:16]
+    return _template_versions[folder]
+
+
+def _as_http_date(value):
+    """Naive UTC datetime to an aware one, truncated to whole seconds"""
+    if value is None:
+        return None
+    return value.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def _identity_parts():
+    if not current_user.is_authenticated:
+        return ('anonymous',)
+    return ('user', current_user.id, current_user.role_mask,
+            current_user.first_name, current_user.email)
+
+
+def compute_etag(parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return digest[:32]
+
+
+def is_not_modified(etag):
+    """True if the request's If-None-Match still matches"""
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def conditional(validators, anonymous_only=False):
+    """Answer matching conditional GETs with 304 Not Modified"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            authenticated = current_user.is_authenticated
+            cache_control = 'private, no-cache' if authenticated else 'public, no-cache'
+            if (request.method not in ('GET', 'HEAD') or session.get('_flashes')
+                    or (authenticated and anonymous_only)):
+                response = make_response(f(*args, **kwargs))
+                response.headers['Cache-Control'] = cache_control
+                response.vary.add('Cookie')
+                return response
+
+            last_modified, parts = validators()
+            etag = compute_etag((request.endpoint, template_version(current_app),
+                                 datetime.now().year,  # footer copyright year
+                                 _identity_parts(), last_modified, parts))
+            last_modified = _as_http_date(last_modified)
+
+            if is_not_modified(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
+
+
+def static_page():
+    """Validators for pages that only depend on their template"""
+    return None, ()
+
+
+def events_page():
+    """Validators for the events page: newest change plus row and upcoming counts"""
+    from app import db
+    from models import Event
+    row = db.session.execute(select(
+        func.max(Event.updated_at),
+        func.count(Event.id),
+        func.count(case((Event.event_date > datetime.utcnow(), Event.id))),
+    )).one()
+    return row[0], (row[1], row[2])
+
+
+def homepage():
+    """Validators for the homepage, from the cached homepage data and Instagram feed"""
+    from homepage import get_homepage_data
+    from instagram import get_instagram_feed
+    data = get_homepage_data()
+    stamps = [event['updated_at'] for event in data['upcoming_events']]
+    stamps += [news['published_date'] for news in data['latest_news']]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    parts = (data['school_year'], data['show_application_reminder'],
+             [(event['id'], event['updated_at']) for event in data['upcoming_events']],
+             [(news['id'], news['published_date']) for news in data['latest_news']],
+             get_instagram_feed()['fetched_at'])
+    return max(stamps, default=None), parts
@@ -0,0 +1,185 @@
+"""
+Configuration profiles for the Brunnsbo Musikklasser application
+
+Select a profile with the APP_PROFILE environment variable (development,
+test or production). Replit deployments default to production.
+"""
+import os
+from datetime import timedelta
+
+from compression import DEFAULT_MIMETYPES
+
+
+def _env_flag(name, default):
+    """Read a boolean flag from the environment"""
+    return os.environ.get(name, default).lower() in ['true', 'on', '1']
+
+
+class Config:
+    """Settings shared by every profile"""
+    SECRET_KEY = os.environ.get("SESSION_SECRET", "brunnsbo-musikklasser-secret-key")
+    DEBUG = False
+    TESTING = False
+
+    # Create missing tables when the app starts (development convenience only)
+    AUTO_CREATE_SCHEMA = False
+    # Log a warning when create_app() takes longer than this
+    STARTUP_BUDGET_MS = 1500
+
+    # Logging (see logging_setup.py)
+    LOG_LEVEL = 'INFO'
+    LOG_FORMAT = 'json'  # 'json' or 'text'
+    LOG_LEVELS = {}  # per-logger overrides, e.g. {'sqlalchemy.engine': 'WARNING'}
+    LOG_RATE_LIMITS = {  # max DEBUG records per second for chatty loggers
+        'routes.login': 5,
+        'app.user_loader': 2,
+    }
+
+    # Jinja bytecode cache (see template_cache.py); TEMPLATE_CACHE_DIR
+    # defaults to instance/jinja_cache
+    TEMPLATE_BYTECODE_CACHE = _env_flag('TEMPLATE_BYTECODE_CACHE', 'false')
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+
+    # Serve fingerprinted assets from static/dist (see assets.py)
+    ASSETS_USE_MANIFEST = True
+
+    # gzip/brotli compression of dynamic responses (see compression.py)
+    COMPRESS_ENABLED = _env_flag('COMPRESS_ENABLED', 'true')
+    COMPRESS_MIN_SIZE = 500  # bytes; smaller responses gain nothing
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', '4'))
+    COMPRESS_MIMETYPES = DEFAULT_MIMETYPES
+
+    # Streamed admin listings (see streaming.py)
+    STREAM_BATCH_SIZE = 200  # rows fetched per round trip from the server-side cursor
+    STREAM_BUFFER_BYTES = 16 * 1024  # rendered HTML sent per chunk
+
+    # Password hashing (see passwords.py); stored hashes with other
+    # parameters are upgraded on the user's next successful login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_SALT_LENGTH = 16
+
+    # Cached current_user snapshots (see identity.py)
+    IDENTITY_CACHE_TTL = 60  # seconds
+    IDENTITY_CACHE_SIZE = 1024
+    # Cached homepage events and news (see homepage.py). Shared by all workers
+    # with the redis cache backend; with the memory backend other workers can
+    # serve old data for up to this long after an edit
+    HOMEPAGE_CACHE_TTL = 300  # seconds
+
+    # Instagram feed via Behold.so (see instagram.py), cached in the
+    # application cache and refreshed in the background
+    BEHOLD_FEED_ID = os.environ.get('BEHOLD_FEED_ID', '')
+    BEHOLD_FEED_URL = os.environ.get('BEHOLD_FEED_URL', 'https://feeds.behold.so/{feed_id}')
+    INSTAGRAM_FEED_TTL = 900  # seconds before a refresh is due
+    INSTAGRAM_FEED_MAX_STALE = 7 * 24 * 3600  # keep serving old posts while Behold is down
+    INSTAGRAM_REFRESH_INTERVAL = 300  # seconds between scheduled checks per worker (0 = off)
+    INSTAGRAM_FETCH_TIMEOUT = 3  # seconds
+    INSTAGRAM_MEDIA_TTL = 24 * 3600  # resized thumbnails, cache and browser
+
+    # Application cache (see cache.py): memory, redis or null
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_URL = os.environ.get('CACHE_URL')  # e.g. redis://localhost:6379/0
+    CACHE_KEY_PREFIX = 'bm'
+    CACHE_DEFAULT_TTL = 300  # seconds
+    CACHE_MAX_ENTRIES = 1024  # memory backend only
+    CACHE_MAX_BYTES = 16 * 1024 * 1024  # memory backend only
+    CACHE_MAX_VALUE_BYTES = 512 * 1024
+
+    # CSRF and Session Configuration for Safari compatibility
+    WTF_CSRF_TIME_LIMIT = None  # No time limit for CSRF tokens
+    SESSION_COOKIE_SECURE = False  # Allow HTTP for development
+    SESSION_COOKIE_HTTPONLY = False  # Allow JavaScript access for debugging
+    SESSION_COOKIE_SAMESITE = 'Lax'  # Allow cross-site requests with proper referrer
+    WTF_CSRF_SSL_STRICT = False  # Allow CSRF over HTTP for development
+    SESSION_PERMANENT = True  # Make sessions permanent
+    PERMANENT_SESSION_LIFETIME = timedelta(hours=24)  # Default 24 hour session lifetime
+    WTF_CSRF_CHECK_DEFAULT = False  # Disable default CSRF for debugging
+    REMEMBER_COOKIE_DURATION = timedelta(days=365)  # Remember me duration: 1 year
+
+    # Database
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "postgresql://localhost/brunnsbo_musikklasser")
+    # Pool sizing profile (sync, threaded or pgbouncer - see db_pool.py);
+    # create_app() turns it into SQLALCHEMY_ENGINE_OPTIONS
+    DB_POOL_PROFILE = os.environ.get('DB_POOL_PROFILE', 'sync')
+    # Optional read replica for @read_replica views (see replica.py)
+    REPLICA_DATABASE_URI = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))  # seconds
+    REPLICA_CHECK_INTERVAL = 10  # seconds between replica health checks
+
+    # Mail configuration - configured for external SMTP (Gmail/SendGrid)
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', '587'))
+    MAIL_USE_TLS = _env_flag('MAIL_USE_TLS', 'true')
+    MAIL_USE_SSL = _env_flag('MAIL_USE_SSL', 'false')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+
+    # Swish m-commerce payment configuration
+    SWISH_TEST_MODE = os.environ.get('SWISH_TEST_MODE', 'true').lower() == 'true'
+    SWISH_PAYEE_ALIAS = os.environ.get('SWISH_PAYEE_ALIAS', '123268258')  # Brunnsbo Musikklasser Swish number
+    SWISH_CERT_PATH = os.environ.get('SWISH_CERT_PATH')
+    SWISH_CERT_PASSWORD = os.environ.get('SWISH_CERT_PASSWORD')
+    SWISH_CA_CERT_PATH = os.environ.get('SWISH_CA_CERT_PATH')
+
+
+class DevelopmentConfig(Config):
+    """Local development: debug mode and automatic table creation"""
+    DEBUG = True
+    AUTO_CREATE_SCHEMA = True
+    LOG_LEVEL = 'DEBUG'
+    LOG_FORMAT = 'text'
+    LOG_LEVELS = {'urllib3': 'INFO'}
+    ASSETS_USE_MANIFEST = False  # edits to static/ show up without a rebuild
+
+
+class TestConfig(Config):
+    """Isolated in-memory database for the test suite"""
+    TESTING = True
+    AUTO_CREATE_SCHEMA = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    DB_POOL_PROFILE = None  # keep Flask-SQLAlchemy's in-memory SQLite pool
+    REPLICA_DATABASE_URI = None
+    WTF_CSRF_ENABLED = False
+    SWISH_TEST_MODE = True
+    LOG_LEVEL = 'WARNING'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # keep the suite fast
+    CACHE_BACKEND = 'memory'
+    ASSETS_USE_MANIFEST = False
+    BEHOLD_FEED_ID = ''
+    INSTAGRAM_REFRESH_INTERVAL = 0
+
+
+class ProductionConfig(Config):
+    """Autoscaled gunicorn workers: no debug machinery, no schema reflection"""
+    DEBUG = False
+    AUTO_CREATE_SCHEMA = False
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = {'routes.login': 'INFO', 'app.user_loader': 'INFO'}
+    TEMPLATE_BYTECODE_CACHE = _env_flag('TEMPLATE_BYTECODE_CACHE', 'true')
+    STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', '1500'))
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'test': TestConfig,
+    'production': ProductionConfig,
+}
+
+
+def default_profile():
+    """Pick the profile from APP_PROFILE, falling back on the Replit deployment flag"""
+    profile = os.environ.get('APP_PROFILE')
+    if profile:
+        return profile
+    return 'production' if os.environ.get('REPLIT_DEPLOYMENT') else 'development'
+
+
+def get_config(profile):
+    """Return the configuration class for a profile name"""
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown configuration profile: {profile!r} (expected one of {', '.join(PROFILES)})")
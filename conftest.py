@@ -226,4 +226,396 @@ def test_app():
 @pytest.fixture
 def client(test_app):
     """Create test client"""
-    return test_app.test_client()
\ No newline at end of file
+    return test_app.test_client()
+
+@pytest.fixture(scope="function")
+def factory_app():
+    """Real application built by create_app() with the test profile"""
+    from app import create_app, db
+    from identity import identity_cache
+
+    app = create_app('test')
+    # Fresh databases reuse ids, so drop cached data from earlier tests
+    identity_cache.invalidate()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class QueryCounter:
+    """Context manager recording the SQL statements run on an engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.parameters = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries(factory_app):
+    """Return a QueryCounter factory for the factory_app database"""
+    from app import db
+    return lambda: QueryCounter(db.engine)
+
+
+# Rows per table seeded by seed_hot_tables(), roughly ten years of the school
+SEED_VOLUMES = {
+    'users': 800,
+    'event': 3000,
+    'event_tasks': 9000,
+    'news_post': 1500,
+    'application': 6000,
+    'swish_payment': 20000,
+    'confirmation_codes': 8000,
+}
+
+
+def seed_hot_tables(db):
+    """
+    Fill the tables behind the hot queries with realistic volumes and
+    distributions, then ANALYZE so the planner sees them. Returns the
+    seeded volumes plus a few known values to query for.
+    """
+    import random
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, text
+    from models import (Application, ConfirmationCode, Event, EventTask, Group, NewsPost,
+                        SwishPayment, User, user_groups)
+
+    rng = random.Random(2025)
+    now = datetime.utcnow()
+    counts = SEED_VOLUMES
+    years = [f'{year}/{year + 1}' for year in range(2019, 2025)]
+    statuses = ['applied', 'email_confirmed', 'application_withdrawn', 'invited_for_audition',
+                'rejected', 'offered', 'accepted']
+
+    def rows(table, values):
+        db.session.execute(insert(getattr(table, '__table__', table)), values)
+
+    rows(Group, [{'id': 1, 'name': 'parent'}, {'id': 2, 'name': 'event_manager'}, {'id': 3, 'name': 'admin'}])
+    rows(User, [{'id': i, 'first_name': f'Förälder{i}', 'last_name': 'Seed', 'email': f'seed{i}@example.com',
+                 'password_hash': '-', 'active': i % 20 != 0} for i in range(1, counts['users'] + 1)])
+    rows(user_groups, [{'user_id': i, 'group_id': 1 if i > 20 else 2} for i in range(1, counts['users'] + 1)])
+    # Mostly past events: one every day or so, a few dozen still upcoming
+    rows(Event, [{'id': i, 'title': f'Konsert {i}', 'event_date': now - timedelta(days=counts['event'] - 40 - i),
+                  'is_active': i % 10 != 0, 'created_at': now, 'updated_at': now}
+                 for i in range(1, counts['event'] + 1)])
+    rows(EventTask, [{'id': i, 'event_id': (i - 1) // 3 + 1, 'title': f'Uppgift {i}',
+                      'assigned_to_user_id': rng.randint(21, counts['users']), 'completed': i % 4 != 0}
+                     for i in range(1, counts['event_tasks'] + 1)])
+    rows(NewsPost, [{'id': i, 'title': f'Nyhet {i}', 'content': '...', 'is_published': i % 8 != 0,
+                     'published_date': now - timedelta(days=counts['news_post'] - i)}
+                    for i in range(1, counts['news_post'] + 1)])
+    rows(Application, [{'id': i, 'student_name': f'Elev {i}', 'student_personnummer': '20150101-0000',
+                        'parent_name': 'Förälder', 'parent_email': f'applicant{i}@example.com',
+                        'parent_phone': '0701234567', 'address': 'Gatan 1', 'postal_code': '41101',
+                        'city': 'Göteborg', 'grade_applying_for': '4', 'application_year': years[i % len(years)],
+                        'status': rng.choice(statuses), 'email_confirmed': i % 3 != 0,
+                        'created_at': now - timedelta(hours=counts['application'] - i)}
+                       for i in range(1, counts['application'] + 1)])
+    # Nearly all payments are settled; a handful are still pending
+    rows(SwishPayment, [{'id': f'SEED{i:028d}', 'payee_payment_reference': f'BMK-SEED-{i}',
+                         'payee_alias': '1234567890', 'amount': rng.choice([50, 100, 200, 500]),
+                         'callback_url': 'https://example.com/callback', 'callback_identifier': f'seed-{i}',
+                         'status': 'PENDING' if i % 500 == 0 else rng.choice(['PAID'] * 18 + ['DECLINED', 'ERROR']),
+                         'user_id': rng.choice([None, rng.randint(1, counts['users'])]),
+                         'date_created': now - timedelta(minutes=7 * (counts['swish_payment'] - i))}
+                        for i in range(1, counts['swish_payment'] + 1)])
+    rows(ConfirmationCode, [{'id': i, 'code': f'seedcode{i:024d}', 'email': f'seed{i % counts["users"]}@example.com',
+                             'purpose': rng.choice(['email_verification', 'password_reset', 'user_registration']),
+                             'used': i % 10 != 0, 'created_at': now, 'expires_at': now + timedelta(hours=24)}
+                            for i in range(1, counts['confirmation_codes'] + 1)])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return dict(counts, parent_id=counts['users'] - 1, manager_id=1, event_id=counts['event'] - 100,
+                year=years[2], applicant_email='applicant4242@example.com')
+
+
+@pytest.fixture
+def bare_app():
+    """create_app('test') with no app context held open, as under gunicorn"""
+    from app import create_app, db
+    from identity import identity_cache
+
+    app = create_app('test')
+    identity_cache.invalidate()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='class')
+def seeded_app():
+    """create_app('test') with seed_hot_tables() data, shared by a test class"""
+    from app import create_app, db
+    from identity import identity_cache
+
+    app = create_app('test')
+    identity_cache.invalidate()
+    with app.app_context():
+        app.config['SEED'] = seed_hot_tables(db)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def explain(connection, statement, parameters):
+    """Query plan of a captured SQL statement, one line per plan node"""
+    if connection.dialect.name == 'postgresql':
+        return [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {statement}', parameters)]
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+def full_scans(plan, tables):
+    """The plan lines that read one of tables without an index"""
+    import re
+    scans = []
+    for line in plan:
+        match = re.match(r'\s*(?:->\s*)?(?:SCAN (\w+)(?: AS \w+)?$|Seq Scan on (\w+))', line)
+        if match and (match.group(1) or match.group(2)) in tables:
+            scans.append(line)
+    return scans
+
+
+def login_as(client, user_id):
+    """Log a test client in by writing the Flask-Login session keys"""
+    from flask import g
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    # Requests reuse the app context pushed by factory_app, so forget the
+    # user Flask-Login cached on g for the previous client
+    g.pop('_login_user', None)
+
+
+class StubRedisServer:
+    """
+    In-memory stand-in for a Redis server, for testing the redis cache backend.
+
+    Speaks just enough RESP for redis-py: PING, GET, SET (EX/PX), DEL, SCAN,
+    DBSIZE, FLUSHDB and CLIENT (always OK). Runs on a background thread.
+    """
+
+    def __init__(self):
+        import socketserver
+        import threading
+        self.data = {}  # key -> (expires_at or None, value)
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = stub._read_command(self.rfile)
+                    if command is None:
+                        return
+                    self.wfile.write(stub._execute(command))
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _read_command(rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            length = int(rfile.readline()[1:])
+            args.append(rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        if value is None:
+            return b'$-1\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def _live(self, key):
+        import time
+        entry = self.data.get(key)
+        if entry and entry[0] is not None and entry[0] < time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def _execute(self, args):
+        import fnmatch
+        import time
+        name = args[0].upper()
+        with self.lock:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name == b'CLIENT':
+                return b'+OK\r\n'
+            if name == b'GET':
+                entry = self._live(args[1])
+                return self._bulk(entry[1] if entry else None)
+            if name == b'SET':
+                expires_at = None
+                options = [arg.upper() for arg in args[3:]]
+                if b'PX' in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b'PX') + 1]) / 1000
+                elif b'EX' in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(b'EX') + 1])
+                self.data[args[1]] = (expires_at, args[2])
+                return b'+OK\r\n'
+            if name == b'DEL':
+                removed = sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+                return b':%d\r\n' % removed
+            if name == b'SCAN':
+                options = [arg.upper() for arg in args[2:]]
+                pattern = args[2 + options.index(b'MATCH') + 1] if b'MATCH' in options else b'*'
+                keys = [key for key in list(self.data)
+                        if self._live(key) and fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+                return b'*2\r\n' + self._bulk(b'0') + b'*%d\r\n' % len(keys) + b''.join(map(self._bulk, keys))
+            if name == b'DBSIZE':
+                return b':%d\r\n' % len(self.data)
+            if name == b'FLUSHDB':
+                self.data.clear()
+                return b'+OK\r\n'
+            return b'-ERR unknown command\r\n'
+
+
+@pytest.fixture
+def redis_stub():
+    """A running StubRedisServer"""
+    pytest.importorskip('redis')  # the client side of the redis backend
+    server = StubRedisServer().start()
+    yield server
+    server.stop()
+
+
+class StubFeedServer:
+    """
+    Local stand-in for Behold.so, for testing the Instagram feed proxy.
+
+    Serves the JSON feed at /feeds/<feed_id> and a generated JPEG for each
+    post at /media/<post_id>.jpg, counts requests per path and can be switched
+    to failing with `fail = True`. Runs on a background thread.
+    """
+
+    def __init__(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.posts = []
+        self.fail = False
+        self.hits = {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, content_type, body = stub._respond(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                                       daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def feed_url(self):
+        """Value for BEHOLD_FEED_URL"""
+        return self.url + '/feeds/{feed_id}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_post(self, post_id, caption='', size=(1080, 1080)):
+        """Add a Behold-style post whose image is served by this stub"""
+        media_url = f'{self.url}/media/{post_id}.jpg?w={size[0]}&h={size[1]}'
+        self.posts.append({
+            'id': post_id,
+            'permalink': f'https://www.instagram.com/p/{post_id}/',
+            'mediaType': 'IMAGE',
+            'mediaUrl': media_url,
+            'sizes': {'large': {'mediaUrl': media_url, 'width': size[0], 'height': size[1]}},
+            'caption': caption,
+            'prunedCaption': caption,
+        })
+
+    def count(self, prefix):
+        with self.lock:
+            return sum(hits for path, hits in self.hits.items() if path.startswith(prefix))
+
+    def _respond(self, path):
+        import io
+        import json
+        from urllib.parse import parse_qs, urlsplit
+        parts = urlsplit(path)
+        with self.lock:
+            self.hits[parts.path] = self.hits.get(parts.path, 0) + 1
+        if self.fail:
+            return 503, 'text/plain', b'unavailable'
+        if parts.path.startswith('/feeds/'):
+            body = json.dumps({'username': 'brunnsbo_musikklasser', 'posts': self.posts})
+            return 200, 'application/json', body.encode()
+        if parts.path.startswith('/media/'):
+            from PIL import Image
+            query = parse_qs(parts.query)
+            size = (int(query.get('w', ['1080'])[0]), int(query.get('h', ['1080'])[0]))
+            out = io.BytesIO()
+            Image.new('RGB', size, (177, 147, 58)).save(out, 'JPEG')
+            return 200, 'image/jpeg', out.getvalue()
+        return 404, 'text/plain', b'not found'
+
+
+@pytest.fixture
+def behold_stub():
+    """A running StubFeedServer"""
+    server = StubFeedServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,164 @@
+"""
+Connection pool profiles and live pool metrics
+
+DB_POOL_PROFILE picks engine options sized for the worker model:
+
+- sync: gunicorn sync workers serve one request at a time, so each worker
+  needs a single pooled connection (plus a little overflow)
+- threaded: gthread workers, one connection per thread (DB_POOL_SIZE)
+- pgbouncer: PgBouncer already pools server connections, so the app opens
+  and closes client connections per checkout (NullPool) without pre-ping
+
+Individual settings can be overridden with DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT and DB_PRE_PING (always/never). The pool classes used here
+record checkout wait times, which pool_stats() reports together with the
+pool's own counters for the admin pool statistics page.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+POOL_PROFILES = {
+    'sync': {
+        'pool_size': 1,
+        'max_overflow': 2,
+        'pool_timeout': 10,
+        'pool_recycle': 280,
+        'pre_ping': 'never',  # recycling below server idle timeouts is enough
+    },
+    'threaded': {
+        'pool_size': 4,
+        'max_overflow': 4,
+        'pool_timeout': 5,
+        'pool_recycle': 280,
+        'pre_ping': 'always',
+    },
+    'pgbouncer': {
+        'null_pool': True,
+        'pre_ping': 'never',
+    },
+}
+
+# Upper bounds (ms) of the checkout wait time histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    """Checkout wait time histogram and timeout counter for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms):
+        index = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self.buckets[index] += 1
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f'<={bound}ms' for bound in WAIT_BUCKETS_MS] + [f'>{WAIT_BUCKETS_MS[-1]}ms']
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'mean_wait_ms': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'wait_histogram': dict(zip(labels, self.buckets)),
+            }
+
+
+class _MeteredPoolMixin:
+    """Time every checkout, including the wait for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics  # keep history across engine.dispose()
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredNullPool(_MeteredPoolMixin, NullPool):
+    pass
+
+
+def engine_options(profile, environ=None):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for a pool profile"""
+    environ = os.environ if environ is None else environ
+    try:
+        settings = dict(POOL_PROFILES[profile])
+        pre_ping = settings.pop('pre_ping')
+    except KeyError:
+        raise ValueError(f"Unknown pool profile: {profile!r} (expected one of {', '.join(POOL_PROFILES)})")
+
+    for key, env_name in (('pool_size', 'DB_POOL_SIZE'),
+                          ('max_overflow', 'DB_MAX_OVERFLOW'),
+                          ('pool_timeout', 'DB_POOL_TIMEOUT')):
+        if environ.get(env_name):
+            settings[key] = int(environ[env_name])
+    pre_ping = environ.get('DB_PRE_PING', pre_ping)
+    if pre_ping not in ('always', 'never'):
+        raise ValueError(f"DB_PRE_PING must be 'always' or 'never', not {pre_ping!r}")
+
+    if settings.pop('null_pool', False):
+        options = {'poolclass': MeteredNullPool}
+    else:
+        options = {'poolclass': MeteredQueuePool, 'pool_use_lifo': True}
+        options.update(settings)
+    options['pool_pre_ping'] = pre_ping == 'always'
+    return options
+
+
+def pool_stats(engine):
+    """Current pool counters plus checkout wait metrics"""
+    pool = engine.pool
+    stats = {
+        'pool_class': type(pool).__name__,
+        'status': pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    return stats
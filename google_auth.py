@@ -41,13 +41,13 @@ def google_login():
     """Initiate Google OAuth login"""
     if not GOOGLE_CLIENT_ID:
         flash('Google authentication är inte korrekt konfigurerad', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     # Get Google's provider configuration
     google_provider_cfg = get_google_provider_cfg()
     if not google_provider_cfg:
         flash('Google authentication är inte tillgänglig just nu', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     authorization_endpoint = google_provider_cfg["authorization_endpoint"]
 
@@ -86,19 +86,19 @@ def google_callback():
     """Handle Google OAuth callback"""
     if not GOOGLE_CLIENT_ID:
         flash('Google authentication är inte korrekt konfigurerad', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     # Get authorization code from request
     code = request.args.get("code")
     if not code:
         flash('Google authentication misslyckades', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     # Get Google's provider configuration
     google_provider_cfg = get_google_provider_cfg()
     if not google_provider_cfg:
         flash('Google authentication är inte tillgänglig just nu', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     token_endpoint = google_provider_cfg["token_endpoint"]
     redirect_uri = session.get('oauth_redirect_uri', request.url_root.rstrip('/') + url_for('google_auth.google_callback'))
@@ -123,7 +123,7 @@ def google_callback():
         if token_response.status_code != 200:
             logging.error(f"Token request failed: {token_response.status_code} - {token_response.text}")
             flash('Google authentication misslyckades', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         # Parse the tokens
         client.parse_request_body_response(json.dumps(token_response.json()))
@@ -131,7 +131,7 @@ def google_callback():
     except Exception as e:
         logging.error(f"Token request error: {e}")
         flash('Google authentication misslyckades', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # Get user info from Google
     userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
@@ -143,19 +143,19 @@ def google_callback():
         if userinfo_response.status_code != 200:
             logging.error(f"Userinfo request failed: {userinfo_response.status_code}")
             flash('Kunde inte hämta användarinformation från Google', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         userinfo = userinfo_response.json()
         
     except Exception as e:
         logging.error(f"Userinfo request error: {e}")
         flash('Kunde inte hämta användarinformation från Google', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     # Ensure we have required information
     if not userinfo.get("email_verified"):
         flash('Din Google-e-postadress är inte verifierad', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     google_id = userinfo["sub"]
     email = userinfo["email"]
@@ -193,7 +193,7 @@ def handle_google_oauth(google_id, email, first_name, last_name, picture_url, fu
         user = oauth_connection.user
         if not user.active:
             flash('Ditt konto är inaktiverat', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         # Update OAuth connection info
         oauth_connection.provider_email = email
@@ -208,7 +208,7 @@ def handle_google_oauth(google_id, email, first_name, last_name, picture_url, fu
         login_user(user)
         
         flash(f'Välkommen tillbaka, {user.first_name}!', 'success')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     # Check if a user with this email already exists (password-based account)
     existing_user = User.query.filter_by(email=email).first()
@@ -231,18 +231,18 @@ def handle_account_linking(google_id, email, first_name, last_name, picture_url,
     
     if existing_oauth and existing_oauth.user_id != current_user.id:
         flash('Detta Google-konto är redan kopplat till en annan användare', 'error')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     # Check if current user already has a Google connection
     current_oauth = current_user.get_oauth_connection('google')
     if current_oauth:
         flash('Du har redan kopplat ett Google-konto till ditt konto', 'error')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     # Check if the email matches
     if current_user.email != email:
         flash(f'Google-kontots e-postadress ({email}) matchar inte ditt kontos e-postadress ({current_user.email})', 'error')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     # Create the OAuth connection
     oauth_connection = OAuthConnection(
@@ -258,7 +258,7 @@ def handle_account_linking(google_id, email, first_name, last_name, picture_url,
     db.session.commit()
     
     flash('Google-konto har kopplats till ditt konto!', 'success')
-    return redirect(url_for('user_profile'))
+    return redirect(url_for('main.user_profile'))
 
 def link_google_to_existing_user(user, google_id, email, first_name, last_name, picture_url):
     """Link Google account to existing password-based user"""
@@ -282,7 +282,7 @@ def link_google_to_existing_user(user, google_id, email, first_name, last_name,
     login_user(user)
     
     flash(f'Google-konto kopplat! Välkommen tillbaka, {user.first_name}!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 def create_new_google_user(google_id, email, first_name, last_name, picture_url):
     """Create new user from Google OAuth"""
@@ -320,7 +320,7 @@ def create_new_google_user(google_id, email, first_name, last_name, picture_url)
     login_user(user)
     
     flash(f'Välkommen till Brunnsbo Musikklasser, {first_name}! Ditt konto har skapats.', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 @google_auth.route("/disconnect_google")
 @login_required
@@ -330,15 +330,15 @@ def disconnect_google():
     oauth_connection = current_user.get_oauth_connection('google')
     if not oauth_connection:
         flash('Du har inget kopplat Google-konto', 'error')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     # Check if user has a password - don't allow disconnection if it's their only auth method
     if not current_user.password_hash:
         flash('Du kan inte koppla bort Google-kontot eftersom du inte har något lösenord inställt. Skapa först ett lösenord via "Glömt lösenord".', 'error')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     db.session.delete(oauth_connection)
     db.session.commit()
     
     flash('Google-konto har kopplats bort från ditt konto', 'success')
-    return redirect(url_for('user_profile'))
\ No newline at end of file
+    return redirect(url_for('main.user_profile'))
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Gunicorn settings for production
+
+Usage: gunicorn --config gunicorn_config.py main:app
+
+The master preloads the app and warms it up (see warmup.py) before forking,
+so workers start with compiled templates and share that memory copy-on-write.
+Workers are recycled after a jittered number of requests to bound memory
+growth. Settings can be tuned with the environment variables below.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# More than one thread needs DB_POOL_PROFILE=threaded so each thread gets a connection
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+
+preload_app = True
+reload = False
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+# Spread restarts so workers don't all recycle at the same moment
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = None  # request logging goes through the app's JSON logging
+errorlog = '-'
+
+
+def _app():
+    # Already imported by preload_app, so this does not build a second app
+    from main import app
+    return app
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before workers are forked"""
+    from warmup import warmup_master
+    timings = warmup_master(_app())
+    server.log.info(f"Warmup finished: {timings}")
+    # Move everything allocated so far out of the collector's reach, so GC
+    # passes in the workers don't touch (and copy) the shared pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Runs in each worker before it accepts connections"""
+    from warmup import warmup_worker
+    warmup_worker(_app())
@@ -0,0 +1,120 @@
+"""
+Cached data for the homepage
+
+get_homepage_data() returns the upcoming events, latest news, school year and
+application reminder flag for routes.index. The event and news rows are kept
+as plain dicts in the application cache (cache.py), keyed by school year and
+reminder state, so repeated homepage views run no queries. With the redis
+backend every worker shares the entries, and a commit in one worker clears
+them for all; with the memory backend each worker keeps its own copy.
+
+Misses are always read from the primary: a row the replica has not caught
+up with would otherwise be cached for HOMEPAGE_CACHE_TTL.
+
+An entry expires after HOMEPAGE_CACHE_TTL seconds, or earlier when its first
+upcoming event starts (the event then has to drop off the list). Any commit
+that adds, changes or deletes an Event or NewsPost clears the namespace.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import cache
+from replica import on_primary
+
+HOMEPAGE_NAMESPACE = 'homepage'
+DEFAULT_TTL = 300
+
+EVENT_FIELDS = ('id', 'title', 'description', 'event_date', 'location', 'ticket_url', 'updated_at')
+NEWS_FIELDS = ('id', 'title', 'content', 'author', 'published_date', 'featured')
+
+
+def _setting(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def school_year_for(now):
+    """The school year applications are currently open for, e.g. '2026/2027'"""
+    if now.month >= 7:  # July-December: next school year
+        return f"{now.year + 1}/{now.year + 2}"
+    return f"{now.year}/{now.year + 1}"  # January-June: current school year
+
+
+def in_reminder_period(now):
+    """True from December 1st to January 15th"""
+    # Dec 1 current year to Jan 15 next year
+    dec_1_current = datetime(now.year, 12, 1)
+    jan_15_next = datetime(now.year + 1, 1, 15, 23, 59, 59)
+    # Dec 1 previous year to Jan 15 current year
+    dec_1_previous = datetime(now.year - 1, 12, 1)
+    jan_15_current = datetime(now.year, 1, 15, 23, 59, 59)
+    return (dec_1_current <= now <= jan_15_next) or (dec_1_previous <= now <= jan_15_current)
+
+
+def _snapshot(row, fields):
+    return {field: getattr(row, field) for field in fields}
+
+
+def _load_rows(utcnow):
+    from models import Event, NewsPost
+    upcoming_events = Event.query.filter(
+        Event.event_date > utcnow,
+        Event.is_active == True).order_by(
+            Event.event_date.asc()).limit(3).all()
+    latest_news = NewsPost.query.filter(
+        NewsPost.is_published == True).order_by(
+            NewsPost.published_date.desc()).limit(3).all()
+    return ([_snapshot(e, EVENT_FIELDS) for e in upcoming_events],
+            [_snapshot(n, NEWS_FIELDS) for n in latest_news])
+
+
+def get_homepage_data(now=None, utcnow=None):
+    """Template context for the homepage"""
+    now = now or datetime.now()
+    utcnow = utcnow or datetime.utcnow()
+    school_year = school_year_for(now)
+    show_application_reminder = in_reminder_period(now)
+
+    key = f'{school_year}:{show_application_reminder}'
+    entry = cache.get(HOMEPAGE_NAMESPACE, key)
+    if entry is None or entry['expires_at'] <= utcnow:
+        ttl = _setting('HOMEPAGE_CACHE_TTL', DEFAULT_TTL)
+        with on_primary():
+            upcoming_events, latest_news = _load_rows(utcnow)
+        expires_at = utcnow + timedelta(seconds=ttl)
+        if upcoming_events:
+            expires_at = min(expires_at, upcoming_events[0]['event_date'])
+        entry = {'expires_at': expires_at, 'rows': (upcoming_events, latest_news)}
+        cache.set(HOMEPAGE_NAMESPACE, key, entry, ttl=ttl)
+
+    upcoming_events, latest_news = entry['rows']
+    return {
+        'upcoming_events': upcoming_events,
+        'latest_news': latest_news,
+        'show_application_reminder': show_application_reminder,
+        'school_year': school_year,
+    }
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_homepage_changes(session, flush_context, instances):
+    from models import Event, NewsPost
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Event, NewsPost)):
+            session.info['homepage_invalidate'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_homepage(session):
+    if session.info.pop('homepage_invalidate', False):
+        cache.clear(HOMEPAGE_NAMESPACE)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_homepage_changes(session):
+    session.info.pop('homepage_invalidate', None)
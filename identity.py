@@ -0,0 +1,189 @@
+"""
+Cached user identity for Flask-Login
+
+load_user() returns a UserIdentity built from a small snapshot (id, name,
+email, active flag, role set and role bitmask) kept in a TTL-bounded
+in-process cache, so an authenticated page view costs no queries for
+current_user. Anything outside
+the snapshot (created_at, oauth_connections, set_password, ...) transparently
+loads the full User row once per request.
+
+Snapshots are dropped after any commit that changes a user or their group
+memberships. Each worker has its own cache, so IDENTITY_CACHE_TTL bounds how
+long another worker can serve a stale snapshot.
+"""
+import threading
+import time
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 1024
+
+
+class IdentityCache:
+    """Thread-safe TTL cache of user snapshots keyed by user id"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return snapshot
+
+    def set(self, user_id, snapshot, ttl, max_size):
+        with self._lock:
+            if user_id not in self._entries and len(self._entries) >= max_size:
+                # Evict the entry closest to expiry
+                oldest = min(self._entries, key=lambda key: self._entries[key][0])
+                del self._entries[oldest]
+            self._entries[user_id] = (time.monotonic() + ttl, snapshot)
+
+    def invalidate(self, user_id=None):
+        """Drop one user's snapshot, or everything when user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+identity_cache = IdentityCache()
+
+
+class UserIdentity(UserMixin):
+    """Read-only stand-in for User built from a cached snapshot"""
+
+    def __init__(self, snapshot):
+        self.id = snapshot['id']
+        self.email = snapshot['email']
+        self.first_name = snapshot['first_name']
+        self.last_name = snapshot['last_name']
+        self.active = snapshot['active']
+        self.roles = snapshot['roles']
+        self.role_mask = snapshot['role_mask']
+        self._user = None
+
+    def has_role(self, role_name):
+        """Check if user has a specific role"""
+        return role_name in self.roles
+
+    def get_roles(self):
+        """Get list of role names for this user"""
+        return sorted(self.roles)
+
+    def is_admin(self):
+        return self.has_role('admin')
+
+    def is_applications_manager(self):
+        return self.has_role('applications_manager')
+
+    def is_event_manager(self):
+        return self.has_role('event_manager')
+
+    def is_parent(self):
+        return self.has_role('parent')
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def username(self):
+        return self.full_name
+
+    def load_user(self):
+        """The full User row, loaded at most once per request"""
+        if self._user is None:
+            from app import db
+            from models import User
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Only called for attributes missing from the snapshot
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load_user(), name)
+
+    def __repr__(self):
+        return f'<UserIdentity {self.id} {self.email}>'
+
+
+def snapshot_user(user):
+    """Extract the cacheable fields of a User"""
+    return {
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'active': user.active,
+        'roles': user.roles,
+        'role_mask': user.role_mask,
+    }
+
+
+def _setting(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def load_identity(user_id):
+    """Return a UserIdentity for user_id, or None if the user does not exist"""
+    snapshot = identity_cache.get(user_id)
+    if snapshot is None:
+        from app import db
+        from models import User
+        user = db.session.execute(
+            db.select(User).options(selectinload(User.groups)).filter_by(id=user_id)
+        ).scalar_one_or_none()
+        if user is None:
+            return None
+        snapshot = snapshot_user(user)
+        identity_cache.set(user_id, snapshot,
+                           ttl=_setting('IDENTITY_CACHE_TTL', DEFAULT_TTL),
+                           max_size=_setting('IDENTITY_CACHE_SIZE', DEFAULT_SIZE))
+    return UserIdentity(snapshot)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_users(session, flush_context, instances):
+    from models import User, Group
+    pending = session.info.setdefault('identity_invalidate', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            pending.add(obj.id)
+        elif isinstance(obj, Group):
+            pending.add(None)  # membership changed from the group side
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    pending = session.info.pop('identity_invalidate', None)
+    if not pending:
+        return
+    if None in pending:
+        identity_cache.invalidate()
+    else:
+        for user_id in pending:
+            identity_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('identity_invalidate', None)
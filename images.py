@@ -0,0 +1,276 @@
+"""
+Responsive image variants and favicons
+
+`flask --app main assets images` resizes every image under static/images into
+static/variants/ at several widths, in AVIF, WebP and the source format
+(JPEG/PNG), and renders a favicon set from the logo. Work is spread over a
+process pool, one task per image and format, and variants newer than their
+source are skipped, so rebuilds only redo what changed. Run it before
+`flask assets build` so the variants get fingerprinted as well.
+
+Templates call responsive_image('images/music-class.jpg', alt, sizes=...),
+which emits a <picture> with AVIF and WebP sources and a srcset/sizes <img>
+fallback. Before the variants have been built it falls back to a plain <img>
+of the original file. Animated GIFs get animated WebP variants and keep the
+original GIF as fallback.
+
+Building needs Pillow; without AVIF support (pillow>=11.2 wheels bundle it)
+the AVIF variants and <source> are left out.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+VARIANTS_DIR = 'variants'
+VARIANTS_MANIFEST = 'variants.json'
+SOURCE_DIR = 'images'
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1600)
+# Small images are shown at a fixed size; 1x, 2x and 3x are enough
+IMAGE_WIDTHS = {
+    'images/logo.gif': (100, 200, 300),
+    'images/logo_DH_white.png': (60, 120, 180),
+}
+QUALITY = {'avif': 50, 'webp': 75, 'jpeg': 78}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg',
+              'png': 'image/png', 'gif': 'image/gif'}
+
+FAVICON_SOURCE = 'images/logo.gif'
+FAVICONS = {
+    'favicon.ico': (16, 32, 48),
+    'favicon-32.png': (32,),
+    'apple-touch-icon.png': (180,),
+    'icon-192.png': (192,),
+}
+
+
+def _source_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.gif': 'gif'}[ext]
+
+
+def variant_path(logical_path, width, fmt):
+    """Logical path of one variant, e.g. variants/images/logo-200.webp"""
+    root = os.path.splitext(logical_path)[0]
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{VARIANTS_DIR}/{root}-{width}.{ext}'
+
+
+def plan_widths(logical_path, source_width):
+    """Requested widths that don't upscale, plus the source width if it is smaller"""
+    requested = IMAGE_WIDTHS.get(logical_path, DEFAULT_WIDTHS)
+    widths = [w for w in requested if w < source_width]
+    if not widths or (source_width < max(requested) and source_width not in widths):
+        widths.append(source_width)
+    return sorted(set(widths))
+
+
+def plan_formats(source_format, animated, avif=True):
+    """Formats to generate, best first; the last one is the <img> fallback"""
+    if animated:
+        return ['webp']  # the original GIF stays the fallback
+    fallback = 'png' if source_format in ('png', 'gif') else 'jpeg'
+    return (['avif'] if avif else []) + ['webp', fallback]
+
+
+def _is_fresh(target, source):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+
+def render_variants(source, output_dir, logical_path, fmt, widths):
+    """Write one format at every width (runs in a worker process)"""
+    from PIL import Image, ImageSequence
+
+    written = []
+    with Image.open(source) as image:
+        animated = getattr(image, 'is_animated', False)
+        for width in widths:
+            target = os.path.join(output_dir, variant_path(logical_path, width, fmt))
+            written.append((width, variant_path(logical_path, width, fmt)))
+            if _is_fresh(target, source):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            height = round(image.height * width / image.width)
+            if animated:
+                frames = [frame.convert('RGBA').resize((width, height), Image.LANCZOS)
+                          for frame in ImageSequence.Iterator(image)]
+                frames[0].save(target, 'WEBP', save_all=True, append_images=frames[1:],
+                               duration=image.info.get('duration', 100), loop=image.info.get('loop', 0),
+                               quality=QUALITY['webp'], method=6)
+                continue
+            has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            frame = image.convert('RGBA' if has_alpha and fmt != 'jpeg' else 'RGB')
+            frame = frame.resize((width, height), Image.LANCZOS)
+            if fmt == 'jpeg':
+                frame.save(target, 'JPEG', quality=QUALITY['jpeg'], optimize=True, progressive=True)
+            elif fmt == 'png':
+                frame.save(target, 'PNG', optimize=True)
+            elif fmt == 'webp':
+                frame.save(target, 'WEBP', quality=QUALITY['webp'], method=6)
+            else:
+                frame.save(target, 'AVIF', quality=QUALITY['avif'])
+    return logical_path, fmt, written
+
+
+def render_favicons(source, output_dir):
+    """Write the favicon set from the first frame of the logo"""
+    from PIL import Image
+
+    written = []
+    with Image.open(source) as image:
+        frame = image.convert('RGBA')
+        for name, sizes in FAVICONS.items():
+            target = os.path.join(output_dir, VARIANTS_DIR, 'favicon', name)
+            written.append(f'{VARIANTS_DIR}/favicon/{name}')
+            if _is_fresh(target, source):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if name.endswith('.ico'):
+                frame.save(target, 'ICO', sizes=[(size, size) for size in sizes])
+            else:
+                frame.resize((sizes[0], sizes[0]), Image.LANCZOS).save(target, 'PNG', optimize=True)
+    return written
+
+
+def build_images(static_folder, workers=None):
+    """Generate all variants and favicons; returns the variants manifest"""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        raise RuntimeError('Building image variants needs Pillow (pip install pillow)')
+    avif = features.check('avif')  # Pillow wheels without libavif skip the AVIF variants
+
+    manifest = {'images': {}, 'favicons': []}
+    tasks = []
+    source_root = os.path.join(static_folder, SOURCE_DIR)
+    for name in sorted(os.listdir(source_root)) if os.path.isdir(source_root) else []:
+        if not name.lower().endswith(SOURCE_EXTENSIONS):
+            continue
+        logical_path = f'{SOURCE_DIR}/{name}'
+        source = os.path.join(static_folder, logical_path)
+        with Image.open(source) as image:
+            width, height = image.size
+            animated = getattr(image, 'is_animated', False)
+        source_format = _source_format(name)
+        manifest['images'][logical_path] = {
+            'width': width,
+            'height': height,
+            'animated': animated,
+            'fallback': source_format if animated else plan_formats(source_format, False)[-1],
+            'variants': {},
+        }
+        for fmt in plan_formats(source_format, animated, avif):
+            tasks.append((source, static_folder, logical_path, fmt, plan_widths(logical_path, width)))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_variants, *task) for task in tasks]
+        favicon_source = os.path.join(static_folder, FAVICON_SOURCE)
+        favicons = pool.submit(render_favicons, favicon_source, static_folder) \
+            if os.path.isfile(favicon_source) else None
+        for future in futures:
+            logical_path, fmt, written = future.result()
+            manifest['images'][logical_path]['variants'][fmt] = written
+        if favicons is not None:
+            manifest['favicons'] = favicons.result()
+
+    with open(os.path.join(static_folder, VARIANTS_DIR, VARIANTS_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_variants(app):
+    """Read the variants manifest, or None if variants have not been built"""
+    path = os.path.join(app.static_folder, VARIANTS_DIR, VARIANTS_MANIFEST)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _attributes(attrs):
+    parts = []
+    for key, value in attrs.items():
+        if value is None or value is False:
+            continue
+        key = key.rstrip('_').replace('_', '-')
+        parts.append(key if value is True else f'{key}="{escape(value)}"')
+    return ' '.join(parts)
+
+
+def _srcset(entries):
+    from assets import asset_url
+    return ', '.join(f'{asset_url(path)} {width}w' for width, path in entries)
+
+
+def responsive_image(path, alt, sizes='100vw', loading='lazy', **attrs):
+    """<picture> markup with AVIF/WebP sources and a srcset <img> fallback"""
+    from assets import asset_url
+    variants = current_app.extensions.get('image_variants') or {}
+    info = variants.get('images', {}).get(path)
+    attrs = dict(attrs, alt=alt, loading=loading, decoding='async')
+    if info is None:
+        return Markup(f'<img src="{escape(asset_url(path))}" {_attributes(attrs)}>')
+
+    # Intrinsic size for layout stability; scale to a requested height
+    if 'height' in attrs and 'width' not in attrs:
+        attrs['width'] = round(info['width'] * int(attrs['height']) / info['height'])
+    else:
+        attrs.setdefault('width', info['width'])
+        attrs.setdefault('height', info['height'])
+
+    sources = []
+    for fmt, entries in info['variants'].items():
+        if fmt == info['fallback'] or not entries:
+            continue
+        sources.append(f'<source type="{MIME_TYPES[fmt]}" srcset="{escape(_srcset(entries))}" '
+                       f'sizes="{escape(sizes)}">')
+    fallback = info['variants'].get(info['fallback'])
+    if fallback:
+        img = (f'<img src="{escape(asset_url(fallback[-1][1]))}" srcset="{escape(_srcset(fallback))}" '
+               f'sizes="{escape(sizes)}" {_attributes(attrs)}>')
+    else:
+        img = f'<img src="{escape(asset_url(path))}" {_attributes(attrs)}>'
+    # Order sources best-first: AVIF, then WebP
+    sources.sort(key=lambda source: 'image/webp' in source)
+    return Markup(f'<picture>{"".join(sources)}{img}</picture>')
+
+
+def favicon_links():
+    """<link> tags for the favicon set, or the original logo before a build"""
+    from assets import asset_url
+    variants = current_app.extensions.get('image_variants') or {}
+    if not variants.get('favicons'):
+        return Markup(f'<link rel="icon" type="image/gif" href="{escape(asset_url(FAVICON_SOURCE))}">')
+    base = f'{VARIANTS_DIR}/favicon/'
+    return Markup('\n    '.join([
+        f'<link rel="icon" href="{escape(asset_url(base + "favicon.ico"))}" sizes="48x48">',
+        f'<link rel="icon" type="image/png" href="{escape(asset_url(base + "favicon-32.png"))}" sizes="32x32">',
+        f'<link rel="icon" type="image/png" href="{escape(asset_url(base + "icon-192.png"))}" sizes="192x192">',
+        f'<link rel="apple-touch-icon" href="{escape(asset_url(base + "apple-touch-icon.png"))}">',
+    ]))
+
+
+def init_images(app):
+    """Load the variants manifest once and expose the helpers to templates"""
+    app.extensions['image_variants'] = load_variants(app)
+    app.add_template_global(responsive_image)
+    app.add_template_global(favicon_links)
+
+
+@click.command('images')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+@with_appcontext
+def images_command(workers):
+    """Generate responsive image variants and favicons"""
+    manifest = build_images(current_app.static_folder, workers=workers)
+    count = sum(len(entries) for info in manifest['images'].values()
+                for entries in info['variants'].values())
+    click.echo(f'Wrote {count} image variants and {len(manifest["favicons"])} favicons '
+               f'into {os.path.join(current_app.static_folder, VARIANTS_DIR)}')
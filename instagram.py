@@ -0,0 +1,277 @@
+"""
+Server-side Instagram feed (via Behold.so)
+
+The homepage used to fetch https://feeds.behold.so/<BEHOLD_FEED_ID> from every
+visitor's browser. Now the server fetches the feed and renders the posts into
+index.html, and the thumbnails are served from /instagram/media/, so visitors
+make no third-party requests.
+
+The feed is kept in the application cache (cache.py, shared by all workers
+with the redis backend) with stale-while-revalidate semantics: it is fresh
+for INSTAGRAM_FEED_TTL seconds; after that the old posts are still served
+while one background thread fetches a new copy, for up to
+INSTAGRAM_FEED_MAX_STALE seconds. Each worker also checks every
+INSTAGRAM_REFRESH_INTERVAL seconds whether the feed is due, so busy and quiet
+sites alike usually render from a fresh copy. A failed fetch is not retried
+for FAILURE_BACKOFF seconds, so a Behold outage doesn't slow down the homepage.
+
+Thumbnails are only proxied for posts in the cached feed (this is not an
+open proxy), resized to THUMBNAIL_WIDTHS and encoded as WebP or JPEG
+depending on the browser's Accept header. Resizing needs Pillow; without it
+the original image is passed through.
+"""
+import hashlib
+import io
+import logging
+import threading
+import time
+
+import click
+import requests
+from flask import Blueprint, abort, current_app, request
+from flask.cli import with_appcontext
+
+from cache import cache
+
+instagram_log = logging.getLogger('instagram')
+
+FEED_NAMESPACE = 'instagram'
+MEDIA_NAMESPACE = 'instagram_media'
+FEED_KEY = 'feed'
+FAILURE_KEY = 'failure'
+FAILURE_BACKOFF = 60  # seconds
+MAX_POSTS = 6
+CAPTION_LENGTH = 60
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_QUALITY = {'webp': 75, 'jpeg': 80}
+MAX_MEDIA_BYTES = 5 * 1024 * 1024
+# Largest Behold size first: the thumbnail proxy downscales from it
+SOURCE_SIZES = ('large', 'medium', 'full', 'small')
+
+instagram = Blueprint('instagram', __name__)
+
+_refresh_lock = threading.Lock()
+
+
+def feed_url(config):
+    return config['BEHOLD_FEED_URL'].format(feed_id=config['BEHOLD_FEED_ID'])
+
+
+def _caption(post):
+    caption = (post.get('prunedCaption') or post.get('caption') or '').strip()
+    if len(caption) > CAPTION_LENGTH:
+        caption = caption[:CAPTION_LENGTH] + '...'
+    return caption
+
+
+def _source_media(post):
+    """(url, width, height) of the image to build thumbnails from"""
+    sizes = post.get('sizes') or {}
+    for name in SOURCE_SIZES:
+        size = sizes.get(name) or {}
+        if size.get('mediaUrl'):
+            return size['mediaUrl'], size.get('width'), size.get('height')
+    # Videos have a thumbnail image; photos a media URL
+    url = post.get('thumbnailUrl') if post.get('mediaType') == 'VIDEO' else post.get('mediaUrl')
+    return url or post.get('thumbnailUrl'), None, None
+
+
+def parse_feed(data):
+    """The posts of a Behold JSON feed as plain dicts for the template"""
+    raw_posts = data.get('posts', []) if isinstance(data, dict) else data
+    posts = []
+    for post in raw_posts or []:
+        media_url, width, height = _source_media(post)
+        permalink = post.get('permalink') or ''
+        if not post.get('id') or not media_url or not permalink.startswith('https://'):
+            continue
+        posts.append({
+            'id': str(post['id']),
+            'permalink': permalink,
+            'caption': _caption(post),
+            'media_url': media_url,
+            'width': width,
+            'height': height,
+        })
+        if len(posts) == MAX_POSTS:
+            break
+    return posts
+
+
+def fetch_feed(config):
+    """Download and parse the feed; raises on network or format errors"""
+    response = requests.get(feed_url(config), timeout=config['INSTAGRAM_FETCH_TIMEOUT'])
+    response.raise_for_status()
+    return parse_feed(response.json())
+
+
+def refresh_feed():
+    """Fetch the feed into the cache; returns the new entry, or None if the fetch failed"""
+    config = current_app.config
+    started = time.perf_counter()
+    try:
+        posts = fetch_feed(config)
+    except Exception as e:
+        instagram_log.warning("Instagram feed fetch failed: %s", e)
+        cache.set(FEED_NAMESPACE, FAILURE_KEY, True, ttl=FAILURE_BACKOFF)
+        return None
+    entry = {'fetched_at': time.time(), 'posts': posts}
+    cache.set(FEED_NAMESPACE, FEED_KEY, entry, ttl=config['INSTAGRAM_FEED_MAX_STALE'])
+    cache.delete(FEED_NAMESPACE, FAILURE_KEY)
+    instagram_log.info("Instagram feed refreshed", extra={
+        'posts': len(posts), 'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+    return entry
+
+
+def _refresh_in_background(app):
+    """Start one background refresh per process; no-op if one is running"""
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            with app.app_context():
+                refresh_feed()
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='instagram-refresh', daemon=True).start()
+    return True
+
+
+def _is_fresh(entry):
+    return time.time() - entry['fetched_at'] < current_app.config['INSTAGRAM_FEED_TTL']
+
+
+def get_instagram_feed():
+    """The cached feed ({'fetched_at', 'posts'}), refreshing it as needed"""
+    empty = {'fetched_at': None, 'posts': []}
+    if not current_app.config.get('BEHOLD_FEED_ID'):
+        return empty
+    entry = cache.get(FEED_NAMESPACE, FEED_KEY)
+    if entry is None:
+        # Nothing to show yet: fetch now, unless the last attempt just failed
+        if cache.get(FEED_NAMESPACE, FAILURE_KEY):
+            return empty
+        return refresh_feed() or empty
+    if not _is_fresh(entry) and not cache.get(FEED_NAMESPACE, FAILURE_KEY):
+        _refresh_in_background(current_app._get_current_object())
+    return entry
+
+
+def refresh_if_due():
+    """Refresh the feed if it is missing or stale; returns True if a fetch was made"""
+    if not current_app.config.get('BEHOLD_FEED_ID'):
+        return False
+    entry = cache.get(FEED_NAMESPACE, FEED_KEY)
+    if entry is not None and _is_fresh(entry):
+        return False
+    refresh_feed()
+    return True
+
+
+def start_feed_refresher(app):
+    """Background thread that keeps the feed fresh; returns it (None if disabled)"""
+    interval = app.config.get('INSTAGRAM_REFRESH_INTERVAL')
+    if not interval or not app.config.get('BEHOLD_FEED_ID'):
+        return None
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    refresh_if_due()
+            except Exception:
+                instagram_log.exception("Scheduled Instagram refresh failed")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='instagram-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
+def resize_thumbnail(data, width, fmt):
+    """Downscale an image to width and encode it as fmt ('webp' or 'jpeg')"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        frame = image.convert('RGB')
+        if frame.width > width:
+            frame = frame.resize((width, round(frame.height * width / frame.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == 'webp':
+            frame.save(out, 'WEBP', quality=THUMBNAIL_QUALITY['webp'], method=6)
+        else:
+            frame.save(out, 'JPEG', quality=THUMBNAIL_QUALITY['jpeg'], optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def _find_post(post_id):
+    entry = cache.get(FEED_NAMESPACE, FEED_KEY) or {'posts': []}
+    for post in entry['posts']:
+        if post['id'] == post_id:
+            return post
+    return None
+
+
+def _load_thumbnail(post, width, fmt):
+    """(bytes, mimetype) of a thumbnail, fetched and resized from the source image"""
+    response = requests.get(post['media_url'], timeout=current_app.config['INSTAGRAM_FETCH_TIMEOUT'])
+    response.raise_for_status()
+    if len(response.content) > MAX_MEDIA_BYTES:
+        raise ValueError(f"Instagram image is {len(response.content)} bytes")
+    try:
+        return resize_thumbnail(response.content, width, fmt), f'image/{fmt}'
+    except ImportError:
+        return response.content, response.headers.get('Content-Type', 'image/jpeg')
+
+
+def accepts_webp():
+    # Explicitly listed only: */* is also sent by browsers that can't decode WebP
+    return any(value == 'image/webp' and quality > 0 for value, quality in request.accept_mimetypes)
+
+
+@instagram.route('/instagram/media/<post_id>/<int:width>')
+def media(post_id, width):
+    """A resized thumbnail of a post in the cached feed"""
+    if width not in THUMBNAIL_WIDTHS:
+        abort(404)
+    post = _find_post(post_id)
+    if post is None:
+        abort(404)
+
+    fmt = 'webp' if accepts_webp() else 'jpeg'
+    source = hashlib.sha1(post['media_url'].encode()).hexdigest()[:12]
+    key = f'{post_id}:{width}:{fmt}:{source}'
+    thumbnail = cache.get(MEDIA_NAMESPACE, key)
+    if thumbnail is None:
+        try:
+            thumbnail = _load_thumbnail(post, width, fmt)
+        except Exception as e:
+            instagram_log.warning("Instagram image %s unavailable: %s", post_id, e)
+            abort(502)
+        cache.set(MEDIA_NAMESPACE, key, thumbnail, ttl=current_app.config['INSTAGRAM_MEDIA_TTL'])
+
+    data, mimetype = thumbnail
+    response = current_app.response_class(data, mimetype=mimetype)
+    response.set_etag(hashlib.sha1(data).hexdigest()[:32])
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['INSTAGRAM_MEDIA_TTL']}"
+    response.vary.add('Accept')
+    return response.make_conditional(request)
+
+
+@click.group('instagram')
+def instagram_cli():
+    """Instagram feed cache"""
+
+
+@instagram_cli.command('refresh')
+@with_appcontext
+def refresh_command():
+    """Fetch the Instagram feed into the cache now"""
+    if not current_app.config.get('BEHOLD_FEED_ID'):
+        raise click.ClickException('BEHOLD_FEED_ID is not set')
+    entry = refresh_feed()
+    if entry is None:
+        raise click.ClickException('Fetching the feed failed; see the log')
+    click.echo(f"Cached {len(entry['posts'])} Instagram posts")
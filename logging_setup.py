@@ -0,0 +1,176 @@
+"""
+Non-blocking structured logging for the Brunnsbo Musikklasser application
+
+Request threads only put records on a queue; a background QueueListener
+thread formats them (tracebacks included) as JSON lines and writes them out. Levels can be set per
+logger through the LOG_LEVELS config, and chatty DEBUG loggers listed in
+LOG_RATE_LIMITS are capped at a number of records per second so logging cost
+does not grow with traffic.
+
+The writer thread does not survive fork(), so a forked child (a gunicorn
+worker of the preloaded app) gets a fresh queue and its own listener.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Attributes present on every LogRecord - anything else came in via extra=
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the writer thread.
+
+    The stock prepare() runs the full formatter on the logging thread and
+    folds the traceback into the message. Here only the message arguments are
+    merged (they may be mutated after the call); exc_info stays on the record
+    so the listener's formatter renders it as its own `exception` field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger for DEBUG records.
+
+    limits maps a logger name to the maximum number of DEBUG records per
+    second; child loggers share their parent's bucket. Records over the limit
+    are dropped, and the next record let through carries a `suppressed` count.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _category(self, name):
+        while name:
+            if name in self.limits:
+                return name
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        category = self._category(record.name)
+        if category is None:
+            return True
+
+        rate = self.limits[category]
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(category, (rate, now, 0))
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1:
+                self._buckets[category] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[category] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def configure_logging(app):
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Safe to call once per create_app(); a previous listener is stopped and its
+    handler removed so tests that build several apps don't stack handlers.
+    """
+    global _listener, _queue_handler
+
+    shutdown_logging()
+
+    if app.config.get('LOG_FORMAT', 'json') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    rate_limits = app.config.get('LOG_RATE_LIMITS') or {}
+    if rate_limits:
+        # Filter before enqueueing so dropped records cost nothing downstream
+        _queue_handler.addFilter(RateLimitFilter(rate_limits))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    for name, level in (app.config.get('LOG_LEVELS') or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _queue_handler
+
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    """Give a forked child its own queue and writer thread"""
+    global _listener
+
+    if _listener is None:
+        return
+    # Records still queued in the parent are written by the parent; a new
+    # queue keeps the child from writing them a second time
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers,
+                                               respect_handler_level=_listener.respect_handler_level)
+    _listener.start()
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
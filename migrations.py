@@ -0,0 +1,321 @@
+"""
+Forward-only schema migrations for the Brunnsbo Musikklasser application
+
+Applied versions are recorded in the schema_migrations table. Pending
+migrations are applied in version order with `flask db upgrade`, and
+`flask db status` lists what has been applied.
+
+On PostgreSQL indexes are built with CREATE INDEX CONCURRENTLY outside a
+transaction, so a deploy never holds a write lock on busy tables such as
+application, swish_payment or event_tasks. On SQLite (local development and
+tests) the same operations run as plain transactional DDL.
+"""
+import logging
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+
+# Arbitrary key used with pg_advisory_lock so two deploys never migrate at once
+ADVISORY_LOCK_KEY = 7419202501
+
+# Give up instead of queueing behind long-running transactions
+LOCK_TIMEOUT = '5s'
+
+version_metadata = MetaData()
+schema_migrations = Table('schema_migrations', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+class CreateTables:
+    """Create every model table that does not exist yet"""
+
+    def is_transactional(self, dialect_name):
+        return True
+
+    def apply(self, connection):
+        from app import db
+        import models  # noqa: F401 - register the models on the metadata
+        db.metadata.create_all(bind=connection, checkfirst=True)
+
+    def __repr__(self):
+        return '<CreateTables>'
+
+
+class RunSQL:
+    """Run a raw SQL statement inside the migration transaction"""
+
+    def __init__(self, statement):
+        self.statement = statement
+
+    def is_transactional(self, dialect_name):
+        return True
+
+    def apply(self, connection):
+        connection.execute(text(self.statement))
+
+    def __repr__(self):
+        return f'<RunSQL {self.statement[:40]}>'
+
+
+class AddColumn:
+    """Add a nullable column if it is missing, optionally backfilling it"""
+
+    def __init__(self, table, column, column_type, backfill=None):
+        self.table = table
+        self.column = column
+        self.column_type = column_type
+        self.backfill = backfill
+
+    def is_transactional(self, dialect_name):
+        return True
+
+    def apply(self, connection):
+        # Databases created by the baseline migration already have it
+        existing = {column['name'] for column in inspect(connection).get_columns(self.table)}
+        if self.column not in existing:
+            # Nullable without a default: a catalog-only change on PostgreSQL
+            connection.execute(text(f'ALTER TABLE {self.table} ADD COLUMN {self.column} {self.column_type}'))
+        if self.backfill:
+            connection.execute(text(
+                f'UPDATE {self.table} SET {self.column} = {self.backfill} WHERE {self.column} IS NULL'))
+
+    def __repr__(self):
+        return f'<AddColumn {self.table}.{self.column}>'
+
+
+class SetNotNull:
+    """Backfill NULLs in a column, then make it NOT NULL (PostgreSQL only)"""
+
+    def __init__(self, table, column, backfill):
+        self.table = table
+        self.column = column
+        self.backfill = backfill
+
+    def is_transactional(self, dialect_name):
+        return True
+
+    def apply(self, connection):
+        connection.execute(text(
+            f'UPDATE {self.table} SET {self.column} = {self.backfill} WHERE {self.column} IS NULL'))
+        # SQLite can't alter a column; the model's nullable=False covers new databases
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f'ALTER TABLE {self.table} ALTER COLUMN {self.column} SET NOT NULL'))
+
+    def __repr__(self):
+        return f'<SetNotNull {self.table}.{self.column}>'
+
+
+class CreateIndex:
+    """Create an index, concurrently on PostgreSQL"""
+
+    def __init__(self, name, table, columns, unique=False):
+        self.name = name
+        self.table = table
+        self.columns = list(columns)
+        self.unique = unique
+
+    def is_transactional(self, dialect_name):
+        """Concurrent builds cannot run inside a transaction block"""
+        return dialect_name != 'postgresql'
+
+    def sql(self, dialect_name):
+        """Build the CREATE INDEX statement for a dialect"""
+        unique = 'UNIQUE ' if self.unique else ''
+        concurrently = 'CONCURRENTLY ' if dialect_name == 'postgresql' else ''
+        columns = ', '.join(self.columns)
+        return (f'CREATE {unique}INDEX {concurrently}IF NOT EXISTS {self.name} '
+                f'ON {self.table} ({columns})')
+
+    def apply(self, connection):
+        dialect_name = connection.dialect.name
+        if dialect_name == 'postgresql':
+            # A failed concurrent build leaves an INVALID index behind that
+            # IF NOT EXISTS would silently accept - drop it and start over
+            invalid = connection.execute(text(
+                'SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid '
+                'WHERE c.relname = :name AND NOT i.indisvalid'), {'name': self.name}).first()
+            if invalid:
+                logging.warning(f"Dropping invalid index {self.name} before rebuilding it")
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {self.name}'))
+        connection.execute(text(self.sql(dialect_name)))
+
+    def __repr__(self):
+        return f'<CreateIndex {self.name} ON {self.table}>'
+
+
+class DropIndex:
+    """Drop an index if it exists, concurrently on PostgreSQL"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def is_transactional(self, dialect_name):
+        return dialect_name != 'postgresql'
+
+    def sql(self, dialect_name):
+        concurrently = 'CONCURRENTLY ' if dialect_name == 'postgresql' else ''
+        return f'DROP INDEX {concurrently}IF EXISTS {self.name}'
+
+    def apply(self, connection):
+        connection.execute(text(self.sql(connection.dialect.name)))
+
+    def __repr__(self):
+        return f'<DropIndex {self.name}>'
+
+
+class Migration:
+    """A numbered, forward-only list of schema operations"""
+
+    def __init__(self, version, name, operations):
+        self.version = version
+        self.name = name
+        self.operations = operations
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d} {self.name}>'
+
+
+# All migrations, in the order they are applied. Never edit or remove an
+# entry that has shipped - add a new one instead.
+MIGRATIONS = [
+    Migration(1, 'baseline schema', [CreateTables()]),
+    Migration(2, 'event updated_at for conditional GET', [
+        AddColumn('event', 'updated_at', 'TIMESTAMP', backfill='created_at'),
+    ]),
+    Migration(3, 'indexes for hot queries', [
+        CreateIndex('ix_event_active_date', 'event', ['is_active', 'event_date']),
+        CreateIndex('ix_news_post_published_date', 'news_post', ['is_published', 'published_date']),
+        CreateIndex('ix_application_status_year_created', 'application',
+                    ['status', 'application_year', 'created_at']),
+        CreateIndex('ix_application_year_created', 'application', ['application_year', 'created_at']),
+        CreateIndex('ix_application_created', 'application', ['created_at']),
+        CreateIndex('ix_application_parent_email', 'application', ['parent_email']),
+        CreateIndex('ix_swish_payment_date_created', 'swish_payment', ['date_created']),
+        CreateIndex('ix_swish_payment_status', 'swish_payment', ['status']),
+        CreateIndex('ix_event_tasks_event_id', 'event_tasks', ['event_id']),
+        CreateIndex('ix_event_tasks_assigned_to_user_id', 'event_tasks', ['assigned_to_user_id']),
+        CreateIndex('ix_confirmation_codes_email_purpose_used', 'confirmation_codes',
+                    ['email', 'purpose', 'used']),
+        CreateIndex('ix_user_groups_group_id', 'user_groups', ['group_id', 'user_id']),
+        CreateIndex('ix_oauth_connections_provider_user', 'oauth_connections',
+                    ['provider', 'provider_user_id']),
+    ]),
+    # The composite indexes cover everything the single-column ones did, so
+    # those are dropped once their replacements exist
+    Migration(4, 'keyset indexes for the payment listing', [
+        CreateIndex('ix_swish_payment_created_id', 'swish_payment', ['date_created', 'id']),
+        CreateIndex('ix_swish_payment_status_created_id', 'swish_payment', ['status', 'date_created', 'id']),
+        DropIndex('ix_swish_payment_date_created'),
+        DropIndex('ix_swish_payment_status'),
+    ]),
+    # The payment listing seeks on (date_created, id); a NULL would drop out
+    Migration(5, 'swish_payment.date_created not null', [
+        SetNotNull('swish_payment', 'date_created',
+                   backfill='COALESCE(date_paid, date_cancelled, CURRENT_TIMESTAMP)'),
+    ]),
+]
+
+
+def ensure_version_table(engine):
+    """Create the schema_migrations table if needed"""
+    version_metadata.create_all(bind=engine, checkfirst=True)
+
+
+def applied_versions(engine):
+    """Return the set of migration versions already applied"""
+    ensure_version_table(engine)
+    with engine.connect() as connection:
+        rows = connection.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version))
+        return {row.version for row in rows}
+
+
+def pending_migrations(engine, migrations=None):
+    """Return the migrations not yet applied, in version order"""
+    migrations = MIGRATIONS if migrations is None else migrations
+    applied = applied_versions(engine)
+    return sorted((m for m in migrations if m.version not in applied), key=lambda m: m.version)
+
+
+def _apply_migration(engine, migration):
+    dialect_name = engine.dialect.name
+
+    with engine.begin() as connection:
+        if dialect_name == 'postgresql':
+            connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        for op in migration.operations:
+            if op.is_transactional(dialect_name):
+                op.apply(connection)
+
+    online = [op for op in migration.operations if not op.is_transactional(dialect_name)]
+    if online:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for op in online:
+                op.apply(connection)
+
+    with engine.begin() as connection:
+        connection.execute(schema_migrations.insert().values(
+            version=migration.version,
+            name=migration.name,
+            applied_at=datetime.utcnow()))
+
+
+def upgrade(engine, migrations=None, target=None):
+    """
+    Apply pending migrations up to and including target (default: all).
+
+    Returns the list of applied Migration objects.
+    """
+    ensure_version_table(engine)
+
+    lock_connection = None
+    if engine.dialect.name == 'postgresql':
+        lock_connection = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock_connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+
+    try:
+        applied = []
+        for migration in pending_migrations(engine, migrations):
+            if target is not None and migration.version > target:
+                break
+            logging.info(f"Applying migration {migration.version:04d}: {migration.name}")
+            _apply_migration(engine, migration)
+            applied.append(migration)
+        return applied
+    finally:
+        if lock_connection is not None:
+            lock_connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            lock_connection.close()
+
+
+@click.group('db')
+def db_cli():
+    """Database schema migrations"""
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this version')
+@with_appcontext
+def upgrade_command(target):
+    """Apply pending migrations"""
+    from app import db
+    applied = upgrade(db.engine, target=target)
+    if not applied:
+        click.echo('Database is up to date.')
+    for migration in applied:
+        click.echo(f'Applied {migration.version:04d} {migration.name}')
+
+
+@db_cli.command('status')
+@with_appcontext
+def status_command():
+    """List applied and pending migrations"""
+    from app import db
+    applied = applied_versions(db.engine)
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        state = 'applied' if migration.version in applied else 'pending'
+        click.echo(f'{migration.version:04d} {migration.name} [{state}]')
@@ -2,13 +2,16 @@ from app import db
 from datetime import datetime
 from sqlalchemy import String, Text, DateTime, Boolean, Integer, Table, ForeignKey
 from sqlalchemy.orm import relationship
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from passwords import hash_password, verify_password
+from permissions import role_mask
 
 # Association table for many-to-many relationship between users and groups
 user_groups = Table('user_groups', db.metadata,
     db.Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    db.Column('group_id', Integer, ForeignKey('groups.id'), primary_key=True)
+    db.Column('group_id', Integer, ForeignKey('groups.id'), primary_key=True),
+    # The primary key covers user -> groups; this one covers group -> users
+    db.Index('ix_user_groups_group_id', 'group_id', 'user_id'),
 )
 
 class Event(db.Model):
@@ -21,6 +24,7 @@ class Event(db.Model):
     ticket_url = db.Column(String(500))
     is_active = db.Column(Boolean, default=True)
     created_at = db.Column(DateTime, default=datetime.utcnow)
+    updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Parent-specific fields
     info_to_parents = db.Column(Text)  # Information visible only to parents
@@ -31,6 +35,11 @@ class Event(db.Model):
     
     # Relationship with tasks
     tasks = relationship('EventTask', back_populates='event', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # Upcoming active events (homepage, /evenemang)
+        db.Index('ix_event_active_date', 'is_active', 'event_date'),
+    )
     
     def __repr__(self):
         return f'<Evenemang {self.title}>'
@@ -54,7 +63,7 @@ class SwishPayment(db.Model):
     error_message = db.Column(String(1000))  # Increased size for detailed error messages
     
     # Timestamps
-    date_created = db.Column(DateTime, default=datetime.utcnow)
+    date_created = db.Column(DateTime, default=datetime.utcnow, nullable=False)
     date_paid = db.Column(DateTime)
     date_cancelled = db.Column(DateTime)
     
@@ -67,6 +76,12 @@ class SwishPayment(db.Model):
     user = relationship('User', foreign_keys=[user_id])
     application = relationship('Application', foreign_keys=[application_id])
     event = relationship('Event', foreign_keys=[event_id])
+
+    __table_args__ = (
+        # Keyset pagination on the admin payment listing: (date_created, id)
+        db.Index('ix_swish_payment_created_id', 'date_created', 'id'),
+        db.Index('ix_swish_payment_status_created_id', 'status', 'date_created', 'id'),
+    )
     
     def __repr__(self):
         return f'<SwishPayment {self.payee_payment_reference} - {self.status}>'
@@ -94,6 +109,15 @@ class Application(db.Model):
     email_confirmed_at = db.Column(DateTime)  # When email was confirmed
     admin_notes = db.Column(Text)  # Admin notes for the application
     created_at = db.Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Admin listing: filtered by status and/or year, newest first
+        db.Index('ix_application_status_year_created', 'status', 'application_year', 'created_at'),
+        db.Index('ix_application_year_created', 'application_year', 'created_at'),
+        db.Index('ix_application_created', 'created_at'),
+        # Email confirmation looks up the applicant's latest application
+        db.Index('ix_application_parent_email', 'parent_email'),
+    )
     
     def __repr__(self):
         return f'<Application {self.student_name} - {self.application_year}>'
@@ -107,6 +131,11 @@ class NewsPost(db.Model):
     published_date = db.Column(DateTime, default=datetime.utcnow)
     is_published = db.Column(Boolean, default=True)
     featured = db.Column(Boolean, default=False)
+
+    __table_args__ = (
+        # Latest published news (homepage)
+        db.Index('ix_news_post_published_date', 'is_published', 'published_date'),
+    )
     
     def __repr__(self):
         return f'<NewsPost {self.title}>'
@@ -137,6 +166,11 @@ class ConfirmationCode(db.Model):
     used_at = db.Column(DateTime)
     created_at = db.Column(DateTime, default=datetime.utcnow)
     expires_at = db.Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Replacing and verifying a user's codes
+        db.Index('ix_confirmation_codes_email_purpose_used', 'email', 'purpose', 'used'),
+    )
     
     def is_expired(self):
         """Check if the confirmation code is expired"""
@@ -170,18 +204,32 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Check if provided password matches hash"""
+        """Check if provided password matches hash, upgrading outdated hashes"""
         if not self.password_hash:
             return False  # OAuth-only users don't have passwords
-        return check_password_hash(self.password_hash, password)
+        valid, needs_rehash = verify_password(self.password_hash, password)
+        if needs_rehash:
+            # Saved by the caller's next commit (login updates last_login)
+            self.password_hash = hash_password(password)
+        return valid
     
     def has_role(self, role_name):
         """Check if user has a specific role"""
         return any(group.name == role_name for group in self.groups)
     
+    @property
+    def roles(self):
+        """Immutable set of role names"""
+        return frozenset(group.name for group in self.groups)
+    
+    @property
+    def role_mask(self):
+        """Roles as a bitmask (see permissions.ROLE_BITS)"""
+        return role_mask(self.roles)
+    
     def get_roles(self):
         """Get list of role names for this user"""
         return [group.name for group in self.groups]
@@ -263,6 +311,11 @@ class EventTask(db.Model):
     event = relationship('Event', back_populates='tasks')
     assigned_to = relationship('User', foreign_keys=[assigned_to_user_id])
     completed_by = relationship('User', foreign_keys=[completed_by_user_id])
+
+    __table_args__ = (
+        db.Index('ix_event_tasks_event_id', 'event_id'),
+        db.Index('ix_event_tasks_assigned_to_user_id', 'assigned_to_user_id'),
+    )
     
     @property
     def due_date(self):
@@ -312,7 +365,11 @@ class OAuthConnection(db.Model):
     user = relationship('User', back_populates='oauth_connections')
     
     # Unique constraint: one connection per provider per user
-    __table_args__ = (db.UniqueConstraint('user_id', 'provider', name='uq_user_provider'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'provider', name='uq_user_provider'),
+        # Google sign-in looks the connection up by the provider's user id
+        db.Index('ix_oauth_connections_provider_user', 'provider', 'provider_user_id'),
+    )
     
     def __repr__(self):
         return f'<OAuthConnection {self.provider} for user {self.user_id}>'
@@ -0,0 +1,104 @@
+"""
+Password hashing for the Brunnsbo Musikklasser application
+
+Wraps werkzeug's hashing with a configurable algorithm and cost
+(PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH). Verifying a password also
+reports whether the stored hash uses outdated parameters, so User.check_password
+can upgrade it transparently after a successful login.
+"""
+from flask import current_app, has_app_context
+from werkzeug.security import (DEFAULT_PBKDF2_ITERATIONS, check_password_hash,
+                               generate_password_hash)
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_SALT_LENGTH = 16
+
+# Verified against when the user does not exist, so a failed login costs the
+# same single hash verification whether or not the email is registered
+_dummy_hashes = {}
+
+
+def _setting(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def normalize_method(method):
+    """Expand a werkzeug method string to the full form stored in hashes"""
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', '32768', '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        raise ValueError(f"Unsupported password hash method: {method!r}")
+    if len(parts) > len(defaults):
+        raise ValueError(f"Invalid password hash method: {method!r}")
+    return ':'.join(parts + defaults[len(parts):])
+
+
+def current_method():
+    """The configured hash method, in normalized form"""
+    return normalize_method(_setting('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+
+def hash_password(password):
+    """Hash a password with the configured algorithm and cost"""
+    return generate_password_hash(password,
+                                  method=current_method(),
+                                  salt_length=_setting('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH))
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with parameters other than the configured ones"""
+    stored_method = password_hash.split('$', 1)[0]
+    try:
+        return normalize_method(stored_method) != current_method()
+    except ValueError:
+        return True
+
+
+def verify_password(password_hash, password):
+    """
+    Verify a password against a stored hash with exactly one hash computation.
+
+    Returns a (valid, needs_rehash) tuple. needs_rehash is only ever True for
+    valid passwords.
+    """
+    if not password_hash:
+        return False, False
+    if not check_password_hash(password_hash, password):
+        return False, False
+    return True, needs_rehash(password_hash)
+
+
+def dummy_verify(password):
+    """Spend one verification on a throwaway hash (for unknown users)"""
+    method = current_method()
+    if method not in _dummy_hashes:
+        _dummy_hashes[method] = hash_password('dummy-password')
+    check_password_hash(_dummy_hashes[method], password)
+    return False
+
+
+def benchmark(method=None, rounds=20, password='correct horse battery staple'):
+    """
+    Measure single-core verification throughput for a hash method.
+
+    Returns a dict with the method, mean verification time in milliseconds and
+    the resulting logins per second per core.
+    """
+    import time
+
+    method = normalize_method(method or current_method())
+    password_hash = generate_password_hash(password, method=method)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        check_password_hash(password_hash, password)
+    elapsed = time.perf_counter() - started
+    return {
+        'method': method,
+        'verify_ms': elapsed / rounds * 1000,
+        'logins_per_second_per_core': rounds / elapsed,
+    }
@@ -6,19 +6,47 @@ from functools import wraps
 from flask import abort, redirect, url_for, flash
 from flask_login import current_user, login_required
 
+# Each role gets one bit. A user's roles are resolved once into an integer
+# mask (User.role_mask / UserIdentity.role_mask), so a permission check is a
+# single AND against a mask computed when the decorator is applied.
+ROLE_BITS = {
+    'admin': 1 << 0,
+    'applications_manager': 1 << 1,
+    'event_manager': 1 << 2,
+    'parent': 1 << 3,
+}
+
+def role_mask(role_names):
+    """
+    Combine role names into a bitmask.
+    Unknown names are ignored, so they never grant access.
+    """
+    mask = 0
+    for name in role_names:
+        mask |= ROLE_BITS.get(name, 0)
+    return mask
+
+def _required_mask(role_names):
+    unknown = [name for name in role_names if name not in ROLE_BITS]
+    if unknown:
+        raise ValueError(f"Unknown role(s) in permission check: {', '.join(unknown)}")
+    return role_mask(role_names)
+
 def requires_role(role_name):
     """
     Decorator that requires a user to have a specific role
     Usage: @requires_role('admin')
     """
+    required = _required_mask([role_name])
+
     def decorator(f):
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
-                return redirect(url_for('login'))
+                return redirect(url_for('main.login'))
             
-            if not current_user.has_role(role_name):
+            if not current_user.role_mask & required:
                 flash(f'Du saknar behörighet för denna sida. Krävs: {role_name}', 'error')
                 abort(403)
             
@@ -31,14 +59,16 @@ def requires_any_role(*role_names):
     Decorator that requires a user to have at least one of the specified roles
     Usage: @requires_any_role('admin', 'applications_manager')
     """
+    required = _required_mask(role_names)
+
     def decorator(f):
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
-                return redirect(url_for('login'))
+                return redirect(url_for('main.login'))
             
-            if not any(current_user.has_role(role) for role in role_names):
+            if not current_user.role_mask & required:
                 roles_str = ', '.join(role_names)
                 flash(f'Du saknar behörighet för denna sida. Krävs en av: {roles_str}', 'error')
                 abort(403)
@@ -69,6 +99,6 @@ def authenticated_required(f):
     @login_required
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
\ No newline at end of file
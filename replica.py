@@ -0,0 +1,158 @@
+"""
+Read-replica routing for read-only public pages
+
+When REPLICA_DATABASE_URI is set, create_app() registers it as the 'replica'
+bind. Views decorated with @read_replica send their SELECTs there, as long
+as the replica is reachable and its replication lag is within REPLICA_MAX_LAG
+seconds (checked at most every REPLICA_CHECK_INTERVAL seconds). Everything
+else - writes, flushes, undecorated views, CLI commands - uses the primary.
+
+If the replica fails mid-request, or a row is missing because it has not
+replicated yet (404), the view is run again against the primary. Code that
+fills a shared cache reads inside on_primary(), so a lagging replica never
+stores stale rows for every worker.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from werkzeug.exceptions import NotFound
+
+REPLICA_BIND = 'replica'
+
+replica_log = logging.getLogger('replica')
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica inside @read_replica views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and g_route() == REPLICA_BIND
+                and (clause is None or clause.is_select)):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def g_route():
+    """The bind chosen for the current request, if any"""
+    if has_request_context():
+        return g.get('db_route')
+    return None
+
+
+@contextmanager
+def on_primary():
+    """Send the enclosed queries to the primary, even inside a @read_replica view"""
+    route = g.pop('db_route', None) if has_request_context() else None
+    try:
+        yield
+    finally:
+        if route is not None:
+            g.db_route = route
+
+
+class ReplicaMonitor:
+    """Cached health and replication lag of the replica"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_at = None
+        self.healthy = False
+        self.lag = None
+
+    def measure_lag(self, engine):
+        """Replication lag in seconds (0 for databases without replication)"""
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                # NULL on a server that is not a standby
+                lag = connection.execute(text(
+                    'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')).scalar()
+                return float(lag or 0)
+            connection.execute(text('SELECT 1'))
+            return 0.0
+
+    def refresh(self, engine, interval):
+        with self._lock:
+            now = time.monotonic()
+            if self.checked_at is not None and now - self.checked_at < interval:
+                return
+            self.checked_at = now
+        try:
+            lag = self.measure_lag(engine)
+            healthy = True
+        except DBAPIError as e:
+            replica_log.warning("Replica health check failed: %s", e)
+            lag, healthy = None, False
+        with self._lock:
+            self.lag, self.healthy = lag, healthy
+
+    def mark_unhealthy(self):
+        """Stop routing to the replica until the next health check"""
+        with self._lock:
+            self.healthy = False
+            self.checked_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.checked_at = None
+            self.healthy = False
+            self.lag = None
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def replica_usable(max_lag=None):
+    """True if the replica is configured, reachable and within max_lag seconds"""
+    from flask import current_app
+    from app import db
+
+    engine = db.engines.get(REPLICA_BIND)
+    if engine is None:
+        return False
+    replica_monitor.refresh(engine, current_app.config.get('REPLICA_CHECK_INTERVAL', 10))
+    if max_lag is None:
+        max_lag = current_app.config.get('REPLICA_MAX_LAG', 5)
+    return replica_monitor.healthy and replica_monitor.lag is not None and replica_monitor.lag <= max_lag
+
+
+def read_replica(view=None, *, max_lag=None):
+    """
+    Route a read-only view's queries to the replica.
+    Usage: @read_replica or @read_replica(max_lag=1)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not replica_usable(max_lag):
+                return f(*args, **kwargs)
+
+            from app import db
+            g.db_route = REPLICA_BIND
+            try:
+                return f(*args, **kwargs)
+            except NotFound:
+                # The row may not have reached the replica yet
+                replica_log.debug("Not found on replica, retrying %s on primary", f.__name__)
+            except DBAPIError as e:
+                replica_log.warning("Replica query failed, retrying %s on primary: %s", f.__name__, e)
+                replica_monitor.mark_unhealthy()
+                db.session.rollback()
+            finally:
+                g.pop('db_route', None)
+
+            db.session.expire_all()
+            return f(*args, **kwargs)
+        return decorated_function
+
+    if view is not None:
+        return decorator(view)
+    return decorator
@@ -1,77 +1,56 @@
-import os
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify
 from flask_mail import Message
 from flask_login import login_user, logout_user, login_required, current_user
-from app import app, db, mail
-from models import Event, Application, NewsPost, Contact, User, Group, EventTask, ConfirmationCode, SwishPayment, OAuthConnection
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from app import db, mail
+from models import Event, Application, Contact, User, Group, EventTask, ConfirmationCode, SwishPayment, OAuthConnection
 from forms import ApplicationForm, ContactForm, LoginForm, EventForm, ChangePasswordForm, CreateAdminForm, EditApplicationForm, CreateUserForm, EventTaskForm, ForgotPasswordForm, ResetPasswordForm, RegisterForm, VerifyEmailForm, SwishPaymentForm, DonationForm
 from utils import create_confirmation_code, verify_confirmation_code, generate_confirmation_code
-from google_auth import google_auth
+from passwords import dummy_verify
+from db_pool import pool_stats
+from cache import cache
+from compression import compression_stats
+from replica import read_replica
+from homepage import get_homepage_data
+from instagram import get_instagram_feed
+from streaming import stream_page, stream_rows
+import conditional as conditional_pages
+from conditional import conditional
 from permissions import (admin_required, applications_manager_required,
                          event_manager_required, parent_access_required,
                          authenticated_required, requires_any_role)
-from user_utils import get_assignable_users, can_manage_tasks, can_access_tasks, get_user_choices_for_forms
-from datetime import datetime, timedelta
+from user_utils import (can_manage_tasks, can_access_tasks, get_user_choices_for_forms,
+                        name_or_email_matches, search_assignable_users)
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
 import logging
 
-# Register Google OAuth blueprint
-app.register_blueprint(google_auth, url_prefix='/auth')
+main = Blueprint('main', __name__)
 
+login_log = logging.getLogger('routes.login')
 
-@app.route('/')
+
+@main.route('/')
+@read_replica
+@conditional(conditional_pages.homepage)
 def index():
     """Homepage with latest news and upcoming events"""
-    # Get upcoming events
-    upcoming_events = Event.query.filter(
-        Event.event_date > datetime.utcnow(),
-        Event.is_active == True).order_by(
-            Event.event_date.asc()).limit(3).all()
-
-    # Get latest news
-    latest_news = NewsPost.query.filter(
-        NewsPost.is_published == True).order_by(
-            NewsPost.published_date.desc()).limit(3).all()
-
-    # Check if we're in application reminder period (Dec 1 - Jan 15)
-    now = datetime.now()
-    current_year = now.year
-
-    # December 1st of current year
-    dec_1_current = datetime(current_year, 12, 1)
-    # January 15th of next year
-    jan_15_next = datetime(current_year + 1, 1, 15, 23, 59, 59)
+    # Events, news and the application reminder state come from the
+    # homepage cache, which is cleared whenever events or news change
+    return render_template('index.html', instagram_posts=get_instagram_feed()['posts'],
+                           **get_homepage_data())
 
-    # Also check if we're in Jan 1-15 of current year (from previous year's Dec)
-    jan_15_current = datetime(current_year, 1, 15, 23, 59, 59)
-    dec_1_previous = datetime(current_year - 1, 12, 1)
 
-    show_application_reminder = (
-        (dec_1_current <= now <= jan_15_next)
-        or  # Dec 1 current year to Jan 15 next year
-        (dec_1_previous <= now <= jan_15_current
-         )  # Dec 1 previous year to Jan 15 current year
-    )
-
-    # Calculate dynamic school year for front page as well
-    if now.month >= 7:  # July-December: next school year
-        school_year = f"{current_year + 1}/{current_year + 2}"
-    else:  # January-June: current school year
-        school_year = f"{current_year}/{current_year + 1}"
-
-    return render_template('index.html',
-                           upcoming_events=upcoming_events,
-                           latest_news=latest_news,
-                           show_application_reminder=show_application_reminder,
-                           school_year=school_year)
-
-
-@app.route('/om-oss')
+@main.route('/om-oss')
+@read_replica
+@conditional(conditional_pages.static_page)
 def about():
     """About page with information about the school and teachers"""
     return render_template('om-oss.html')
 
 
-@app.route('/ansokan', methods=['GET', 'POST'])
+@main.route('/ansokan', methods=['GET', 'POST'])
 def application():
     """Application page for music classes"""
     form = ApplicationForm()
@@ -135,7 +114,7 @@ def application():
 
             # Send confirmation email with verification link
             try:
-                confirmation_url = url_for('confirm_email',
+                confirmation_url = url_for('main.confirm_email',
                                            code=confirmation.code,
                                            _external=True)
                 msg = Message(
@@ -171,7 +150,7 @@ Telefon: 031-366 86 50
             flash(
                 'Din ansökan har skickats! Kontrollera din e-post och klicka på bekräftelselänken för att slutföra processen.',
                 'success')
-            return redirect(url_for('application'))
+            return redirect(url_for('main.application'))
 
         except Exception as e:
             db.session.rollback()
@@ -185,7 +164,7 @@ Telefon: 031-366 86 50
                            school_year=school_year)
 
 
-@app.route('/confirm-email/<code>')
+@main.route('/confirm-email/<code>')
 def confirm_email(code):
     """Handle email confirmation for applications"""
     try:
@@ -203,7 +182,7 @@ def confirm_email(code):
 
         if not confirmation:
             flash('Ogiltig eller utgången bekräftelselänk.', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
 
         # Find application by email and mark as confirmed
         application = Application.query.filter_by(
@@ -224,15 +203,15 @@ def confirm_email(code):
         else:
             flash('Ingen ansökan hittades för denna e-postadress.', 'warning')
 
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     except Exception as e:
         logging.error(f"Error confirming email: {str(e)}")
         flash('Ett fel uppstod vid bekräftelse av e-post.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
 
-@app.route('/admin/applications')
+@main.route('/admin/applications')
 @applications_manager_required
 def admin_applications():
     """Admin page to view and manage applications"""
@@ -272,7 +251,7 @@ def admin_applications():
                            status_options=status_options)
 
 
-@app.route('/admin/applications/<int:application_id>', methods=['GET', 'POST'])
+@main.route('/admin/applications/<int:application_id>', methods=['GET', 'POST'])
 @applications_manager_required
 def admin_edit_application(application_id):
     """Edit specific application"""
@@ -296,7 +275,7 @@ def admin_edit_application(application_id):
             logging.info(
                 f"Application {application_id} updated by admin {current_user.username}"
             )
-            return redirect(url_for('admin_applications'))
+            return redirect(url_for('main.admin_applications'))
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error updating application: {str(e)}")
@@ -313,7 +292,7 @@ def admin_edit_application(application_id):
                            application=application)
 
 
-@app.route('/kontakt', methods=['GET', 'POST'])
+@main.route('/kontakt', methods=['GET', 'POST'])
 def contact():
     """Contact page with form"""
     form = ContactForm()
@@ -359,7 +338,7 @@ Skickat: {datetime.now().strftime('%Y-%m-%d %H:%M')}
             flash(
                 'Tack för ditt meddelande! Vi återkommer så snart som möjligt.',
                 'success')
-            return redirect(url_for('contact'))
+            return redirect(url_for('main.contact'))
 
         except Exception as e:
             db.session.rollback()
@@ -371,34 +350,49 @@ Skickat: {datetime.now().strftime('%Y-%m-%d %H:%M')}
     return render_template('kontakt.html', form=form)
 
 
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
 
 # Context processor to make current year and datetime available in all templates
-@app.context_processor
+@main.app_context_processor
 def inject_current_year():
     return {
         'current_year': datetime.now().year,
         'moment': lambda: datetime,
-        'behold_feed_id': os.environ.get('BEHOLD_FEED_ID', ''),
         'current_user': current_user
     }
 
 
-@app.route('/evenemang')
+@main.route('/evenemang')
+@read_replica
+@conditional(conditional_pages.events_page, anonymous_only=True)
 def events():
     """Page showing all upcoming events with parent/admin info when logged in"""
-    upcoming_events = Event.query.filter(Event.event_date > datetime.utcnow(),
-                                         Event.is_active == True).order_by(
-                                             Event.event_date.asc()).all()
+    # One query: coordinators joined in, task counts from a grouped subquery
+    # over the upcoming events' tasks only
+    upcoming = (Event.event_date > datetime.utcnow(), Event.is_active == True)
+    task_counts = select(
+        EventTask.event_id,
+        func.count(EventTask.id).label('total'),
+        func.count(case((EventTask.completed == True, EventTask.id))).label('completed'),
+    ).where(EventTask.event_id.in_(select(Event.id).where(*upcoming))) \
+        .group_by(EventTask.event_id).subquery()
+    upcoming_events = db.session.execute(
+        select(Event,
+               func.coalesce(task_counts.c.total, 0),
+               func.coalesce(task_counts.c.completed, 0))
+        .outerjoin(task_counts, task_counts.c.event_id == Event.id)
+        .options(joinedload(Event.coordinator))
+        .where(*upcoming)
+        .order_by(Event.event_date.asc())).all()
 
     # Check if user has parent access or admin access for enhanced event information
     show_parent_info = False
@@ -418,7 +412,7 @@ def events():
                            show_admin_info=show_admin_info)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     """User login page"""
     if current_user.is_authenticated:
@@ -426,37 +420,43 @@ def login():
         next_page = request.args.get('next')
         if next_page and next_page.startswith('/'):
             return redirect(next_page)
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     form = LoginForm()
 
     if request.method == 'POST':
-        # Log CSRF token for debugging
-        logging.debug(f"Login attempt from {request.remote_addr}")
-        logging.debug(f"Form CSRF token: {form.csrf_token.data}")
-        logging.debug(
-            f"Session CSRF token: {session.get('csrf_token', 'Not found')}")
-        logging.debug(f"Form validation errors: {form.errors}")
-        logging.debug(
-            f"User-Agent: {request.headers.get('User-Agent', 'Unknown')}")
-        logging.debug(f"Cookies: {dict(request.cookies)}")
-
         # Validate form manually without CSRF for now to test basic login
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
 
-        logging.debug(f"Email from form: {email}")
-        logging.debug(f"Password length: {len(password) if password else 0}")
+        # Log CSRF token for debugging (skipped entirely unless DEBUG is enabled)
+        if login_log.isEnabledFor(logging.DEBUG):
+            login_log.debug(
+                "Login attempt",
+                extra={
+                    'remote_addr': request.remote_addr,
+                    'form_csrf_token': form.csrf_token.data,
+                    'session_csrf_token': session.get('csrf_token', 'Not found'),
+                    'form_errors': form.errors,
+                    'user_agent': request.headers.get('User-Agent', 'Unknown'),
+                    'cookies': dict(request.cookies),
+                    'email': email,
+                    'password_length': len(password) if password else 0,
+                })
 
         if email and password:
             user = User.query.filter_by(email=email).first()
-            logging.debug(f"User found: {user is not None}")
+            # Exactly one hash verification per attempt, known user or not
             if user:
-                logging.debug(f"User active: {user.active}")
-                logging.debug(
-                    f"Password check: {user.check_password(password)}")
+                password_ok = user.check_password(password)
+            else:
+                password_ok = dummy_verify(password)
+            if login_log.isEnabledFor(logging.DEBUG):
+                login_log.debug("User found: %s, active: %s, password ok: %s",
+                                user is not None, user.active if user else None,
+                                password_ok)
 
-            if user and user.check_password(password) and user.active:
+            if user and password_ok and user.active:
                 # Check if user wants to be remembered
                 remember_me = request.form.get('remember_me') == 'y'
                 login_user(user, remember=remember_me)
@@ -464,11 +464,11 @@ def login():
                 if remember_me:
                     # Set session for 1 year if remember me is checked
                     session.permanent = True
-                    app.permanent_session_lifetime = timedelta(days=365)
+                    current_app.permanent_session_lifetime = timedelta(days=365)
                 else:
                     # Set session for 24 hours for regular login
                     session.permanent = True
-                    app.permanent_session_lifetime = timedelta(hours=24)
+                    current_app.permanent_session_lifetime = timedelta(hours=24)
 
                 session['user_id'] = str(user.id)
                 user.last_login = datetime.utcnow()
@@ -481,7 +481,7 @@ def login():
 
                 next_page = request.args.get('next')
                 if not next_page or not next_page.startswith('/'):
-                    next_page = url_for('index')
+                    next_page = url_for('main.index')
                 return redirect(next_page)
             else:
                 logging.warning(f"Failed login attempt for email: {email}")
@@ -496,10 +496,10 @@ def login():
     return render_template('login.html', form=form)
 
 
-@app.route('/debug/session')
+@main.route('/debug/session')
 def debug_session():
     """Debug endpoint to check session and CSRF status"""
-    if not app.debug:
+    if not current_app.debug:
         return "Debug endpoint only available in debug mode", 403
 
     debug_info = {
@@ -518,9 +518,9 @@ def debug_session():
         'user_id_in_session':
         session.get('user_id', 'None'),
         'session_cookie_secure':
-        app.config.get('SESSION_COOKIE_SECURE'),
+        current_app.config.get('SESSION_COOKIE_SECURE'),
         'wtf_csrf_time_limit':
-        app.config.get('WTF_CSRF_TIME_LIMIT'),
+        current_app.config.get('WTF_CSRF_TIME_LIMIT'),
         'cookies_received':
         dict(request.cookies),
         'session_permanent':
@@ -530,33 +530,33 @@ def debug_session():
         'session_contents':
         dict(session),
         'remember_cookie_duration':
-        str(app.config.get('REMEMBER_COOKIE_DURATION', 'Not set')),
+        str(current_app.config.get('REMEMBER_COOKIE_DURATION', 'Not set')),
         'current_session_lifetime':
-        str(app.permanent_session_lifetime),
+        str(current_app.permanent_session_lifetime),
     }
 
     return jsonify(debug_info)
 
 
-@app.route('/admin/logout')
+@main.route('/admin/logout')
 @authenticated_required
 def admin_logout():
     """Admin logout"""
     logout_user()
     flash('Du har loggats ut.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/admin/events')
+@main.route('/admin/events')
 @event_manager_required
 def admin_events():
     """Admin page for managing events"""
-    events = Event.query.order_by(Event.event_date.desc()).all()
-    return render_template('admin_events.html', events=events)
+    events = stream_rows(select(Event).order_by(Event.event_date.desc()))
+    return stream_page('admin_events.html', events=events)
 
 
 # User management routes
-@app.route('/admin/users/<int:user_id>/roles', methods=['GET', 'POST'])
+@main.route('/admin/users/<int:user_id>/roles', methods=['GET', 'POST'])
 @admin_required
 def admin_user_roles(user_id):
     """Manage user roles"""
@@ -580,7 +580,7 @@ def admin_user_roles(user_id):
 
         db.session.commit()
         flash(f'Roller och status uppdaterade för {user.username}', 'success')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('main.admin_users'))
 
     # Get all available groups
     all_groups = Group.query.all()
@@ -592,7 +592,7 @@ def admin_user_roles(user_id):
                            user_groups=user_groups)
 
 
-@app.route('/profile')
+@main.route('/profile')
 @authenticated_required
 def user_profile():
     """User profile page for all authenticated users"""
@@ -602,7 +602,7 @@ def user_profile():
 # Remove the separate parent info route since we integrated it into the main events page
 
 
-@app.route('/events/<int:event_id>/tasks')
+@main.route('/events/<int:event_id>/tasks')
 @requires_any_role('parent', 'event_manager', 'admin')
 def event_tasks(event_id):
     """View and manage tasks for a specific event"""
@@ -612,7 +612,7 @@ def event_tasks(event_id):
     return render_template('event_tasks.html', event=event, tasks=tasks)
 
 
-@app.route('/events/<int:event_id>/tasks/<int:task_id>/complete',
+@main.route('/events/<int:event_id>/tasks/<int:task_id>/complete',
            methods=['POST'])
 @requires_any_role('parent', 'event_manager', 'admin')
 def complete_task(event_id, task_id):
@@ -626,11 +626,11 @@ def complete_task(event_id, task_id):
         db.session.commit()
         flash('Uppgift markerad som slutförd!', 'success')
 
-    return redirect(url_for('event_tasks', event_id=event_id))
+    return redirect(url_for('main.event_tasks', event_id=event_id))
 
 
 # Task management routes for event managers
-@app.route('/admin/events/<int:event_id>/tasks/new', methods=['GET', 'POST'])
+@main.route('/admin/events/<int:event_id>/tasks/new', methods=['GET', 'POST'])
 @requires_any_role('event_manager', 'admin')
 def admin_create_task(event_id):
     """Create new task for an event"""
@@ -657,7 +657,7 @@ def admin_create_task(event_id):
             db.session.commit()
 
             flash('Uppgift skapad!', 'success')
-            return redirect(url_for('admin_event_tasks', event_id=event_id))
+            return redirect(url_for('main.admin_event_tasks', event_id=event_id))
 
         except Exception as e:
             db.session.rollback()
@@ -670,23 +670,35 @@ def admin_create_task(event_id):
                            title='Skapa uppgift')
 
 
-@app.route('/admin/events/<int:event_id>/tasks')
+@main.route('/admin/events/<int:event_id>/tasks')
 @requires_any_role('event_manager', 'admin')
 def admin_event_tasks(event_id):
     """Manage tasks for a specific event"""
     event = Event.query.get_or_404(event_id)
-    tasks = EventTask.query.filter_by(event_id=event_id).all()
-
-    # Get all assignable users for reassignment dropdown
-    assignable_users = get_assignable_users()
+    # Assignees and completers in the same query; reassignment uses the
+    # user-search typeahead instead of a list of every assignable user
+    tasks = EventTask.query.options(
+        joinedload(EventTask.assigned_to),
+        joinedload(EventTask.completed_by)).filter_by(
+            event_id=event_id).order_by(EventTask.id).all()
 
     return render_template('admin_event_tasks.html',
                            event=event,
-                           tasks=tasks,
-                           assignable_users=assignable_users)
+                           tasks=tasks)
+
+
+@main.route('/admin/users/search')
+@requires_any_role('event_manager', 'admin')
+def admin_user_search():
+    """JSON search of assignable users for the task assignment typeahead"""
+    term = request.args.get('q', '').strip()
+    if len(term) < 2:
+        return jsonify({'users': []})
+    users = search_assignable_users(term, exclude_id=request.args.get('exclude', type=int))
+    return jsonify({'users': users})
 
 
-@app.route('/admin/tasks/<int:task_id>/edit', methods=['GET', 'POST'])
+@main.route('/admin/tasks/<int:task_id>/edit', methods=['GET', 'POST'])
 @requires_any_role('event_manager', 'admin')
 def admin_edit_task(task_id):
     """Edit an existing task"""
@@ -720,7 +732,7 @@ def admin_edit_task(task_id):
             db.session.commit()
 
             flash('Uppgift uppdaterad!', 'success')
-            return redirect(url_for('admin_event_tasks', event_id=event.id))
+            return redirect(url_for('main.admin_event_tasks', event_id=event.id))
 
         except Exception as e:
             db.session.rollback()
@@ -734,7 +746,7 @@ def admin_edit_task(task_id):
                            title='Redigera uppgift')
 
 
-@app.route('/admin/tasks/<int:task_id>/delete', methods=['POST'])
+@main.route('/admin/tasks/<int:task_id>/delete', methods=['POST'])
 @requires_any_role('event_manager', 'admin')
 def admin_delete_task(task_id):
     """Delete a task"""
@@ -750,10 +762,10 @@ def admin_delete_task(task_id):
         logging.error(f"Error deleting task: {str(e)}")
         flash('Ett fel uppstod när uppgiften skulle tas bort.', 'error')
 
-    return redirect(url_for('admin_event_tasks', event_id=event_id))
+    return redirect(url_for('main.admin_event_tasks', event_id=event_id))
 
 
-@app.route('/user/tasks')
+@main.route('/user/tasks')
 @requires_any_role('parent', 'event_manager', 'admin')
 def user_tasks():
     """Personal task management page for parents"""
@@ -764,7 +776,7 @@ def user_tasks():
     return render_template('parent_tasks.html', tasks=tasks)
 
 
-@app.route('/user/tasks/<int:task_id>/complete', methods=['POST'])
+@main.route('/user/tasks/<int:task_id>/complete', methods=['POST'])
 @requires_any_role('parent', 'event_manager', 'admin')
 def complete_user_task(task_id):
     """Allow parents to complete their assigned tasks"""
@@ -774,12 +786,12 @@ def complete_user_task(task_id):
     if task.assigned_to_user_id != current_user.id:
         flash('Du kan endast slutföra uppgifter som är tilldelade till dig.',
               'error')
-        return redirect(url_for('user_tasks'))
+        return redirect(url_for('main.user_tasks'))
 
     # Check if already completed
     if task.completed_at:
         flash('Denna uppgift är redan slutförd.', 'info')
-        return redirect(url_for('user_tasks'))
+        return redirect(url_for('main.user_tasks'))
 
     try:
         task.completed_at = datetime.utcnow()
@@ -792,41 +804,42 @@ def complete_user_task(task_id):
         logging.error(f"Error completing task: {str(e)}")
         flash('Ett fel uppstod när uppgiften skulle slutföras.', 'error')
 
-    return redirect(url_for('user_tasks'))
+    return redirect(url_for('main.user_tasks'))
 
 
-@app.route('/admin/tasks/<int:task_id>/reassign', methods=['POST'])
+@main.route('/admin/tasks/<int:task_id>/reassign', methods=['POST'])
 @requires_any_role('event_manager', 'admin')
 def admin_reassign_task(task_id):
     """Reassign a task to a different user"""
     task = EventTask.query.get_or_404(task_id)
-    new_assignee_id = request.form.get('new_assignee')
+    new_assignee_id = request.form.get('new_assignee', type=int)
 
     if not new_assignee_id:
         flash('Ingen användare vald för omtilldelning.', 'error')
-        return redirect(url_for('admin_event_tasks', event_id=task.event_id))
+        return redirect(url_for('main.admin_event_tasks', event_id=task.event_id))
 
     # Verify the new assignee exists and can be assigned tasks
-    new_assignee = User.query.get(new_assignee_id)
-    if not new_assignee:
+    new_assignee = db.session.get(User, new_assignee_id)
+    if not new_assignee or not new_assignee.active:
         flash('Användaren kunde inte hittas.', 'error')
-        return redirect(url_for('admin_event_tasks', event_id=task.event_id))
+        return redirect(url_for('main.admin_event_tasks', event_id=task.event_id))
 
     # Check if the new assignee can access tasks (parent, event_manager, or admin)
     if not can_access_tasks(new_assignee):
         flash(
             'Uppgifter kan endast tilldelas föräldrar, eventansvariga eller administratörer.',
             'error')
-        return redirect(url_for('admin_event_tasks', event_id=task.event_id))
+        return redirect(url_for('main.admin_event_tasks', event_id=task.event_id))
 
     try:
-        old_assignee = task.assigned_to_user.first_name + ' ' + task.assigned_to_user.last_name if task.assigned_to_user else 'Ingen'
-        task.assigned_to_user_id = new_assignee_id
+        old_assignee = task.assigned_to.first_name + ' ' + task.assigned_to.last_name if task.assigned_to else 'Ingen'
+        task.assigned_to_user_id = new_assignee.id
 
         # Reset completion status if task was completed
         if task.completed_at:
+            task.completed = False
             task.completed_at = None
-            task.completed_by_id = None
+            task.completed_by_user_id = None
 
         db.session.commit()
 
@@ -840,10 +853,10 @@ def admin_reassign_task(task_id):
         logging.error(f"Error reassigning task: {str(e)}")
         flash('Ett fel uppstod när uppgiften skulle omtilldelas.', 'error')
 
-    return redirect(url_for('admin_event_tasks', event_id=task.event_id))
+    return redirect(url_for('main.admin_event_tasks', event_id=task.event_id))
 
 
-@app.route('/admin/tasks/<int:task_id>/toggle-complete', methods=['POST'])
+@main.route('/admin/tasks/<int:task_id>/toggle-complete', methods=['POST'])
 @requires_any_role('event_manager', 'admin')
 def admin_toggle_task_completion(task_id):
     """Toggle task completion status for event managers"""
@@ -868,11 +881,11 @@ def admin_toggle_task_completion(task_id):
         logging.error(f"Error toggling task completion: {str(e)}")
         flash('Ett fel uppstod när uppgiftens status skulle ändras.', 'error')
 
-    return redirect(url_for('admin_event_tasks', event_id=task.event_id))
+    return redirect(url_for('main.admin_event_tasks', event_id=task.event_id))
 
 
 # Password reset routes
-@app.route('/forgot-password', methods=['GET', 'POST'])
+@main.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     """Request password reset via email"""
     form = ForgotPasswordForm()
@@ -891,7 +904,7 @@ def forgot_password():
                 msg = Message(
                     'Återställ ditt lösenord - Brunnsbo Musikklasser',
                     recipients=[user.email])
-                reset_url = url_for('reset_password',
+                reset_url = url_for('main.reset_password',
                                     email=user.email,
                                     code=confirmation_code,
                                     _external=True)
@@ -910,7 +923,7 @@ def forgot_password():
                 mail.send(msg)
                 flash('En bekräftelsekod har skickats till din e-postadress.',
                       'info')
-                return redirect(url_for('reset_password', email=user.email))
+                return redirect(url_for('main.reset_password', email=user.email))
 
             except Exception as e:
                 logging.error(f"Error sending password reset email: {str(e)}")
@@ -921,12 +934,12 @@ def forgot_password():
             flash(
                 'En bekräftelsekod har skickats till din e-postadress om kontot finns.',
                 'info')
-            return redirect(url_for('reset_password', email=form.email.data))
+            return redirect(url_for('main.reset_password', email=form.email.data))
 
     return render_template('forgot_password.html', form=form)
 
 
-@app.route('/reset-password', methods=['GET', 'POST'])
+@main.route('/reset-password', methods=['GET', 'POST'])
 def reset_password():
     """Reset password with confirmation code"""
     form = ResetPasswordForm()
@@ -952,7 +965,7 @@ def reset_password():
 
                 flash('Ditt lösenord har återställts. Du kan nu logga in.',
                       'success')
-                return redirect(url_for('login'))
+                return redirect(url_for('main.login'))
             else:
                 flash('Användaren hittades inte.', 'error')
         else:
@@ -962,7 +975,7 @@ def reset_password():
 
 
 # Registration routes
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration with email verification"""
     form = RegisterForm()
@@ -1006,7 +1019,7 @@ def register():
                 <p>Tack för att du vill registrera ett konto hos oss.</p>
                 <p><strong>Din bekräftelsekod är: {confirmation_code.code}</strong></p>
                 <p>Använd denna kod för att slutföra din registrering. Koden är giltig i 1 timme.</p>
-                <p><a href="{url_for('verify_email', email=form.email.data, code=confirmation_code.code, _external=True)}" style="display: inline-block; padding: 10px 20px; background-color: #28a745; color: white; text-decoration: none; border-radius: 5px;">Slutför registrering</a></p>
+                <p><a href="{url_for('main.verify_email', email=form.email.data, code=confirmation_code.code, _external=True)}" style="display: inline-block; padding: 10px 20px; background-color: #28a745; color: white; text-decoration: none; border-radius: 5px;">Slutför registrering</a></p>
                 <p>Om länken inte fungerar, kopiera och klistra in koden ovan i registreringsformuläret.</p>
                 <p>Efter verifiering kan du logga in, men du behöver vänta på att en administratör tilldelar dig behörigheter.</p>
                 <hr>
@@ -1016,7 +1029,7 @@ def register():
                 mail.send(msg)
                 flash('En bekräftelsekod har skickats till din e-postadress.',
                       'info')
-                return redirect(url_for('verify_email'))
+                return redirect(url_for('main.verify_email'))
 
             except Exception as e:
                 logging.error(f"Error sending registration email: {str(e)}")
@@ -1026,7 +1039,7 @@ def register():
     return render_template('register.html', form=form)
 
 
-@app.route('/verify-email', methods=['GET', 'POST'])
+@main.route('/verify-email', methods=['GET', 'POST'])
 def verify_email():
     """Verify email and complete registration"""
     # Check if coming from direct link with parameters
@@ -1048,14 +1061,14 @@ def verify_email():
         else:
             flash('Ogiltig registreringslänk eller användare hittades inte.',
                   'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
     elif 'pending_registration' in session:
         form.email.data = session['pending_registration']['email']
     else:
         flash(
             'Ingen väntande registrering hittades. Vänligen registrera dig igen.',
             'error')
-        return redirect(url_for('register'))
+        return redirect(url_for('main.register'))
 
     # Pre-populate code from URL parameters
     if code_param and not form.confirmation_code.data:
@@ -1086,13 +1099,13 @@ def verify_email():
                     flash(
                         'Registrering slutförd! Du kan nu logga in. En administratör kommer att tilldela dig behörigheter inom kort.',
                         'success')
-                    return redirect(url_for('login'))
+                    return redirect(url_for('main.login'))
                 else:
                     # Handle case where user account doesn't exist (shouldn't happen)
                     flash(
                         'Användarkonot hittades inte. Vänligen registrera dig igen.',
                         'error')
-                    return redirect(url_for('register'))
+                    return redirect(url_for('main.register'))
 
             except Exception as e:
                 db.session.rollback()
@@ -1104,7 +1117,7 @@ def verify_email():
     return render_template('verify_email.html', form=form)
 
 
-@app.route('/admin/events/new', methods=['GET', 'POST'])
+@main.route('/admin/events/new', methods=['GET', 'POST'])
 @event_manager_required
 def admin_event_new():
     """Create new event"""
@@ -1131,7 +1144,7 @@ def admin_event_new():
             db.session.commit()
 
             flash('Evenemanget har skapats!', 'success')
-            return redirect(url_for('admin_events'))
+            return redirect(url_for('main.admin_events'))
 
         except Exception as e:
             db.session.rollback()
@@ -1143,7 +1156,7 @@ def admin_event_new():
                            title='Skapa nytt evenemang')
 
 
-@app.route('/admin/change-password', methods=['GET', 'POST'])
+@main.route('/admin/change-password', methods=['GET', 'POST'])
 @authenticated_required
 def admin_change_password():
     """Change admin password"""
@@ -1154,14 +1167,14 @@ def admin_change_password():
             current_user.set_password(form.new_password.data)
             db.session.commit()
             flash('Lösenordet har ändrats!', 'success')
-            return redirect(url_for('admin_events'))
+            return redirect(url_for('main.admin_events'))
         else:
             flash('Nuvarande lösenord är felaktigt.', 'error')
 
     return render_template('admin_change_password.html', form=form)
 
 
-@app.route('/admin/create-user', methods=['GET', 'POST'])
+@main.route('/admin/create-user', methods=['GET', 'POST'])
 @admin_required
 def admin_create_user():
     """Create new user"""
@@ -1189,7 +1202,7 @@ def admin_create_user():
                 flash(
                     f'Användare "{form.first_name.data} {form.last_name.data}" har skapats!',
                     'success')
-                return redirect(url_for('admin_users'))
+                return redirect(url_for('main.admin_users'))
 
             except Exception as e:
                 db.session.rollback()
@@ -1199,15 +1212,50 @@ def admin_create_user():
     return render_template('admin_create_user.html', form=form)
 
 
-@app.route('/admin/users')
+@main.route('/admin/users')
 @admin_required
 def admin_users():
-    """List all admin users"""
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
+    """Paginated user directory with search, role and status filters"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 25, type=int)
+    search = request.args.get('q', '').strip()
+    role_filter = request.args.get('role', 'all')
+    status_filter = request.args.get('status', 'all')
+
+    # Groups for the whole page come from one selectinload query
+    query = User.query.options(selectinload(User.groups))
+
+    if search:
+        query = query.filter(name_or_email_matches(search))
+
+    if role_filter == 'none':
+        query = query.filter(~User.groups.any())
+    elif role_filter != 'all':
+        query = query.filter(User.groups.any(Group.name == role_filter))
+
+    if status_filter == 'active':
+        query = query.filter(User.active == True)
+    elif status_filter == 'inactive':
+        query = query.filter(User.active == False)
 
+    users = query.order_by(User.last_name, User.first_name, User.id).paginate(
+        page=page, per_page=per_page, max_per_page=100, error_out=False)
 
-@app.route('/admin/events/edit/<int:event_id>', methods=['GET', 'POST'])
+    role_options = [('admin', 'Admin'), ('applications_manager', 'Ansökningar'),
+                    ('event_manager', 'Evenemang'), ('parent', 'Förälder'),
+                    ('none', 'Inga roller')]
+    status_options = [('active', 'Aktiva'), ('inactive', 'Inaktiva')]
+
+    return render_template('admin_users.html',
+                           users=users,
+                           search=search,
+                           role_filter=role_filter,
+                           status_filter=status_filter,
+                           role_options=role_options,
+                           status_options=status_options)
+
+
+@main.route('/admin/events/edit/<int:event_id>', methods=['GET', 'POST'])
 @event_manager_required
 def admin_event_edit(event_id):
     """Edit existing event"""
@@ -1239,7 +1287,7 @@ def admin_event_edit(event_id):
             db.session.commit()
 
             flash('Evenemanget har uppdaterats!', 'success')
-            return redirect(url_for('admin_events'))
+            return redirect(url_for('main.admin_events'))
 
         except Exception as e:
             db.session.rollback()
@@ -1253,7 +1301,7 @@ def admin_event_edit(event_id):
                            title='Redigera evenemang')
 
 
-@app.route('/admin/events/delete/<int:event_id>', methods=['POST'])
+@main.route('/admin/events/delete/<int:event_id>', methods=['POST'])
 @event_manager_required
 def admin_event_delete(event_id):
     """Delete event"""
@@ -1268,11 +1316,11 @@ def admin_event_delete(event_id):
         logging.error(f"Error deleting event: {str(e)}")
         flash('Ett fel uppstod när evenemanget skulle tas bort.', 'error')
 
-    return redirect(url_for('admin_events'))
+    return redirect(url_for('main.admin_events'))
 
 
 # Swish Payment Routes
-@app.route('/donations', methods=['GET', 'POST'])
+@main.route('/donations', methods=['GET', 'POST'])
 def donations():
     """Donation page with Swish payment integration"""
     form = DonationForm()
@@ -1325,11 +1373,11 @@ def donations():
             amount=amount_decimal,
             message=message,
             payer_alias=payer_phone,
-            payee_alias=app.config.get('SWISH_PAYEE_ALIAS'),
+            payee_alias=current_app.config.get('SWISH_PAYEE_ALIAS'),
             user_id=current_user.id if current_user.is_authenticated else None)
 
         if payment.status == 'PENDING':
-            return redirect(url_for('payment_status', payment_id=payment.id))
+            return redirect(url_for('main.payment_status', payment_id=payment.id))
         else:
             # Check if it's a SSL/TLS error (expected in development)
             if 'SSL' in payment.error_message and 'handshake failure' in payment.error_message:
@@ -1342,7 +1390,8 @@ def donations():
     return render_template('donations.html', form=form)
 
 
-@app.route('/payment/<payment_id>')
+@main.route('/payment/<payment_id>')
+@read_replica
 def payment_status(payment_id):
     """Display payment status and QR code for Swish"""
     payment = SwishPayment.query.get_or_404(payment_id)
@@ -1350,7 +1399,7 @@ def payment_status(payment_id):
     return render_template('payment_status.html', payment=payment)
 
 
-@app.route('/payment/<payment_id>/check')
+@main.route('/payment/<payment_id>/check')
 def check_payment_status(payment_id):
     """AJAX endpoint to check payment status"""
     payment = SwishPayment.query.get_or_404(payment_id)
@@ -1382,7 +1431,7 @@ def check_payment_status(payment_id):
     })
 
 
-@app.route('/swish/callback/<payment_id>', methods=['POST'])
+@main.route('/swish/callback/<payment_id>', methods=['POST'])
 def swish_callback(payment_id):
     """Callback endpoint for Swish payment status updates"""
     try:
@@ -1390,7 +1439,7 @@ def swish_callback(payment_id):
         callback_data = request.get_json()
 
         if not callback_identifier or not callback_data:
-            app.logger.error('Invalid Swish callback: missing data')
+            current_app.logger.error('Invalid Swish callback: missing data')
             return '', 400
 
         from swish_service import SwishService
@@ -1405,21 +1454,144 @@ def swish_callback(payment_id):
             return '', 400
 
     except Exception as e:
-        app.logger.error(f'Swish callback error: {str(e)}')
+        current_app.logger.error(f'Swish callback error: {str(e)}')
         return '', 500
 
 
-@app.route('/admin/payments')
+def _payment_cursor(payment):
+    """Keyset cursor for a row of the payment listing"""
+    return f'{payment.date_created.isoformat()}|{payment.id}'
+
+
+def _parse_payment_cursor(value):
+    """(date_created, id) from a cursor, or None if missing or malformed"""
+    try:
+        created, payment_id = value.split('|', 1)
+        return datetime.fromisoformat(created), payment_id
+    except (AttributeError, ValueError):
+        return None
+
+
+def _amount_arg(name):
+    """Decimal query argument, or None if missing or not a number"""
+    try:
+        amount = Decimal(request.args.get(name, '').replace(',', '.'))
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() else None
+
+
+@main.route('/admin/payments')
 @admin_required
 def admin_payments():
-    """Admin page to view all payments"""
-    payments = SwishPayment.query.order_by(
-        SwishPayment.date_created.desc()).all()
-    return render_template('admin_payments.html', payments=payments)
+    """Admin page to view payments, keyset-paginated newest first"""
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    status_filter = request.args.get('status', 'all')
+    date_from = request.args.get('from', type=date.fromisoformat)
+    date_to = request.args.get('to', type=date.fromisoformat)
+    amount_min = _amount_arg('min')
+    amount_max = _amount_arg('max')
+    after = _parse_payment_cursor(request.args.get('after'))
+    before = None if after else _parse_payment_cursor(request.args.get('before'))
+
+    # Date and amount filters apply to both the listing and the summary
+    conditions = []
+    if date_from:
+        conditions.append(SwishPayment.date_created >= datetime.combine(date_from, time.min))
+    if date_to:
+        conditions.append(SwishPayment.date_created < datetime.combine(date_to + timedelta(days=1), time.min))
+    if amount_min is not None:
+        conditions.append(SwishPayment.amount >= amount_min)
+    if amount_max is not None:
+        conditions.append(SwishPayment.amount <= amount_max)
+
+    # Summary cards: one GROUP BY over the filtered range, across all statuses
+    counts, amounts = {}, {}
+    rows = db.session.execute(select(SwishPayment.status, func.count(SwishPayment.id),
+                                     func.sum(SwishPayment.amount))
+                              .where(*conditions).group_by(SwishPayment.status))
+    for status, count, amount in rows:
+        counts[status], amounts[status] = count, amount or 0
+    summary = {'paid': counts.get('PAID', 0),
+               'pending': counts.get('PENDING', 0),
+               'failed': counts.get('DECLINED', 0) + counts.get('ERROR', 0),
+               'amount': amounts.get('PAID', 0),
+               'total': sum(counts.values())}
+
+    # Seek past the cursor on (date_created, id) instead of OFFSET, so every
+    # page costs the same however deep it is. One extra row tells whether
+    # there is another page in that direction.
+    query = select(SwishPayment).options(joinedload(SwishPayment.user)).where(*conditions)
+    if status_filter != 'all':
+        query = query.where(SwishPayment.status == status_filter)
+    key = tuple_(SwishPayment.date_created, SwishPayment.id)
+    if before:
+        query = query.where(key > tuple_(*before)) \
+            .order_by(SwishPayment.date_created, SwishPayment.id)
+    else:
+        if after:
+            query = query.where(key < tuple_(*after))
+        query = query.order_by(SwishPayment.date_created.desc(), SwishPayment.id.desc())
+    payments = db.session.scalars(query.limit(per_page + 1)).all()
+    has_more = len(payments) > per_page
+    payments = payments[:per_page]
+    if before:
+        payments.reverse()
+
+    newer = older = None
+    if payments and (after or (before and has_more)):
+        newer = _payment_cursor(payments[0])
+    if payments and (before or has_more):
+        older = _payment_cursor(payments[-1])
+
+    filters = {'status': status_filter,
+               'from': date_from.isoformat() if date_from else '',
+               'to': date_to.isoformat() if date_to else '',
+               'min': amount_min if amount_min is not None else '',
+               'max': amount_max if amount_max is not None else '',
+               'per_page': per_page}
+    status_options = [('PAID', 'Betald'), ('PENDING', 'Väntar'), ('DECLINED', 'Nekad'),
+                      ('ERROR', 'Fel'), ('CANCELLED', 'Avbruten'), ('CREATED', 'Skapad')]
+
+    return render_template('admin_payments.html',
+                           payments=payments,
+                           summary=summary,
+                           newer=newer,
+                           older=older,
+                           filters=filters,
+                           filtered=bool(conditions) or status_filter != 'all',
+                           status_options=status_options)
+
+
+@main.route('/admin/pool-stats')
+@admin_required
+def admin_pool_stats():
+    """Database connection pool statistics (admin only)"""
+    stats = pool_stats(db.engine)
+    stats['pool_profile'] = current_app.config.get('DB_POOL_PROFILE')
+    return jsonify(stats)
+
+
+@main.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    """Application cache hit/miss counters (admin only)"""
+    return jsonify(cache.stats())
+
+
+@main.route('/admin/compression-stats')
+@admin_required
+def admin_compression_stats():
+    """Response compression ratio and CPU time counters (admin only)"""
+    stats = compression_stats.snapshot()
+    stats['settings'] = {key: current_app.config[key] for key in
+                         ('COMPRESS_ENABLED', 'COMPRESS_MIN_SIZE', 'COMPRESS_GZIP_LEVEL',
+                          'COMPRESS_BROTLI_QUALITY')}
+    return jsonify(stats)
 
 
 # Configuration endpoint for Swish settings (admin only)
-@app.route('/admin/swish-config', methods=['GET', 'POST'])
+@main.route('/admin/swish-config', methods=['GET', 'POST'])
 @admin_required
 def admin_swish_config():
     """Admin page for Swish configuration"""
@@ -1429,18 +1601,19 @@ def admin_swish_config():
         flash(
             'Swish-inställningar uppdaterade. Starta om applikationen för att aktivera ändringarna.',
             'success')
-        return redirect(url_for('admin_swish_config'))
+        return redirect(url_for('main.admin_swish_config'))
 
     config = {
-        'test_mode': app.config.get('SWISH_TEST_MODE', True),
-        'payee_alias': app.config.get('SWISH_PAYEE_ALIAS', 'Ej konfigurerat'),
-        'cert_configured': bool(app.config.get('SWISH_CERT_PATH'))
+        'test_mode': current_app.config.get('SWISH_TEST_MODE', True),
+        'payee_alias': current_app.config.get('SWISH_PAYEE_ALIAS', 'Ej konfigurerat'),
+        'cert_configured': bool(current_app.config.get('SWISH_CERT_PATH'))
     }
 
     return render_template('admin_swish_config.html', config=config)
 
 
-@app.route('/integritet')
+@main.route('/integritet')
+@conditional(conditional_pages.static_page)
 def integritet():
     """GDPR privacy policy page"""
     return render_template('integritet.html')
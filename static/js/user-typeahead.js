@@ -0,0 +1,127 @@
+// Task assignment typeahead (admin_event_tasks.html)
+//
+// Every reassignment form on the page shares one result list and one set of
+// event listeners on the container marked data-user-search="<search URL>".
+// Typing in an .user-typeahead-input searches assignable users on the server
+// and picking a result fills the form's hidden new_assignee field.
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-user-search]').forEach(initUserTypeahead);
+});
+
+function initUserTypeahead(container) {
+    const searchUrl = container.dataset.userSearch;
+    const menu = document.createElement('ul');
+    menu.className = 'dropdown-menu w-100';
+    menu.setAttribute('role', 'listbox');
+    let input = null;
+    let timer = null;
+    let latest = 0;
+
+    function hide() {
+        menu.classList.remove('show');
+        menu.replaceChildren();
+    }
+
+    function choose(item) {
+        input.value = item.dataset.name;
+        input.form.elements.new_assignee.value = item.dataset.userId;
+        input.classList.remove('is-invalid');
+        hide();
+    }
+
+    function render(users) {
+        menu.replaceChildren();
+        if (!users.length) {
+            const empty = document.createElement('li');
+            empty.className = 'dropdown-item-text text-muted small';
+            empty.textContent = 'Inga användare hittades';
+            menu.appendChild(empty);
+        }
+        users.forEach(function(user) {
+            const item = document.createElement('li');
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'dropdown-item';
+            button.dataset.userId = user.id;
+            button.dataset.name = user.name;
+            button.textContent = user.name + ' ';
+            const email = document.createElement('small');
+            email.className = 'text-muted';
+            email.textContent = user.email;
+            button.appendChild(email);
+            item.appendChild(button);
+            menu.appendChild(item);
+        });
+        input.form.appendChild(menu);
+        menu.classList.add('show');
+    }
+
+    function search() {
+        const term = input.value.trim();
+        if (term.length < 2) {
+            hide();
+            return;
+        }
+        const request = ++latest;
+        const params = new URLSearchParams({q: term, exclude: input.dataset.exclude});
+        fetch(searchUrl + '?' + params, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .then(data => {
+                // Ignore answers to earlier keystrokes
+                if (request === latest) {
+                    render(data.users);
+                }
+            })
+            .catch(error => console.error('User search failed:', error));
+    }
+
+    container.addEventListener('input', function(event) {
+        if (!event.target.classList.contains('user-typeahead-input')) {
+            return;
+        }
+        input = event.target;
+        input.form.elements.new_assignee.value = '';
+        clearTimeout(timer);
+        timer = setTimeout(search, 200);
+    });
+
+    container.addEventListener('keydown', function(event) {
+        if (!event.target.classList.contains('user-typeahead-input') && !menu.contains(event.target)) {
+            return;
+        }
+        const items = Array.from(menu.querySelectorAll('.dropdown-item'));
+        const index = items.indexOf(document.activeElement);
+        if (event.key === 'ArrowDown' && items.length) {
+            event.preventDefault();
+            items[Math.min(index + 1, items.length - 1)].focus();
+        } else if (event.key === 'ArrowUp' && items.length) {
+            event.preventDefault();
+            (index > 0 ? items[index - 1] : input).focus();
+        } else if (event.key === 'Escape') {
+            hide();
+            input.focus();
+        }
+    });
+
+    menu.addEventListener('click', function(event) {
+        const item = event.target.closest('.dropdown-item');
+        if (item) {
+            choose(item);
+        }
+    });
+
+    container.addEventListener('submit', function(event) {
+        const assignee = event.target.elements.new_assignee;
+        if (assignee && !assignee.value) {
+            event.preventDefault();
+            event.target.querySelector('.user-typeahead-input').classList.add('is-invalid');
+        }
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!container.contains(event.target)) {
+            hide();
+        }
+    });
+}
@@ -0,0 +1,112 @@
+"""
+Streaming rendering for long listings
+
+stream_page() renders a template as a streamed response instead of building
+the whole page in memory. Pages pass their rows as a RowStream from
+stream_rows(), which reads them from a server-side cursor (psycopg2 named
+cursor on PostgreSQL) STREAM_BATCH_SIZE rows at a time, so neither the rows
+nor the rendered HTML are ever held in full:
+
+    events = stream_rows(select(Event).order_by(...))
+    return stream_page('admin_events.html', events=events)
+
+Output is sent in pieces of about STREAM_BUFFER_BYTES. Templates call
+{{ stream_flush() }} where the layout header is complete (before the first
+row is fetched), so the browser starts on the page while the query runs.
+Outside stream_page() stream_flush() renders nothing.
+
+A RowStream can be iterated once. `{% if rows %}` peeks at the first row
+only; anything counted over the rows has to be added up inside the loop.
+
+The request's app context, and with it db.session, is torn down as soon as
+the view returns, before the body is rendered. stream_rows() therefore runs
+its query in a session of its own, opened when the template first touches
+the rows and closed when they are exhausted or the response is closed.
+"""
+from flask import current_app, get_flashed_messages, stream_with_context
+from markupsafe import Markup
+from sqlalchemy.orm import Session
+
+FLUSH_MARK = '<!--stream-flush-->'
+_END = object()
+
+
+class RowStream:
+    """Single-pass iterable over query results that can tell if it is empty"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._first = None
+        self._peeked = False
+
+    def _peek(self):
+        if not self._peeked:
+            self._first = next(self._rows, _END)
+            self._peeked = True
+
+    def __bool__(self):
+        self._peek()
+        return self._first is not _END
+
+    def __iter__(self):
+        self._peek()
+        if self._first is _END:
+            return
+        first, self._first = self._first, _END
+        yield first
+        yield from self._rows
+
+
+def _streamed_entities(engine, statement):
+    """Entities of statement, read in a session that lives as long as the stream"""
+    with Session(engine) as session:
+        yield from session.scalars(statement)
+
+
+def stream_rows(statement, batch_size=None):
+    """ORM select read through a server-side cursor; returns a RowStream of entities"""
+    from app import db
+    batch_size = batch_size or current_app.config['STREAM_BATCH_SIZE']
+    statement = statement.execution_options(yield_per=batch_size)
+    return RowStream(_streamed_entities(db.engine, statement))
+
+
+def no_flush():
+    """stream_flush() outside streamed pages"""
+    return Markup('')
+
+
+def _buffered(events, buffer_bytes):
+    """Join template events into pieces of about buffer_bytes, cut at flush marks"""
+    pieces, size = [], 0
+    for event in events:
+        if event == FLUSH_MARK:
+            if pieces:
+                yield ''.join(pieces)
+                pieces, size = [], 0
+            continue
+        pieces.append(event)
+        size += len(event)
+        if size >= buffer_bytes:
+            yield ''.join(pieces)
+            pieces, size = [], 0
+    if pieces:
+        yield ''.join(pieces)
+
+
+def stream_page(template_name, **context):
+    """Streamed response of a rendered template"""
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    # The session is saved before the body is rendered, so flashes must be
+    # popped now; the template gets the same messages from the request cache
+    get_flashed_messages(with_categories=True)
+    context['stream_flush'] = lambda: Markup(FLUSH_MARK)
+    app.update_template_context(context)
+    events = template.generate(context)
+    body = _buffered(events, app.config['STREAM_BUFFER_BYTES'])
+    return app.response_class(stream_with_context(body), mimetype='text/html')
+
+
+def init_streaming(app):
+    app.add_template_global(no_flush, 'stream_flush')
@@ -60,7 +60,7 @@ class SwishService:
         payment.amount = amount
         payment.currency = 'SEK'
         payment.message = message[:50]  # Ensure max 50 characters
-        payment.callback_url = url_for('swish_callback', payment_id=payment_id, _external=True)
+        payment.callback_url = url_for('main.swish_callback', payment_id=payment_id, _external=True)
         payment.callback_identifier = callback_identifier
         payment.user_id = user_id
         payment.application_id = application_id
@@ -0,0 +1,68 @@
+"""
+Jinja bytecode cache and template precompilation
+
+With TEMPLATE_BYTECODE_CACHE enabled, compiled templates are stored as
+marshalled bytecode under TEMPLATE_CACHE_DIR (default: instance/jinja_cache).
+A fresh worker then loads bytecode instead of parsing and compiling each
+template on its first render. Entries are keyed by the template source
+checksum, so an edited template is recompiled automatically.
+
+`flask --app main templates compile` fills the cache at build time.
+"""
+import os
+
+import click
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+
+def cache_dir(app):
+    """The bytecode cache directory for an app"""
+    return app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+
+
+def configure_bytecode_cache(app):
+    """Attach a filesystem bytecode cache to the app's Jinja environment"""
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE'):
+        return None
+    directory = cache_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    bytecode_cache = FileSystemBytecodeCache(directory)
+    # jinja_options is only read when jinja_env is first created
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': bytecode_cache}
+    return bytecode_cache
+
+
+def compile_templates(app):
+    """Compile every template into the environment's cache (and bytecode cache)"""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+@click.group('templates')
+def templates_cli():
+    """Jinja template cache"""
+
+
+@templates_cli.command('compile')
+@with_appcontext
+def compile_command():
+    """Precompile all templates into the bytecode cache"""
+    from flask import current_app
+    if current_app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_BYTECODE_CACHE is disabled for this profile.')
+    count = compile_templates(current_app)
+    click.echo(f'Compiled {count} templates into {cache_dir(current_app)}')
+
+
+@templates_cli.command('clear')
+@with_appcontext
+def clear_command():
+    """Remove all cached template bytecode"""
+    from flask import current_app
+    if current_app.jinja_env.bytecode_cache is not None:
+        current_app.jinja_env.bytecode_cache.clear()
+    click.echo('Template bytecode cache cleared.')
@@ -775,6 +775,2112 @@ def test_manual_group_assignment_works(test_app):
         assert user.groups[0].name == 'parent'
 
 
+class TestAppFactory:
+    """Test the create_app() factory and its configuration profiles"""
+
+    def test_test_profile(self, factory_app):
+        """Test profile uses an in-memory database and creates the schema"""
+        from app import db
+        from sqlalchemy import inspect
+        assert factory_app.config['TESTING'] is True
+        assert factory_app.config['APP_PROFILE'] == 'test'
+        assert 'users' in inspect(db.engine).get_table_names()
+
+    def test_production_profile_skips_schema(self, monkeypatch):
+        """Production disables debug and never runs create_all()"""
+        from app import create_app, db
+        from config import ProductionConfig
+        from sqlalchemy import inspect
+        monkeypatch.setattr(ProductionConfig, 'SQLALCHEMY_DATABASE_URI', 'sqlite:///:memory:')
+        monkeypatch.setattr(ProductionConfig, 'DB_POOL_PROFILE', None)
+
+        app = create_app('production')
+        assert app.debug is False
+        with app.app_context():
+            assert inspect(db.engine).get_table_names() == []
+
+    def test_startup_time_reported(self, factory_app):
+        """Startup time is measured and stored on the app config"""
+        assert factory_app.config['STARTUP_TIME_MS'] >= 0
+
+    def test_unknown_profile(self):
+        """Unknown profile names are rejected"""
+        from app import create_app
+        with pytest.raises(ValueError):
+            create_app('staging')
+
+    def test_routes_registered(self, factory_app):
+        """Routes are served from the main blueprint"""
+        client = factory_app.test_client()
+        assert client.get('/').status_code == 200
+        assert client.get('/evenemang').status_code == 200
+        with factory_app.test_request_context():
+            from flask import url_for
+            assert url_for('main.index') == '/'
+
+
+class TestMigrations:
+    """Test the forward-only migration runner on SQLite"""
+
+    def _engine(self, tmp_path):
+        from sqlalchemy import create_engine
+        return create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+
+    def test_upgrade_applies_pending_in_order(self, factory_app, tmp_path):
+        """Pending migrations are applied once, in version order"""
+        from migrations import Migration, RunSQL, CreateIndex, upgrade, applied_versions
+        from sqlalchemy import inspect
+        engine = self._engine(tmp_path)
+        migrations = [
+            Migration(2, 'index notes', [CreateIndex('ix_notes_body', 'notes', ['body'])]),
+            Migration(1, 'notes table', [RunSQL('CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)')]),
+        ]
+
+        applied = upgrade(engine, migrations)
+        assert [m.version for m in applied] == [1, 2]
+        assert applied_versions(engine) == {1, 2}
+        assert 'ix_notes_body' in [ix['name'] for ix in inspect(engine).get_indexes('notes')]
+
+        # Running again is a no-op
+        assert upgrade(engine, migrations) == []
+
+    def test_set_not_null_backfills(self, factory_app, tmp_path):
+        """Payments without date_created get one, so the keyset listing never loses them"""
+        from migrations import SetNotNull
+        from sqlalchemy import text
+        engine = self._engine(tmp_path)
+        with engine.begin() as connection:
+            connection.execute(text('CREATE TABLE swish_payment (id TEXT PRIMARY KEY, date_created '
+                                    'DATETIME, date_paid DATETIME, date_cancelled DATETIME)'))
+            connection.execute(text("INSERT INTO swish_payment VALUES ('PAID', NULL, '2025-03-01 10:00:00', NULL), "
+                                    "('NEW', NULL, NULL, NULL), ('OK', '2025-01-01 09:00:00', NULL, NULL)"))
+            SetNotNull('swish_payment', 'date_created',
+                       backfill='COALESCE(date_paid, date_cancelled, CURRENT_TIMESTAMP)').apply(connection)
+            rows = dict(connection.execute(text('SELECT id, date_created FROM swish_payment')).all())
+        assert rows['PAID'] == '2025-03-01 10:00:00'
+        assert rows['OK'] == '2025-01-01 09:00:00'
+        assert rows['NEW'] is not None
+
+    def test_upgrade_target(self, factory_app, tmp_path):
+        """Upgrade stops at the requested target version"""
+        from migrations import Migration, RunSQL, upgrade, pending_migrations
+        engine = self._engine(tmp_path)
+        migrations = [
+            Migration(1, 'a', [RunSQL('CREATE TABLE a (id INTEGER PRIMARY KEY)')]),
+            Migration(2, 'b', [RunSQL('CREATE TABLE b (id INTEGER PRIMARY KEY)')]),
+        ]
+        upgrade(engine, migrations, target=1)
+        assert [m.version for m in pending_migrations(engine, migrations)] == [2]
+
+    def test_baseline_creates_model_tables(self, factory_app, tmp_path):
+        """The baseline migration creates every model table"""
+        from migrations import upgrade
+        from sqlalchemy import inspect
+        engine = self._engine(tmp_path)
+        upgrade(engine)
+        tables = inspect(engine).get_table_names()
+        for table in ['users', 'application', 'swish_payment', 'event_tasks', 'schema_migrations']:
+            assert table in tables
+
+    def test_add_column_backfills(self, factory_app, tmp_path):
+        """AddColumn adds a missing column once and backfills it"""
+        from migrations import AddColumn, Migration, RunSQL, upgrade
+        from sqlalchemy import inspect, text
+        engine = self._engine(tmp_path)
+        upgrade(engine, [
+            Migration(1, 'legacy event', [
+                RunSQL('CREATE TABLE event (id INTEGER PRIMARY KEY, created_at TIMESTAMP)'),
+                RunSQL("INSERT INTO event (created_at) VALUES ('2026-01-01 10:00:00')"),
+            ]),
+            Migration(2, 'updated_at', [AddColumn('event', 'updated_at', 'TIMESTAMP', backfill='created_at')]),
+            Migration(3, 'again', [AddColumn('event', 'updated_at', 'TIMESTAMP')]),
+        ])
+        assert 'updated_at' in [c['name'] for c in inspect(engine).get_columns('event')]
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT updated_at FROM event')).scalar() == '2026-01-01 10:00:00'
+
+    def test_postgresql_index_is_concurrent(self):
+        """PostgreSQL index builds are concurrent and run outside a transaction"""
+        from migrations import CreateIndex
+        op = CreateIndex('ix_application_status', 'application', ['status'])
+        assert 'CONCURRENTLY' in op.sql('postgresql')
+        assert not op.is_transactional('postgresql')
+        assert 'CONCURRENTLY' not in op.sql('sqlite')
+        assert op.is_transactional('sqlite')
+
+    def test_model_indexes_have_migrations(self, factory_app):
+        """Every index declared on the models is also created by a migration"""
+        from app import db
+        from migrations import MIGRATIONS, CreateIndex
+        migrated = {op.name: (op.table, op.columns) for migration in MIGRATIONS
+                    for op in migration.operations if isinstance(op, CreateIndex)}
+        for table in db.metadata.tables.values():
+            for index in table.indexes:
+                if index.name.startswith('ix_') and len(index.columns) == 1 and index.columns[0].index:
+                    continue  # index=True columns, created with the baseline schema
+                assert migrated.get(index.name) == (table.name, [column.name for column in index.columns])
+
+    def test_cli_upgrade(self, factory_app):
+        """flask db upgrade reports applied migrations"""
+        runner = factory_app.test_cli_runner()
+        result = runner.invoke(args=['db', 'upgrade'])
+        assert result.exit_code == 0
+        assert 'baseline schema' in result.output
+        result = runner.invoke(args=['db', 'status'])
+        assert '[applied]' in result.output
+
+
+class TestLogging:
+    """Test the queued JSON logging pipeline"""
+
+    def test_json_formatter(self):
+        """Records become single-line JSON including extra fields"""
+        import json
+        import logging
+        from logging_setup import JsonFormatter
+        record = logging.LogRecord('routes.login', logging.INFO, __file__, 1,
+                                   'Login for %s', ('a@example.com',), None)
+        record.remote_addr = '127.0.0.1'
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry['message'] == 'Login for a@example.com'
+        assert entry['logger'] == 'routes.login'
+        assert entry['level'] == 'INFO'
+        assert entry['remote_addr'] == '127.0.0.1'
+
+    def test_rate_limit_filter(self):
+        """DEBUG records over the per-logger budget are dropped"""
+        import logging
+        from logging_setup import RateLimitFilter
+        limiter = RateLimitFilter({'routes.login': 3})
+
+        def record(name, level=logging.DEBUG):
+            return logging.LogRecord(name, level, __file__, 1, 'msg', None, None)
+
+        passed = sum(limiter.filter(record('routes.login')) for _ in range(20))
+        assert passed == 3
+        # Child loggers share the bucket, other loggers and levels are untouched
+        assert not limiter.filter(record('routes.login.csrf'))
+        assert limiter.filter(record('routes.login', logging.WARNING))
+        assert limiter.filter(record('routes'))
+
+    def test_configure_logging_uses_queue(self, factory_app, monkeypatch):
+        """Root logging goes through a QueueHandler with per-logger levels"""
+        import logging
+        import logging.handlers
+        root = logging.getLogger()
+        queue_handlers = [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]
+        assert len(queue_handlers) == 1
+        assert root.level == logging.WARNING
+
+        from app import create_app
+        from config import TestConfig
+        monkeypatch.setattr(TestConfig, 'LOG_LEVELS', {'routes.login': 'ERROR'})
+        create_app('test')
+        assert logging.getLogger('routes.login').level == logging.ERROR
+        # Building a second app replaces the handler instead of stacking it
+        assert len([h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]) == 1
+        logging.getLogger('routes.login').setLevel(logging.NOTSET)
+
+    def test_forked_child_writes_records(self, factory_app, tmp_path):
+        """A forked worker gets its own writer thread instead of a queue nobody drains"""
+        import logging
+        import os
+        import logging_setup
+        output = logging_setup._listener.handlers[0]
+        log_path = tmp_path / 'child.log'
+        with open(log_path, 'w') as log_file:
+            previous = output.setStream(log_file)
+            try:
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        logging.getLogger('worker').warning('Logged from the child')
+                        logging_setup.shutdown_logging()
+                    finally:
+                        os._exit(0)
+                os.waitpid(pid, 0)
+            finally:
+                output.setStream(previous)
+        assert 'Logged from the child' in log_path.read_text()
+
+    def test_exception_is_formatted_by_the_writer(self, factory_app, tmp_path):
+        """Tracebacks reach the JSON output as their own field, not folded into the message"""
+        import json
+        import logging
+        import logging_setup
+        output = logging_setup._listener.handlers[0]
+        log_path = tmp_path / 'app.log'
+        with open(log_path, 'w') as log_file:
+            previous = output.setStream(log_file)
+            try:
+                try:
+                    {}['missing']
+                except KeyError:
+                    logging.getLogger('routes').exception('Failed for %s', 'a@example.com')
+                logging_setup.shutdown_logging()
+            finally:
+                output.setStream(previous)
+        entry = json.loads(log_path.read_text().splitlines()[-1])
+        assert entry['message'] == 'Failed for a@example.com'
+        assert 'Traceback' in entry['exception'] and "KeyError: 'missing'" in entry['exception']
+
+
+class TestPasswords:
+    """Test the password hashing service"""
+
+    def _make_user(self, password='secret-password', password_hash=None):
+        from app import db
+        from models import User
+        user = User(first_name='Pass', last_name='Word', email='pw@example.com', active=True)
+        if password_hash:
+            user.password_hash = password_hash
+        else:
+            user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_hash_uses_configured_method(self, factory_app):
+        """New hashes use the configured algorithm and cost"""
+        user = self._make_user()
+        assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+        assert user.check_password('secret-password')
+        assert not user.check_password('wrong')
+
+    def test_outdated_hash_is_upgraded(self, factory_app):
+        """A valid login on an outdated hash rehashes with current parameters"""
+        from werkzeug.security import generate_password_hash
+        old_hash = generate_password_hash('secret-password', method='pbkdf2:sha256:500')
+        user = self._make_user(password_hash=old_hash)
+
+        assert not user.check_password('wrong')
+        assert user.password_hash == old_hash
+        assert user.check_password('secret-password')
+        assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+
+    def test_normalize_method(self):
+        """Short method names expand to werkzeug's stored form"""
+        from passwords import normalize_method
+        assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+        assert normalize_method('pbkdf2:sha512:1000') == 'pbkdf2:sha512:1000'
+        with pytest.raises(ValueError):
+            normalize_method('md5')
+
+    def test_login_verifies_once(self, factory_app, monkeypatch):
+        """Each login attempt performs exactly one hash verification"""
+        import passwords
+        self._make_user()
+        calls = []
+        original = passwords.check_password_hash
+
+        def counting_check(password_hash, password):
+            calls.append(password_hash)
+            return original(password_hash, password)
+
+        monkeypatch.setattr(passwords, 'check_password_hash', counting_check)
+        client = factory_app.test_client()
+
+        response = client.post('/login', data={'email': 'pw@example.com', 'password': 'secret-password'})
+        assert response.status_code == 302
+        assert len(calls) == 1
+
+        client.get('/admin/logout')
+        calls.clear()
+        client.post('/login', data={'email': 'nobody@example.com', 'password': 'secret-password'})
+        assert len(calls) == 1
+
+
+def make_user(email='user@example.com', roles=(), active=True):
+    """Create a User with the given role names in the factory_app database"""
+    from app import db
+    from models import User, Group
+    user = User(first_name='Test', last_name='User', email=email, active=active)
+    user.set_password('password')
+    db.session.add(user)
+    for role in roles:
+        group = Group.query.filter_by(name=role).first()
+        if group is None:
+            group = Group(name=role)
+            db.session.add(group)
+        user.groups.append(group)
+    db.session.commit()
+    return user
+
+
+class TestIdentityCache:
+    """Test the cached current_user identity"""
+
+    def test_cached_page_view_runs_no_queries(self, factory_app, count_queries):
+        """Authenticated views after the first one do no identity queries"""
+        from conftest import login_as
+        user = make_user(roles=['admin', 'event_manager'])
+        client = factory_app.test_client()
+        login_as(client, user.id)
+
+        assert client.get('/om-oss').status_code == 200
+        with count_queries() as counter:
+            response = client.get('/om-oss')
+        assert response.status_code == 200
+        assert counter.count == 0
+        # Navigation is built from the cached role set, without duplicate links
+        assert response.data.decode().count('Hantera evenemang') == 2
+
+    def test_role_change_invalidates(self, factory_app):
+        """Committing a membership change drops the cached snapshot"""
+        from app import db
+        from models import Group
+        from identity import identity_cache, load_identity
+        user = make_user(roles=['parent'])
+
+        assert load_identity(user.id).has_role('parent')
+        assert identity_cache.get(user.id) is not None
+
+        user.groups.append(Group.query.filter_by(name='admin').first() or Group(name='admin'))
+        db.session.commit()
+        assert identity_cache.get(user.id) is None
+        assert load_identity(user.id).roles == {'parent', 'admin'}
+
+    def test_deactivation_invalidates(self, factory_app):
+        """Activation and password changes drop the cached snapshot"""
+        from app import db
+        from identity import identity_cache, load_identity
+        user = make_user()
+        load_identity(user.id)
+
+        user.active = False
+        db.session.commit()
+        assert identity_cache.get(user.id) is None
+        assert load_identity(user.id).active is False
+
+    def test_falls_back_to_full_user(self, factory_app):
+        """Attributes outside the snapshot load the User row"""
+        user = make_user()
+        from identity import load_identity
+        identity = load_identity(user.id)
+        assert identity.created_at == user.created_at
+        assert identity.check_password('password')
+        assert load_identity(999999) is None
+
+
+class TestRoleMask:
+    """Test bitmask-based permission checks"""
+
+    def test_role_mask(self):
+        """Role names combine into a bitmask; unknown names grant nothing"""
+        from permissions import role_mask, ROLE_BITS
+        assert role_mask(['admin', 'parent']) == ROLE_BITS['admin'] | ROLE_BITS['parent']
+        assert role_mask(['teacher']) == 0
+
+    def test_decorator_rejects_unknown_role(self):
+        """Typos in decorator role names fail at import time"""
+        from permissions import requires_any_role
+        with pytest.raises(ValueError):
+            requires_any_role('admin', 'admni')
+
+    def test_user_and_identity_masks_match(self, factory_app):
+        """The ORM user and the cached identity expose the same mask"""
+        from identity import load_identity
+        from user_utils import can_access_tasks, can_manage_tasks
+        user = make_user(roles=['parent'])
+        identity = load_identity(user.id)
+        assert identity.role_mask == user.role_mask
+        assert identity.roles == frozenset({'parent'})
+        assert can_access_tasks(identity) and can_access_tasks(user)
+        assert not can_manage_tasks(identity) and not can_manage_tasks(user)
+
+    def test_decorators_use_mask(self, factory_app):
+        """Role-protected routes allow matching roles and refuse others"""
+        from conftest import login_as
+        parent = make_user('parent@example.com', roles=['parent'])
+        manager = make_user('manager@example.com', roles=['event_manager'])
+
+        client = factory_app.test_client()
+        login_as(client, parent.id)
+        assert client.get('/user/tasks').status_code == 200
+        assert client.get('/admin/events').status_code == 403
+
+        client = factory_app.test_client()
+        login_as(client, manager.id)
+        assert client.get('/admin/events').status_code == 200
+        assert client.get('/admin/users').status_code == 403
+
+
+class TestConnectionPool:
+    """Test pool sizing profiles and pool metrics"""
+
+    def test_profiles(self):
+        """Each profile maps to engine options, with environment overrides"""
+        from db_pool import engine_options, MeteredQueuePool, MeteredNullPool
+        sync = engine_options('sync', environ={})
+        assert sync['poolclass'] is MeteredQueuePool
+        assert sync['pool_size'] == 1 and sync['pool_pre_ping'] is False
+
+        threaded = engine_options('threaded', environ={'DB_POOL_SIZE': '8', 'DB_PRE_PING': 'never'})
+        assert threaded['pool_size'] == 8 and threaded['pool_pre_ping'] is False
+
+        bouncer = engine_options('pgbouncer', environ={})
+        assert bouncer == {'poolclass': MeteredNullPool, 'pool_pre_ping': False}
+
+        with pytest.raises(ValueError):
+            engine_options('huge', environ={})
+
+    def test_metrics(self, tmp_path):
+        """Checkouts, overflow and timeouts are reported"""
+        from sqlalchemy import create_engine, exc
+        from db_pool import engine_options, pool_stats
+        options = engine_options('sync', environ={'DB_MAX_OVERFLOW': '0'})
+        options['pool_timeout'] = 0.05
+        engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **options)
+
+        held = engine.connect()
+        stats = pool_stats(engine)
+        assert stats['checked_out'] == 1
+        assert stats['checkouts'] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        held.close()
+
+        stats = pool_stats(engine)
+        assert stats['checked_out'] == 0
+        assert stats['timeouts'] == 1
+        assert sum(stats['wait_histogram'].values()) == stats['checkouts']
+
+    def test_admin_pool_stats(self, factory_app):
+        """Pool statistics are admin-only JSON"""
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin'])
+        parent = make_user('parent@example.com', roles=['parent'])
+
+        client = factory_app.test_client()
+        login_as(client, parent.id)
+        assert client.get('/admin/pool-stats').status_code == 403
+
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        response = client.get('/admin/pool-stats')
+        assert response.status_code == 200
+        assert 'pool_class' in response.get_json()
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """create_app('test') with file-backed primary and replica databases"""
+    from app import create_app, db
+    from config import TestConfig
+    from replica import REPLICA_BIND, replica_monitor
+    monkeypatch.setattr(TestConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(TestConfig, 'REPLICA_DATABASE_URI', f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_monitor.reset()
+
+    app = create_app('test')
+    with app.app_context():
+        db.metadata.create_all(db.engines[REPLICA_BIND])
+        yield app
+        db.session.remove()
+        db.metadata.drop_all(db.engines[REPLICA_BIND])
+        db.drop_all()
+    # init_app() registered an (empty) metadata for the bind on the shared db
+    db.metadatas.pop(REPLICA_BIND, None)
+    replica_monitor.reset()
+
+
+def make_payment(engine, payment_id):
+    """Insert a Swish payment directly into one database"""
+    from models import SwishPayment
+    with engine.begin() as connection:
+        connection.execute(SwishPayment.__table__.insert().values(
+            id=payment_id, payee_payment_reference=payment_id, payee_alias='123268258',
+            amount=100, currency='SEK', callback_url='https://example.com/callback',
+            callback_identifier=payment_id, status='CREATED'))
+
+
+class TestReadReplica:
+    """Test routing of read-only views to the replica bind"""
+
+    def test_reads_use_replica(self, replica_app):
+        """Decorated views query the replica; other views stay on the primary"""
+        from app import db
+        from conftest import QueryCounter
+        client = replica_app.test_client()
+        with QueryCounter(db.engines['replica']) as replica, QueryCounter(db.engine) as primary:
+            assert client.get('/evenemang').status_code == 200
+        assert replica.count > 0
+        assert primary.count == 0
+
+        with QueryCounter(db.engines['replica']) as replica:
+            assert client.get('/login').status_code == 200
+        assert replica.count == 0
+
+    def test_homepage_cache_is_filled_from_primary(self, replica_app):
+        """An event the replica has not caught up with is not cached away for all workers"""
+        from app import db
+        from models import Event
+        with db.engine.begin() as connection:
+            connection.execute(Event.__table__.insert().values(
+                title='Nypublicerad konsert', is_active=True, created_at=datetime.utcnow(),
+                event_date=datetime.utcnow() + timedelta(days=3)))
+        client = replica_app.test_client()
+        assert 'Nypublicerad konsert' in client.get('/').get_data(as_text=True)
+        assert 'Nypublicerad konsert' in client.get('/').get_data(as_text=True)
+
+    def test_writes_use_primary(self, replica_app):
+        """Flushes inside a replica-routed request go to the primary"""
+        from flask import g
+        from app import db
+        from models import Contact
+        with replica_app.test_request_context('/'):
+            g.db_route = 'replica'
+            db.session.add(Contact(name='Test', email='test@example.com',
+                                   subject='Hej', message='Meddelande'))
+            db.session.commit()
+        with db.engine.connect() as connection:
+            assert connection.execute(db.text('SELECT COUNT(*) FROM contact')).scalar() == 1
+
+    def test_missing_row_falls_back_to_primary(self, replica_app):
+        """A payment that has not replicated yet is read from the primary"""
+        from app import db
+        make_payment(db.engine, 'PAYMENTONPRIMARY')
+        response = replica_app.test_client().get('/payment/PAYMENTONPRIMARY')
+        assert response.status_code == 200
+        assert replica_app.test_client().get('/payment/UNKNOWN').status_code == 404
+
+    def test_lagging_replica_is_skipped(self, replica_app, monkeypatch):
+        """Replication lag above REPLICA_MAX_LAG routes reads to the primary"""
+        from app import db
+        from conftest import QueryCounter
+        from replica import replica_monitor
+        monkeypatch.setattr(replica_monitor, 'measure_lag', lambda engine: 60.0)
+        with QueryCounter(db.engines['replica']) as replica:
+            assert replica_app.test_client().get('/').status_code == 200
+        assert replica.count == 0
+        assert replica_monitor.healthy and replica_monitor.lag == 60.0
+
+    def test_broken_replica_falls_back(self, replica_app):
+        """Errors on the replica retry the view on the primary"""
+        from app import db
+        from replica import replica_monitor
+        db.metadata.drop_all(db.engines['replica'])
+        assert replica_app.test_client().get('/evenemang').status_code == 200
+        assert not replica_monitor.healthy
+
+
+class TestWarmup:
+    """Test the production server profile and warmup steps"""
+
+    def test_gunicorn_config(self):
+        """The shipped config preloads the app and recycles workers"""
+        import gunicorn_config
+        assert gunicorn_config.preload_app is True
+        assert gunicorn_config.reload is False
+        assert gunicorn_config.max_requests > 0
+        assert 0 < gunicorn_config.max_requests_jitter < gunicorn_config.max_requests
+
+    def test_compile_templates(self, factory_app):
+        """Every template compiles into the Jinja cache"""
+        from warmup import compile_templates
+        count = compile_templates(factory_app)
+        assert count > 20
+        assert len(factory_app.jinja_env.cache) >= count
+
+    def test_warmup_steps(self, factory_app):
+        """Master and worker warmup report their step timings"""
+        import passwords
+        from warmup import warmup_master, warmup_worker
+        passwords._dummy_hashes.clear()
+        assert set(warmup_master(factory_app)) == {'templates', 'caches'}
+        assert passwords.current_method() in passwords._dummy_hashes
+        assert set(warmup_worker(factory_app)) == {'db_connect'}
+
+    def test_prime_caches_fills_database_caches(self, factory_app, count_queries):
+        """The homepage and choice lists are served from the cache after priming"""
+        from homepage import get_homepage_data
+        from user_utils import get_event_manager_choices, get_user_choices_for_forms
+        from warmup import prime_caches
+        prime_caches(factory_app)
+        with count_queries() as counter:
+            get_homepage_data()
+            get_user_choices_for_forms()
+            get_event_manager_choices()
+        assert counter.count == 0
+
+
+class TestTemplateCache:
+    """Test the Jinja bytecode cache and the precompile command"""
+
+    def test_disabled_by_default_in_tests(self, factory_app):
+        assert factory_app.jinja_env.bytecode_cache is None
+
+    def test_compile_command(self, tmp_path, monkeypatch):
+        """`flask templates compile` writes bytecode a fresh app can load"""
+        import os
+        from app import create_app
+        from config import TestConfig
+        monkeypatch.setattr(TestConfig, 'TEMPLATE_BYTECODE_CACHE', True)
+        monkeypatch.setattr(TestConfig, 'TEMPLATE_CACHE_DIR', str(tmp_path))
+
+        app = create_app('test')
+        result = app.test_cli_runner().invoke(args=['templates', 'compile'])
+        assert result.exit_code == 0, result.output
+        cached = os.listdir(tmp_path)
+        assert len(cached) > 20
+
+        # A fresh app loads the bytecode instead of compiling (and dumping) again
+        fresh = create_app('test')
+        dumped = []
+        monkeypatch.setattr(fresh.jinja_env.bytecode_cache, 'dump_bytecode', dumped.append)
+        fresh.jinja_env.get_template('base.html')
+        assert dumped == []
+
+        result = fresh.test_cli_runner().invoke(args=['templates', 'clear'])
+        assert result.exit_code == 0
+        assert os.listdir(tmp_path) == []
+
+
+class TestHomepageCache:
+    """Test the cached homepage data and its invalidation"""
+
+    def make_event(self, title, days_ahead=7):
+        from app import db
+        from models import Event
+        event = Event(title=title, event_date=datetime.utcnow() + timedelta(days=days_ahead),
+                      location='Aulan', is_active=True)
+        db.session.add(event)
+        db.session.commit()
+        return event
+
+    def test_repeat_views_run_no_queries(self, factory_app, count_queries):
+        self.make_event('Vårkonsert')
+        client = factory_app.test_client()
+        assert b'V\xc3\xa5rkonsert' in client.get('/').data
+        with count_queries() as counter:
+            response = client.get('/')
+        assert b'V\xc3\xa5rkonsert' in response.data
+        assert counter.count == 0
+
+    def test_event_changes_evict(self, factory_app):
+        from app import db
+        client = factory_app.test_client()
+        event = self.make_event('Vårkonsert')
+        client.get('/')
+
+        event.title = 'Julkonsert'
+        db.session.commit()
+        assert 'Julkonsert' in client.get('/').get_data(as_text=True)
+
+        db.session.delete(event)
+        db.session.commit()
+        assert 'Julkonsert' not in client.get('/').get_data(as_text=True)
+
+    def test_rollback_keeps_cache(self, factory_app, count_queries):
+        from app import db
+        event = self.make_event('Vårkonsert')
+        client = factory_app.test_client()
+        client.get('/')
+        event.title = 'Julkonsert'
+        db.session.flush()
+        db.session.rollback()
+        with count_queries() as counter:
+            assert 'Vårkonsert' in client.get('/').get_data(as_text=True)
+        assert counter.count == 0
+
+    def test_expires_when_first_event_starts(self, factory_app):
+        from homepage import get_homepage_data
+        event = self.make_event('Vårkonsert', days_ahead=1)
+        local = datetime(2026, 3, 1)  # same cache key for both calls
+        assert get_homepage_data(now=local, utcnow=datetime.utcnow())['upcoming_events']
+        later = event.event_date + timedelta(seconds=1)
+        assert get_homepage_data(now=local, utcnow=later)['upcoming_events'] == []
+
+    def test_commit_clears_other_workers(self, factory_app, redis_stub, monkeypatch):
+        """With a shared backend a commit in one worker is seen by all of them"""
+        from app import db
+        from cache import Cache, RedisBackend, cache
+        from homepage import HOMEPAGE_NAMESPACE, get_homepage_data
+        monkeypatch.setattr(cache, 'backend', RedisBackend(redis_stub.url))
+        other_worker = Cache(RedisBackend(redis_stub.url), prefix=cache.prefix)
+        event = self.make_event('Vårkonsert')
+        local = datetime(2026, 3, 1)
+        key = f"{get_homepage_data(now=local)['school_year']}:False"
+        assert other_worker.get(HOMEPAGE_NAMESPACE, key)['rows'][0][0]['title'] == 'Vårkonsert'
+
+        event.title = 'Julkonsert'
+        db.session.commit()
+        assert other_worker.get(HOMEPAGE_NAMESPACE, key) is None
+
+    def test_key_helpers(self):
+        from homepage import in_reminder_period, school_year_for
+        assert school_year_for(datetime(2026, 8, 1)) == '2027/2028'
+        assert school_year_for(datetime(2026, 3, 1)) == '2026/2027'
+        assert in_reminder_period(datetime(2026, 12, 24))
+        assert in_reminder_period(datetime(2027, 1, 10))
+        assert not in_reminder_period(datetime(2026, 6, 1))
+
+
+class TestConditionalGet:
+    """Test ETag validation and cache headers on public pages"""
+
+    def test_not_modified(self, factory_app):
+        client = factory_app.test_client()
+        response = client.get('/om-oss')
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'public, no-cache'
+        assert 'Cookie' in response.headers['Vary']
+        etag = response.headers['ETag']
+
+        response = client.get('/om-oss', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+
+        assert client.get('/integritet', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_event_changes_update_etag(self, factory_app):
+        from app import db
+        from models import Event
+        client = factory_app.test_client()
+        event = Event(title='Vårkonsert', event_date=datetime.utcnow() + timedelta(days=7))
+        db.session.add(event)
+        db.session.commit()
+        etags = {path: client.get(path).headers['ETag'] for path in ('/', '/evenemang')}
+        assert client.get('/evenemang').headers['Last-Modified']
+
+        event.title = 'Julkonsert'
+        db.session.commit()
+        for path, etag in etags.items():
+            response = client.get(path, headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert 'Julkonsert' in response.get_data(as_text=True)
+
+    def test_no_render_on_match(self, factory_app, monkeypatch):
+        """A matching request does not render the template"""
+        import routes
+        client = factory_app.test_client()
+        etag = client.get('/').headers['ETag']
+        monkeypatch.setattr(routes, 'render_template', lambda *a, **kw: pytest.fail('rendered'))
+        assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    def test_logged_in_views(self, factory_app):
+        from conftest import login_as
+        user = make_user('parent@example.com', roles=['parent'])
+        anonymous_etag = factory_app.test_client().get('/om-oss').headers['ETag']
+
+        client = factory_app.test_client()
+        login_as(client, user.id)
+        response = client.get('/om-oss')
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        assert response.headers['ETag'] != anonymous_etag
+        assert client.get('/om-oss', headers={'If-None-Match': anonymous_etag}).status_code == 200
+
+        # Parents see tasks on the events page, so it is always rendered
+        response = client.get('/evenemang')
+        assert 'ETag' not in response.headers
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    def test_pending_flash_renders(self, factory_app):
+        client = factory_app.test_client()
+        etag = client.get('/om-oss').headers['ETag']
+        with client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Tack!')]
+        response = client.get('/om-oss', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+
+class TestCache:
+    """Test the cache API and its backends"""
+
+    def test_memory_lru_and_ttl(self, monkeypatch):
+        import cache as cache_module
+        from cache import Cache, MemoryBackend
+        backend = MemoryBackend(max_entries=2)
+        cache = Cache(backend)
+        cache.set('ns', 'a', 1)
+        cache.set('ns', 'b', 2)
+        assert cache.get('ns', 'a') == 1  # a is now most recently used
+        cache.set('ns', 'c', 3)
+        assert cache.get('ns', 'b') is None
+        assert cache.get('ns', 'c') == 3
+
+        now = cache_module.time.monotonic()
+        cache.set('ns', 'short', 'x', ttl=10)
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + 11)
+        assert cache.get('ns', 'short') is None
+
+    def test_size_limits(self):
+        from cache import Cache, MemoryBackend
+        cache = Cache(MemoryBackend(max_bytes=300), max_value_bytes=200)
+        assert cache.set('ns', 'big', 'x' * 500) is False
+        assert cache.get('ns', 'big') is None
+        cache.set('ns', 'one', 'x' * 150)
+        cache.set('ns', 'two', 'y' * 150)
+        assert cache.get('ns', 'one') is None
+        assert cache.backend.info()['bytes'] <= 300
+
+    def test_namespaces_and_stats(self):
+        from cache import Cache
+        cache = Cache()
+        cache.set('users', 1, 'Anna')
+        cache.set('events', 1, 'Vårkonsert')
+        cache.clear('users')
+        assert cache.get('users', 1) is None
+        assert cache.get('events', 1) == 'Vårkonsert'
+        stats = cache.stats()['namespaces']
+        assert stats['users'] == {'hits': 0, 'misses': 1, 'hit_rate': 0.0}
+        assert stats['events']['hits'] == 1
+
+    def test_memoize(self):
+        from cache import Cache
+        cache = Cache()
+        calls = []
+
+        @cache.memoize('squares')
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        assert [square(3), square(3), square(4)] == [9, 9, 16]
+        assert calls == [3, 4]
+
+    def test_redis_backend(self, redis_stub):
+        """The redis backend works against a local stand-in server"""
+        from cache import Cache, RedisBackend
+        cache = Cache(RedisBackend(redis_stub.url))
+        cache.set('users', 'choices', [('1', 'Anna')], ttl=60)
+        assert cache.get('users', 'choices') == [('1', 'Anna')]
+        cache.set('events', 'list', [1, 2])
+        cache.clear('users')
+        assert cache.get('users', 'choices') is None
+        assert cache.get('events', 'list') == [1, 2]
+        assert cache.stats()['backend'] == {'backend': 'redis', 'entries': 1}
+
+    def test_backend_outage_is_a_miss(self, redis_stub):
+        from cache import Cache, RedisBackend
+        cache = Cache(RedisBackend(redis_stub.url))
+        redis_stub.stop()
+        assert cache.set('users', 1, 'Anna') is False
+        assert cache.get('users', 1) is None
+
+    def test_user_choices_invalidation(self, factory_app, count_queries):
+        """Form choices are memoized until a user or group changes"""
+        from app import db
+        from user_utils import get_user_choices_for_forms
+        user = make_user('parent@example.com', roles=['parent'])
+        assert len(get_user_choices_for_forms()) == 2
+        with count_queries() as counter:
+            get_user_choices_for_forms()
+        assert counter.count == 0
+
+        user.active = False
+        db.session.commit()
+        assert len(get_user_choices_for_forms()) == 1
+
+    def test_user_choices_single_query(self, factory_app, count_queries):
+        """Each choice list is one DISTINCT query: deduplicated, active only, sorted"""
+        from app import db
+        from cache import cache
+        from user_utils import USER_CHOICES_NAMESPACE, get_event_manager_choices, get_user_choices_for_forms
+        for email, first_name, roles, active in [
+                ('cecilia@example.com', 'Cecilia', ['parent', 'event_manager', 'admin'], True),
+                ('adam@example.com', 'Adam', ['parent'], True),
+                ('bertil@example.com', 'Bertil', ['event_manager'], True),
+                ('david@example.com', 'David', ['admin'], False),
+                ('erik@example.com', 'Erik', [], True)]:
+            make_user(email, roles=roles, active=active).first_name = first_name
+        db.session.commit()
+        cache.clear(USER_CHOICES_NAMESPACE)
+
+        with count_queries() as counter:
+            choices = get_user_choices_for_forms()
+            coordinators = get_event_manager_choices()
+        assert counter.count == 2
+        assert [label.split()[0] for _, label in choices[1:]] == ['Adam', 'Bertil', 'Cecilia']
+        assert choices[0] == ('', 'Ingen tilldelning')
+        assert [label for _, label in coordinators[1:]] == ['Bertil User', 'Cecilia User']
+
+    def test_user_choices_invalidated_only_by_relevant_changes(self, factory_app, count_queries):
+        """Logins don't clear the choice lists; names, activity and memberships do"""
+        from datetime import datetime
+        from app import db
+        from models import Group
+        from user_utils import get_user_choices_for_forms
+        parent = make_user('parent@example.com', roles=['parent'])
+
+        def cached():
+            get_user_choices_for_forms()
+            with count_queries() as counter:
+                get_user_choices_for_forms()
+            return counter.count == 0
+
+        get_user_choices_for_forms()
+        parent.last_login = datetime.utcnow()
+        db.session.commit()
+        assert cached()
+        make_user('no_roles@example.com')
+        assert cached()
+
+        parent.first_name = 'Petra'
+        db.session.commit()
+        assert 'Petra User (parent@example.com)' in dict(get_user_choices_for_forms()).values()
+
+        manager = make_user('manager@example.com', roles=['event_manager'])
+        assert len(get_user_choices_for_forms()) == 3
+        manager.groups = []
+        db.session.commit()
+        assert len(get_user_choices_for_forms()) == 2
+        parents = Group.query.filter_by(name='parent').one()
+        parents.users.append(manager)
+        db.session.commit()
+        assert len(get_user_choices_for_forms()) == 3
+        db.session.delete(manager)
+        db.session.commit()
+        assert len(get_user_choices_for_forms()) == 2
+
+    def test_admin_cache_stats(self, factory_app):
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin'])
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        response = client.get('/admin/cache-stats')
+        assert response.status_code == 200
+        assert response.get_json()['backend']['backend'] == 'memory'
+
+
+def brotli_available():
+    from assets import brotli
+    return brotli is not None
+
+
+class TestAssets:
+    """Test the fingerprinted asset pipeline"""
+
+    @pytest.fixture
+    def built_app(self, factory_app, tmp_path):
+        from assets import build_assets, init_assets
+        static = tmp_path / 'static'
+        (static / 'css').mkdir(parents=True)
+        (static / 'css' / 'style.css').write_text('body { color: #123; }\n' * 200)
+        (static / 'images').mkdir()
+        (static / 'images' / 'logo.gif').write_bytes(b'GIF89a')
+        factory_app.static_folder = str(static)
+        factory_app.config['ASSETS_USE_MANIFEST'] = True
+        factory_app.extensions['asset_manifest'] = build_assets(str(static))
+        return factory_app
+
+    def test_build_writes_manifest_and_variants(self, built_app):
+        import os
+        from assets import load_manifest
+        manifest = load_manifest(built_app)
+        css = manifest['css/style.css']
+        assert css.startswith('css/style.') and css.endswith('.css') and css != 'css/style.css'
+        dist = os.path.join(built_app.static_folder, 'dist')
+        assert os.path.isfile(os.path.join(dist, css + '.gz'))
+        if brotli_available():
+            assert os.path.isfile(os.path.join(dist, css + '.br'))
+        # Images are fingerprinted but not recompressed
+        assert not os.path.exists(os.path.join(dist, manifest['images/logo.gif'] + '.gz'))
+
+    def test_asset_url(self, built_app):
+        from assets import asset_url
+        with built_app.test_request_context():
+            assert asset_url('css/style.css') == '/assets/' + built_app.extensions['asset_manifest']['css/style.css']
+            assert asset_url('js/missing.js') == '/static/js/missing.js'
+
+    def test_css_urls_point_at_fingerprinted_files(self, tmp_path):
+        from assets import build_assets
+        static = tmp_path / 'static'
+        (static / 'css').mkdir(parents=True)
+        (static / 'fonts').mkdir()
+        (static / 'fonts' / 'a.woff2').write_bytes(b'font')
+        (static / 'css' / 'site.css').write_text(
+            '@font-face{src:url(../fonts/a.woff2?v=1) format("woff2")}'
+            '.x{background:url("data:image/png;base64,AA")}.y{background:url(/abs.png)}')
+        manifest = build_assets(str(static))
+        css = (static / 'dist' / manifest['css/site.css']).read_text()
+        assert f"url(../{manifest['fonts/a.woff2']}?v=1)" in css
+        assert 'url("data:image/png;base64,AA")' in css and 'url(/abs.png)' in css
+
+    def test_serves_precompressed(self, built_app):
+        import gzip
+        brotli = pytest.importorskip('brotli')
+        client = built_app.test_client()
+        path = '/assets/' + built_app.extensions['asset_manifest']['css/style.css']
+
+        response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert response.headers['Content-Type'].startswith('text/css')
+        assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert brotli.decompress(response.data).startswith(b'body')
+
+        response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data).startswith(b'body')
+
+        response = client.get(path, headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.data.startswith(b'body')
+
+        assert client.get(path + '.gz').status_code == 404
+        assert client.get('/assets/manifest.json').status_code == 404
+
+    def test_base_template_uses_manifest(self, built_app):
+        html = built_app.test_client().get('/om-oss').get_data(as_text=True)
+        assert '/assets/' + built_app.extensions['asset_manifest']['css/style.css'] in html
+
+    def test_development_falls_back_to_static(self, factory_app):
+        html = factory_app.test_client().get('/om-oss').get_data(as_text=True)
+        assert '/static/css/style.css' in html
+
+
+class TestImages:
+    """Test responsive image variants and the srcset helper"""
+
+    @pytest.fixture
+    def image_app(self, factory_app, tmp_path):
+        pytest.importorskip('PIL')
+        from PIL import Image
+        from images import build_images, init_images
+        static = tmp_path / 'static'
+        (static / 'images').mkdir(parents=True)
+        Image.new('RGB', (800, 600), (200, 30, 30)).save(static / 'images' / 'photo.jpg')
+        frames = [Image.new('RGB', (400, 400), color).convert('P') for color in ('red', 'blue')]
+        frames[0].save(static / 'images' / 'logo.gif', save_all=True, append_images=frames[1:], duration=100)
+        factory_app.static_folder = str(static)
+        self.manifest = build_images(str(static), workers=2)
+        init_images(factory_app)
+        return factory_app
+
+    def test_plan_widths(self):
+        from images import plan_widths
+        assert plan_widths('images/photo.jpg', 800) == [320, 640, 800]
+        assert plan_widths('images/photo.jpg', 2000) == [320, 640, 960, 1280, 1600]
+        assert plan_widths('images/photo.jpg', 200) == [200]
+
+    def test_build(self, image_app):
+        import os
+        from PIL import Image
+        photo = self.manifest['images']['images/photo.jpg']
+        assert set(photo['variants']) == {'avif', 'webp', 'jpeg'}
+        assert photo['fallback'] == 'jpeg'
+        width, path = photo['variants']['webp'][0]
+        with Image.open(os.path.join(image_app.static_folder, path)) as variant:
+            assert variant.size == (320, 240)
+
+        logo = self.manifest['images']['images/logo.gif']
+        assert logo['animated'] and list(logo['variants']) == ['webp']
+        with Image.open(os.path.join(image_app.static_folder, logo['variants']['webp'][0][1])) as variant:
+            assert variant.is_animated
+        assert 'variants/favicon/favicon.ico' in self.manifest['favicons']
+
+    def test_helper_markup(self, image_app):
+        from images import responsive_image
+        with image_app.test_request_context():
+            html = str(responsive_image('images/photo.jpg', 'Elever', sizes='50vw', class_='img-fluid'))
+        assert html.index('image/avif') < html.index('image/webp')
+        assert '/static/variants/images/photo-320.jpg 320w' in html
+        assert 'sizes="50vw"' in html
+        assert 'width="800" height="600"' in html
+        assert 'class="img-fluid"' in html and 'alt="Elever"' in html
+
+    def test_build_without_avif_support(self, factory_app, tmp_path, monkeypatch):
+        pytest.importorskip('PIL')
+        from PIL import Image, features
+        from images import build_images, init_images, responsive_image
+        static = tmp_path / 'static'
+        (static / 'images').mkdir(parents=True)
+        Image.new('RGB', (400, 300)).save(static / 'images' / 'photo.jpg')
+        check = features.check
+        monkeypatch.setattr(features, 'check', lambda feature: feature != 'avif' and check(feature))
+        factory_app.static_folder = str(static)
+        manifest = build_images(str(static), workers=1)
+        assert set(manifest['images']['images/photo.jpg']['variants']) == {'webp', 'jpeg'}
+        assert not list((static / 'variants' / 'images').glob('*.avif'))
+        init_images(factory_app)
+        with factory_app.test_request_context():
+            html = str(responsive_image('images/photo.jpg', 'Elever'))
+        assert 'image/avif' not in html and 'image/webp' in html
+
+    def test_helper_without_build(self, factory_app):
+        from images import responsive_image, favicon_links
+        factory_app.extensions['image_variants'] = None
+        with factory_app.test_request_context():
+            html = str(responsive_image('images/photo.jpg', 'Elever <3'))
+            assert html == ('<img src="/static/images/photo.jpg" alt="Elever &lt;3" '
+                            'loading="lazy" decoding="async">')
+            assert 'logo.gif' in str(favicon_links())
+
+
+class TestVendor:
+    """Test the self-hosted, purged CSS/JS/font bundle"""
+
+    BOOTSTRAP_CSS = (
+        '/*! Bootstrap | MIT */@charset "UTF-8";:root{--bs-blue:#0d6efd}'
+        '.btn{padding:1rem}.btn-primary{color:#fff}.btn-unused{color:red}'
+        '.card,.carousel{display:block}.nav-link:not(.dropdown-toggle){color:blue}'
+        '@media (min-width:992px){.navbar-expand-lg{display:flex}.offcanvas{display:none}}'
+        '.alert-danger{color:red}.alert-info{color:blue}.bg-success{color:green}'
+        '.spinner-border{animation:.75s linear infinite spinner-border}'
+        '@keyframes spinner-border{to{transform:rotate(360deg)}}'
+        '@keyframes placeholder-glow{50%{opacity:.2}}'
+        '[data-bs-theme=dark]{color-scheme:dark}.modal.show{display:block}')
+    ICONS_CSS = (
+        '.fa,.fas{font-family:"Font Awesome 6 Free";font-weight:900}'
+        '.fab{font-family:"Font Awesome 6 Brands";font-weight:400}'
+        '.fa-calendar:before{content:"\\f000"}.fa-check-circle:before{content:"\\f001"}'
+        '.fa-unused:before{content:"\\f002"}.fa-google:before{content:"\\f003"}'
+        '@font-face{font-family:"Font Awesome 6 Free";font-weight:900;font-display:block;'
+        'src:url(../webfonts/fa-solid-900.woff2) format("woff2"),'
+        'url(../webfonts/fa-solid-900.ttf) format("truetype")}'
+        '@font-face{font-family:"Font Awesome 6 Brands";font-weight:400;font-display:block;'
+        'src:url(../webfonts/fa-brands-400.woff2) format("woff2")}'
+        '@font-face{font-family:"FontAwesome";src:url(../webfonts/fa-v4compatibility.woff2) format("woff2")}')
+    GOOGLE_CSS = (
+        "/* cyrillic */\n@font-face {\n  font-family: 'Playfair Display';\n  font-style: normal;\n"
+        "  font-weight: 400;\n  font-display: swap;\n"
+        "  src: url(https://fonts.gstatic.com/s/playfair/cyr.woff2) format('woff2');\n}\n"
+        "/* latin */\n@font-face {\n  font-family: 'Playfair Display';\n  font-style: normal;\n"
+        "  font-weight: 700;\n  src: url(https://fonts.gstatic.com/s/playfair/latin.woff2) format('woff2');\n"
+        "  unicode-range: U+0000-00FF;\n}\n")
+
+    @staticmethod
+    def make_font(path, codepoints):
+        from fontTools.fontBuilder import FontBuilder
+        from fontTools.pens.ttGlyphPen import TTGlyphPen
+        names = ['.notdef'] + [f'icon{cp:x}' for cp in codepoints]
+        pen = TTGlyphPen(None)
+        pen.moveTo((0, 0))
+        pen.lineTo((0, 500))
+        pen.lineTo((500, 500))
+        pen.closePath()
+        builder = FontBuilder(1000, isTTF=True)
+        builder.setupGlyphOrder(names)
+        builder.setupCharacterMap({cp: f'icon{cp:x}' for cp in codepoints})
+        builder.setupGlyf({name: pen.glyph() for name in names})
+        builder.setupHorizontalMetrics({name: (500, 0) for name in names})
+        builder.setupHorizontalHeader(ascent=800, descent=-200)
+        builder.setupNameTable({'familyName': 'Icons', 'styleName': 'Regular'})
+        builder.setupOS2()
+        builder.setupPost()
+        builder.save(str(path))
+
+    @pytest.fixture
+    def usage(self):
+        from vendor import ClassUsage
+        return ClassUsage(words={'btn', 'btn-primary', 'card', 'nav-link', 'navbar-expand-lg',
+                                 'modal', 'fas', 'fab', 'fa-calendar', 'fa-google', 'danger',
+                                 'check-circle'},
+                          dynamic_prefixes={'alert', 'fa'})
+
+    @pytest.fixture
+    def source_dir(self, tmp_path):
+        pytest.importorskip('fontTools')
+        pytest.importorskip('brotli')  # woff2 output
+        from vendor import localize_font_css
+        source = tmp_path / 'vendor_src'
+        for directory in ('bootstrap', 'fontawesome/css', 'fontawesome/webfonts', 'fonts'):
+            (source / directory).mkdir(parents=True)
+        (source / 'bootstrap' / 'bootstrap.min.css').write_text(self.BOOTSTRAP_CSS)
+        (source / 'bootstrap' / 'bootstrap.bundle.min.js').write_text('/*! Bootstrap */window.bootstrap={};')
+        (source / 'fontawesome' / 'css' / 'all.min.css').write_text(self.ICONS_CSS)
+        self.make_font(source / 'fontawesome' / 'webfonts' / 'fa-solid-900.ttf', [0xf000, 0xf001, 0xf002])
+        self.make_font(source / 'fontawesome' / 'webfonts' / 'fa-brands-400.ttf', [0xf003, 0xf004])
+        css, downloads = localize_font_css(self.GOOGLE_CSS)
+        (source / 'fonts' / 'fonts.css').write_text(css)
+        for name in downloads:
+            (source / 'fonts' / name).write_bytes(b'wOF2 text font')
+        return source
+
+    def test_scan_finds_words_and_dynamic_prefixes(self, tmp_path):
+        from vendor import ClassUsage
+        template = tmp_path / 'page.html'
+        template.write_text('<span class="badge bg-{{ colors.get(s, \'secondary\') }}">'
+                            '<script>el.className = `text-${kind}`;</script>')
+        usage = ClassUsage.scan([str(template)])
+        assert usage.dynamic_prefixes == {'bg', 'text'}
+        assert usage.uses('badge') and usage.uses('bg-secondary') and usage.uses('text-kind')
+        assert usage.uses('collapsing')  # added by Bootstrap's JavaScript
+        assert not usage.uses('bg-primary')
+
+    def test_purge_css(self, usage):
+        from vendor import purge_css
+        css = purge_css(self.BOOTSTRAP_CSS, usage)
+        assert css.startswith('/*! Bootstrap | MIT */')
+        for kept in ('.btn{', '.btn-primary{', '.card{', '.nav-link:not(.dropdown-toggle){',
+                     '@media (min-width:992px){.navbar-expand-lg{', '.alert-danger{',
+                     ':root{', '[data-bs-theme=dark]{', '.modal.show{'):
+            assert kept in css, kept
+        for dropped in ('.btn-unused', '.carousel', '.offcanvas', '.alert-info', '.bg-success',
+                        '.spinner-border', 'placeholder-glow', '@charset'):
+            assert dropped not in css, dropped
+
+    def test_keyframes_and_font_faces_follow_their_users(self, usage):
+        from vendor import purge_css
+        usage.words.add('spinner-border')
+        assert '@keyframes spinner-border' in purge_css(self.BOOTSTRAP_CSS, usage)
+        icons = purge_css(self.ICONS_CSS, usage)
+        assert '"Font Awesome 6 Free"' in icons and '"Font Awesome 6 Brands"' in icons
+        assert '"FontAwesome"' not in icons
+
+    def test_localize_font_css(self):
+        from vendor import localize_font_css
+        css, downloads = localize_font_css(self.GOOGLE_CSS)
+        assert downloads == {'playfair-display-700-normal-latin.woff2':
+                             'https://fonts.gstatic.com/s/playfair/latin.woff2'}
+        assert 'cyrillic' not in css
+        assert 'font-display: swap' in css
+        assert 'url(playfair-display-700-normal-latin.woff2)' in css
+
+    def test_build_bundle(self, factory_app, source_dir, usage, tmp_path):
+        import os
+        from fontTools.ttLib import TTFont
+        from vendor import build_vendor, init_vendor
+        static = tmp_path / 'static'
+        stats = build_vendor(str(static), str(source_dir), usage)
+        bundle = (static / 'vendor' / 'css' / 'vendor.css').read_text()
+
+        assert 'url(../fonts/playfair-display-700-normal-latin.woff2)' in bundle
+        assert '.btn-primary{' in bundle and '.btn-unused' not in bundle
+        assert '.fa-calendar:before' in bundle and '.fa-unused' not in bundle
+        assert 'fa-solid-900.ttf' not in bundle  # woff2 only
+        assert stats['icons'] == 3
+
+        solid = TTFont(str(static / 'vendor' / 'webfonts' / 'fa-solid-900.woff2'))
+        assert set(solid.getBestCmap()) == {0xf000, 0xf001}
+        brands = TTFont(str(static / 'vendor' / 'webfonts' / 'fa-brands-400.woff2'))
+        assert set(brands.getBestCmap()) == {0xf003}
+        assert (static / 'vendor' / 'fonts' / 'playfair-display-700-normal-latin.woff2').is_file()
+        assert os.path.isfile(static / 'vendor' / 'js' / 'bootstrap.bundle.min.js')
+
+        factory_app.static_folder = str(static)
+        init_vendor(factory_app)
+        html = factory_app.test_client().get('/om-oss').get_data(as_text=True)
+        assert '/static/vendor/css/vendor.css' in html
+        assert '/static/vendor/js/bootstrap.bundle.min.js' in html
+        assert 'cdn.jsdelivr.net' not in html and 'fonts.googleapis.com' not in html
+
+    def test_command_reports_failed_downloads(self, factory_app, tmp_path, monkeypatch):
+        import requests
+
+        def unreachable(self, url, **kwargs):
+            raise requests.ConnectionError(f'Could not reach {url}')
+
+        monkeypatch.setattr(requests.Session, 'get', unreachable)
+        runner = factory_app.test_cli_runner()
+        result = runner.invoke(args=['assets', 'vendor', '--source', str(tmp_path)])
+        assert result.exit_code == 1
+        assert 'Could not reach https://cdn.jsdelivr.net' in result.output
+        assert '--offline' in result.output and 'Traceback' not in result.output
+
+        result = runner.invoke(args=['assets', 'vendor', '--source', str(tmp_path), '--offline'])
+        assert result.exit_code == 1
+        assert 'bootstrap/bootstrap.min.css' in result.output and 'fonts/fonts.css' in result.output
+
+    def test_cdn_fallback_without_bundle(self, factory_app):
+        factory_app.jinja_env.globals['vendor_bundle'] = False
+        html = factory_app.test_client().get('/om-oss').get_data(as_text=True)
+        assert 'cdn.jsdelivr.net/npm/bootstrap@5.3.0' in html
+
+
+class TestInstagramFeed:
+    """Test the server-side Instagram feed and thumbnail proxy"""
+
+    @pytest.fixture
+    def feed_app(self, factory_app, behold_stub):
+        behold_stub.add_post('111', 'Vårkonsert i aulan')
+        behold_stub.add_post('222', 'Lucia ' * 20)
+        factory_app.config['BEHOLD_FEED_ID'] = 'test-feed'
+        factory_app.config['BEHOLD_FEED_URL'] = behold_stub.feed_url
+        return factory_app
+
+    @staticmethod
+    def wait_for_refresh():
+        from instagram import _refresh_lock
+        assert _refresh_lock.acquire(timeout=5)
+        _refresh_lock.release()
+
+    def test_parse_feed(self):
+        from instagram import parse_feed, MAX_POSTS
+        post = {'id': 1, 'permalink': 'https://www.instagram.com/p/x/', 'caption': 'x' * 80,
+                'mediaUrl': 'https://behold.pictures/full.jpg',
+                'sizes': {'medium': {'mediaUrl': 'https://behold.pictures/m.jpg', 'width': 700, 'height': 700},
+                          'large': {'mediaUrl': 'https://behold.pictures/l.jpg', 'width': 1000, 'height': 1000}}}
+        video = {'id': 2, 'permalink': 'https://www.instagram.com/reel/y/', 'mediaType': 'VIDEO',
+                 'mediaUrl': 'https://behold.pictures/v.mp4', 'thumbnailUrl': 'https://behold.pictures/t.jpg'}
+        broken = {'id': 3, 'permalink': 'javascript:alert(1)', 'mediaUrl': 'https://behold.pictures/b.jpg'}
+        posts = parse_feed({'posts': [post, video, broken]})
+        assert [p['id'] for p in posts] == ['1', '2']
+        assert posts[0]['media_url'] == 'https://behold.pictures/l.jpg'
+        assert posts[0]['caption'] == 'x' * 60 + '...'
+        assert posts[1]['media_url'] == 'https://behold.pictures/t.jpg'
+        # The older feed format is a bare list
+        assert len(parse_feed([post] * 10)) == MAX_POSTS
+
+    def test_homepage_renders_feed_server_side(self, feed_app, behold_stub):
+        client = feed_app.test_client()
+        html = client.get('/').get_data(as_text=True)
+        assert '/instagram/media/111/320' in html and '/instagram/media/111/640 640w' in html
+        assert 'Vårkonsert i aulan' in html
+        assert 'behold.so' not in html and behold_stub.url not in html
+        client.get('/')
+        assert behold_stub.count('/feeds/') == 1
+
+    def test_without_feed_id_shows_preview(self, factory_app):
+        html = factory_app.test_client().get('/').get_data(as_text=True)
+        assert '@brunnsbo_musikklasser' in html and '/instagram/media/' not in html
+
+    def test_stale_feed_is_served_while_revalidating(self, feed_app, behold_stub):
+        from cache import cache
+        from instagram import FEED_NAMESPACE, FEED_KEY
+        client = feed_app.test_client()
+        client.get('/')
+        entry = cache.get(FEED_NAMESPACE, FEED_KEY)
+        entry['fetched_at'] -= feed_app.config['INSTAGRAM_FEED_TTL'] + 1
+        cache.set(FEED_NAMESPACE, FEED_KEY, entry)
+        behold_stub.posts.clear()
+        behold_stub.add_post('333', 'Nytt inlägg')
+
+        html = client.get('/').get_data(as_text=True)
+        assert 'Vårkonsert i aulan' in html  # stale copy, no waiting on Behold
+        self.wait_for_refresh()
+        assert behold_stub.count('/feeds/') == 2
+        assert 'Nytt inlägg' in client.get('/').get_data(as_text=True)
+
+    def test_failed_fetch_backs_off(self, feed_app, behold_stub):
+        behold_stub.fail = True
+        client = feed_app.test_client()
+        assert client.get('/').status_code == 200
+        client.get('/')
+        assert behold_stub.count('/feeds/') == 1
+
+    def test_new_posts_change_homepage_etag(self, feed_app, behold_stub):
+        from instagram import refresh_feed
+        client = feed_app.test_client()
+        etag = client.get('/').headers['ETag']
+        with feed_app.app_context():
+            refresh_feed()
+        assert client.get('/', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_thumbnail_proxy(self, feed_app, behold_stub):
+        pytest.importorskip('PIL')
+        import io
+        from PIL import Image
+        client = feed_app.test_client()
+        client.get('/')
+
+        response = client.get('/instagram/media/111/320', headers={'Accept': 'image/avif,image/webp,*/*'})
+        assert response.status_code == 200 and response.mimetype == 'image/webp'
+        assert Image.open(io.BytesIO(response.data)).size == (320, 320)
+        assert 'max-age=' in response.headers['Cache-Control']
+        assert 'Accept' in response.headers['Vary']
+
+        response = client.get('/instagram/media/111/640', headers={'Accept': '*/*'})
+        assert response.mimetype == 'image/jpeg'
+        assert Image.open(io.BytesIO(response.data)).size == (640, 640)
+
+        again = client.get('/instagram/media/111/640', headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+        assert behold_stub.count('/media/111') == 2  # one per format, then cached
+
+    def test_thumbnail_proxy_rejects_unknown(self, feed_app, behold_stub):
+        client = feed_app.test_client()
+        client.get('/')
+        assert client.get('/instagram/media/999/320').status_code == 404
+        assert client.get('/instagram/media/111/500').status_code == 404
+        assert behold_stub.count('/media/') == 0
+
+    def test_refresh_if_due(self, feed_app, behold_stub):
+        from instagram import refresh_if_due
+        with feed_app.app_context():
+            assert refresh_if_due() is True
+            assert refresh_if_due() is False
+        assert behold_stub.count('/feeds/') == 1
+
+    def test_refresh_command(self, feed_app, behold_stub):
+        result = feed_app.test_cli_runner().invoke(args=['instagram', 'refresh'])
+        assert result.exit_code == 0 and 'Cached 2 Instagram posts' in result.output
+
+
+class TestCompression:
+    """Test the gzip/brotli response compression middleware"""
+
+    PAGE = b'<p>' + 'Välkommen till Brunnsbo Musikklasser! '.encode() * 50 + b'</p>'
+
+    @staticmethod
+    def wsgi_app(chunks, headers=(('Content-Type', 'text/html; charset=utf-8'),), status='200 OK'):
+        def app(environ, start_response):
+            start_response(status, list(headers))
+            return iter(chunks)
+        return app
+
+    @staticmethod
+    def call(app, accept_encoding='gzip'):
+        from werkzeug.test import EnvironBuilder
+        environ = EnvironBuilder(headers={'Accept-Encoding': accept_encoding}).get_environ()
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, dict(headers)
+
+        body = app(environ, start_response)
+        chunks = list(body)
+        return captured['headers'], chunks
+
+    def test_choose_encoding(self):
+        from compression import CompressionMiddleware
+        middleware = CompressionMiddleware(None)
+        assert middleware.choose_encoding('gzip, deflate') == 'gzip'
+        assert middleware.choose_encoding('identity') is None
+        assert middleware.choose_encoding('br;q=0, gzip') == 'gzip'
+        assert middleware.choose_encoding('gzip;q=0.5, *;q=0.1') == 'gzip'
+        assert middleware.choose_encoding('') is None
+        if brotli_available():
+            assert middleware.choose_encoding('gzip, deflate, br') == 'br'
+
+    def test_page_is_gzipped(self, factory_app):
+        import gzip
+        client = factory_app.test_client()
+        plain = client.get('/om-oss')
+        response = client.get('/om-oss', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary'] and 'Cookie' in response.headers['Vary']
+        assert gzip.decompress(response.data) == plain.data
+        assert len(response.data) < len(plain.data) / 3
+        assert 'Content-Encoding' not in plain.headers
+
+    def test_conditional_get_with_weak_etag(self, factory_app):
+        client = factory_app.test_client()
+        response = client.get('/om-oss', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['ETag'].startswith('W/')
+        again = client.get('/om-oss', headers={'Accept-Encoding': 'gzip',
+                                               'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304 and 'Content-Encoding' not in again.headers
+
+    def test_brotli(self, factory_app):
+        brotli = pytest.importorskip('brotli')
+        client = factory_app.test_client()
+        response = client.get('/om-oss', headers={'Accept-Encoding': 'gzip, deflate, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == client.get('/om-oss').data
+
+    def test_skips_small_unknown_and_encoded(self):
+        from compression import CompressionMiddleware, CompressionStats
+        stats = CompressionStats()
+        small = CompressionMiddleware(self.wsgi_app([b'{"ok": true}'], (('Content-Type', 'application/json'),)),
+                                      stats=stats)
+        headers, chunks = self.call(small)
+        assert 'Content-Encoding' not in headers and chunks == [b'{"ok": true}']
+
+        image = CompressionMiddleware(self.wsgi_app([b'x' * 5000], (('Content-Type', 'image/png'),)),
+                                      stats=stats)
+        assert 'Content-Encoding' not in self.call(image)[0]
+
+        precompressed = CompressionMiddleware(self.wsgi_app(
+            [b'x' * 5000], (('Content-Type', 'text/css'), ('Content-Encoding', 'br'))), stats=stats)
+        headers, chunks = self.call(precompressed)
+        assert headers['Content-Encoding'] == 'br' and chunks == [b'x' * 5000]
+        assert stats.snapshot()['skipped'] == {'small': 1, 'type': 1, 'encoded': 1}
+
+    def test_streamed_chunks_are_flushed(self):
+        import zlib
+        from compression import CompressionMiddleware
+        parts = [self.PAGE[i:i + 400] for i in range(0, len(self.PAGE), 400)]
+        middleware = CompressionMiddleware(self.wsgi_app(parts), min_size=500)
+        headers, chunks = self.call(middleware)
+        assert headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in headers
+
+        # Every chunk decodes on its own arrival: nothing waits for the end of the body
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        received = b''
+        for chunk in chunks[:-1]:
+            received += decoder.decompress(chunk)
+        assert received == self.PAGE
+        assert decoder.decompress(chunks[-1]) == b'' and decoder.eof
+
+    def test_body_close_is_called(self):
+        from compression import CompressionMiddleware
+
+        class Body:
+            closed = False
+
+            def __iter__(self):
+                yield TestCompression.PAGE
+
+            def close(self):
+                Body.closed = True
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            return Body()
+
+        self.call(CompressionMiddleware(app))
+        assert Body.closed
+
+    def test_stats(self):
+        from compression import CompressionMiddleware, CompressionStats
+        stats = CompressionStats()
+        middleware = CompressionMiddleware(self.wsgi_app([self.PAGE]), stats=stats)
+        headers, chunks = self.call(middleware)
+        snapshot = stats.snapshot()
+        gzip_stats = snapshot['encodings']['gzip']
+        assert gzip_stats['responses'] == 1
+        assert gzip_stats['bytes_in'] == len(self.PAGE)
+        assert gzip_stats['bytes_out'] == sum(len(chunk) for chunk in chunks)
+        assert 0 < gzip_stats['ratio'] < 0.2
+        assert gzip_stats['cpu_ms'] >= 0
+        assert 'text/html (gzip)' in snapshot['mimetypes']
+
+    def test_admin_compression_stats(self, factory_app):
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin'])
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        client.get('/om-oss', headers={'Accept-Encoding': 'gzip'})
+        data = client.get('/admin/compression-stats').get_json()
+        assert data['encodings']['gzip']['responses'] >= 1
+        assert data['settings']['COMPRESS_GZIP_LEVEL'] == 6
+
+
+
+def make_admin_payment(number, status='PAID', amount='100.00', user=None, minutes=None):
+    """Create a SwishPayment in the factory_app database"""
+    from decimal import Decimal
+    from app import db
+    from models import SwishPayment
+    payment = SwishPayment(
+        id=f'LISTTEST{number:024d}', payee_payment_reference=f'BMK-LIST-{number:05d}',
+        payee_alias='1234567890', amount=Decimal(amount), callback_url='https://example.com/callback',
+        callback_identifier=f'callback-{number}', status=status, user=user,
+        date_created=datetime(2025, 1, 1) + timedelta(minutes=number if minutes is None else minutes))
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+class TestStreaming:
+    """Test the streamed admin listings"""
+
+    def admin_client(self, factory_app):
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin', 'event_manager'])
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        return client, admin
+
+    def test_row_stream(self):
+        from streaming import RowStream
+        assert not RowStream([])
+        assert list(RowStream([])) == []
+        rows = RowStream(iter([1, 2, 3]))
+        assert rows
+        assert list(rows) == [1, 2, 3]
+        assert list(rows) == []  # single pass
+
+    def test_stream_flush_outside_streaming(self, factory_app):
+        from flask import render_template_string
+        with factory_app.test_request_context():
+            assert render_template_string('a{{ stream_flush() }}b') == 'ab'
+
+    def test_header_is_sent_before_rows(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        for number in range(5):
+            make_event(f'Strömkonsert {number}', days_ahead=number + 1)
+        response = client.get('/admin/events', buffered=False)
+        assert response.is_streamed
+        chunks = [chunk.decode() for chunk in response.response]
+        response.close()
+        assert len(chunks) >= 2
+        assert 'Hantera Evenemang' in chunks[0] and 'Strömkonsert' not in chunks[0]
+        page = ''.join(chunks)
+        assert 'stream-flush' not in page
+        assert all(f'Strömkonsert {number}' in page for number in range(5))
+        assert page.index('Strömkonsert 4') < page.index('Strömkonsert 0')  # latest first
+
+    def test_rows_outlive_the_request_session(self, bare_app):
+        """The body is rendered after the view's app context and db.session are torn down"""
+        from app import db
+        from models import Event, Group, User
+        with bare_app.app_context():
+            admin = User(first_name='Admin', last_name='User', email='admin@example.com', active=True)
+            admin.groups = [Group(name='admin'), Group(name='event_manager')]
+            db.session.add(admin)
+            db.session.add_all([Event(title=f'Strömkonsert {number}', is_active=True,
+                                      event_date=datetime.utcnow() + timedelta(days=number + 1))
+                                for number in range(3)])
+            db.session.commit()
+            admin_id = admin.id
+        client = bare_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+        response = client.get('/admin/events')
+        assert response.status_code == 200
+        assert all(f'Strömkonsert {number}' in response.get_data(as_text=True) for number in range(3))
+
+    def test_flashes_are_shown_once(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        with client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Evenemanget har skapats!')]
+        assert 'Evenemanget har skapats!' in client.get('/admin/events').get_data(as_text=True)
+        assert 'Evenemanget har skapats!' not in client.get('/admin/events').get_data(as_text=True)
+        assert 'Evenemanget har skapats!' not in client.get('/om-oss').get_data(as_text=True)
+
+    def test_empty_listing(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        response = client.get('/admin/events')
+        assert response.status_code == 200 and response.is_streamed
+        assert 'Inga evenemang registrerade' in response.get_data(as_text=True)
+
+
+class TestPayments:
+    """Test the keyset-paginated admin payment listing"""
+
+    def admin_client(self, factory_app):
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin'])
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        return client, admin
+
+    @staticmethod
+    def references(page):
+        import re
+        return re.findall(r'<code>(BMK-LIST-\d+)</code>', page)
+
+    @staticmethod
+    def cursor(page, name):
+        import re
+        from html import unescape
+        from urllib.parse import parse_qs, urlsplit
+        links = [unescape(href) for href in re.findall(r'href="([^"]*/admin/payments\?[^"]*)"', page)]
+        values = [parse_qs(urlsplit(link).query).get(name) for link in links]
+        return next((value[0] for value in values if value), None)
+
+    def test_keyset_pages(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        for number in range(7):
+            make_admin_payment(number)
+        make_admin_payment(7, minutes=6)  # same date_created as 6: the id breaks the tie
+
+        first = client.get('/admin/payments?per_page=3').get_data(as_text=True)
+        assert self.references(first) == ['BMK-LIST-00007', 'BMK-LIST-00006', 'BMK-LIST-00005']
+        assert self.cursor(first, 'before') is None
+
+        seen, page = self.references(first), first
+        while self.cursor(page, 'after'):
+            page = client.get('/admin/payments', query_string={
+                'per_page': 3, 'after': self.cursor(page, 'after')}).get_data(as_text=True)
+            seen += self.references(page)
+        assert seen == [f'BMK-LIST-{number:05d}' for number in (7, 6, 5, 4, 3, 2, 1, 0)]
+        assert self.references(page) == ['BMK-LIST-00001', 'BMK-LIST-00000']
+
+        newer = client.get('/admin/payments', query_string={
+            'per_page': 3, 'before': self.cursor(page, 'before')}).get_data(as_text=True)
+        assert self.references(newer) == ['BMK-LIST-00004', 'BMK-LIST-00003', 'BMK-LIST-00002']
+        newest = client.get('/admin/payments', query_string={
+            'per_page': 3, 'before': self.cursor(newer, 'before')}).get_data(as_text=True)
+        assert self.references(newest) == self.references(first)
+        assert self.cursor(newest, 'before') is None
+
+    def test_date_created_is_required(self, factory_app):
+        """The keyset listing seeks on (date_created, id), so it can't be NULL"""
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        payment = make_admin_payment(1)
+        payment.date_created = None
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_malformed_cursor_shows_first_page(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        make_admin_payment(1)
+        for cursor in ('garbage', 'not-a-date|X', ''):
+            page = client.get('/admin/payments', query_string={'after': cursor}).get_data(as_text=True)
+            assert self.references(page) == ['BMK-LIST-00001']
+
+    def test_filters(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        make_admin_payment(1, 'PAID', '50.00')
+        make_admin_payment(2, 'PENDING', '200.00', minutes=60 * 24)
+        make_admin_payment(3, 'PAID', '500.00', minutes=2 * 60 * 24)
+        make_admin_payment(4, 'DECLINED', '100.00', minutes=3 * 60 * 24)
+
+        def listed(**args):
+            response = client.get('/admin/payments', query_string=args)
+            assert response.status_code == 200
+            return self.references(response.get_data(as_text=True))
+
+        assert listed(status='PAID') == ['BMK-LIST-00003', 'BMK-LIST-00001']
+        assert listed(**{'from': '2025-01-02', 'to': '2025-01-03'}) == ['BMK-LIST-00003', 'BMK-LIST-00002']
+        assert listed(min='100', max='200') == ['BMK-LIST-00004', 'BMK-LIST-00002']
+        assert listed(min='100,5') == ['BMK-LIST-00003', 'BMK-LIST-00002']
+        assert listed(status='PAID', min='60') == ['BMK-LIST-00003']
+        assert len(listed(min='abc', to='yesterday')) == 4  # unparseable filters are ignored
+        page = client.get('/admin/payments?status=CANCELLED').get_data(as_text=True)
+        assert 'Inga betalningar matchar filtren' in page
+
+    def test_filters_survive_paging(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        for number in range(6):
+            make_admin_payment(number, 'PAID' if number % 2 else 'PENDING')
+        page = client.get('/admin/payments?status=PAID&per_page=2').get_data(as_text=True)
+        older = client.get('/admin/payments', query_string={
+            'status': 'PAID', 'per_page': 2, 'after': self.cursor(page, 'after')})
+        assert self.references(older.get_data(as_text=True)) == ['BMK-LIST-00001']
+        assert 'status=PAID' in page.split('Äldre')[0].rsplit('href=', 1)[1]
+
+    def test_summary(self, factory_app, count_queries):
+        client, _ = self.admin_client(factory_app)
+        make_admin_payment(1, 'PAID', '100.00')
+        make_admin_payment(2, 'PAID', '250.50')
+        make_admin_payment(3, 'PENDING')
+        make_admin_payment(4, 'DECLINED')
+        make_admin_payment(5, 'ERROR')
+        make_admin_payment(6, 'PAID', '1000.00', minutes=60 * 24)
+
+        def totals(query=''):
+            with count_queries() as counter:
+                page = client.get('/admin/payments' + query).get_data(as_text=True)
+            grouped = [statement for statement in counter.statements if 'GROUP BY' in statement]
+            assert len(grouped) == 1 and 'swish_payment.status' in grouped[0]
+            return [text.split('</h3>')[0].strip() for text in page.split('<h3>')[1:]]
+
+        assert totals() == ['3', '1', '2', '1350 SEK']
+        # The cards cover every status in the date range, whatever the status filter
+        assert totals('?to=2025-01-01&status=PENDING&per_page=1') == ['2', '1', '2', '350 SEK']
+
+    def test_empty_listing(self, factory_app):
+        client, _ = self.admin_client(factory_app)
+        page = client.get('/admin/payments').get_data(as_text=True)
+        assert 'Inga betalningar ännu' in page
+        assert [text.split('</h3>')[0].strip() for text in page.split('<h3>')[1:]] == ['0', '0', '0', '0 SEK']
+
+    def test_query_count_is_constant(self, factory_app, count_queries):
+        """Payments and their users are loaded with the page, not per row"""
+        client, admin = self.admin_client(factory_app)
+        client.get('/admin/payments')
+
+        def counted(**args):
+            with count_queries() as counter:
+                assert client.get('/admin/payments', query_string=args).status_code == 200
+            return counter.count
+
+        make_admin_payment(0, user=admin)
+        payments = counted()
+        for number in range(1, 60):
+            user = make_user(f'user{number}@example.com', roles=['parent'])
+            make_admin_payment(number, user=user)
+        assert counted() == payments
+        page = client.get('/admin/payments').get_data(as_text=True)
+        assert 'user59@example.com' in page and len(self.references(page)) == 50
+        assert counted(after=self.cursor(page, 'after')) == payments
+
+
+class TestUserDirectory:
+    """Test the paginated, searchable admin user directory"""
+
+    def admin_client(self, factory_app):
+        from conftest import login_as
+        admin = make_user('admin@example.com', roles=['admin'])
+        client = factory_app.test_client()
+        login_as(client, admin.id)
+        return client
+
+    @staticmethod
+    def emails(response):
+        import re
+        assert response.status_code == 200
+        return re.findall(r'<td>([^<]+@example\.com)</td>', response.get_data(as_text=True))
+
+    def test_search_and_filters(self, factory_app):
+        from app import db
+        client = self.admin_client(factory_app)
+        anna = make_user('anna.berg@example.com', roles=['parent'])
+        anna.first_name, anna.last_name = 'Anna', 'Berg'
+        make_user('bo@example.com', roles=['event_manager'])
+        make_user('sleeper@example.com', roles=['parent'], active=False)
+        make_user('no_roles@example.com')
+        make_user('no%roles@example.com')
+        db.session.commit()
+
+        assert self.emails(client.get('/admin/users?q=anna berg')) == ['anna.berg@example.com']
+        assert self.emails(client.get('/admin/users?q=BERG@')) == ['anna.berg@example.com']
+        assert self.emails(client.get('/admin/users?q=no%25')) == ['no%roles@example.com']
+        assert self.emails(client.get('/admin/users?q=no_')) == ['no_roles@example.com']
+        assert sorted(self.emails(client.get('/admin/users?role=parent'))) == [
+            'anna.berg@example.com', 'sleeper@example.com']
+        assert self.emails(client.get('/admin/users?role=parent&status=active')) == ['anna.berg@example.com']
+        assert self.emails(client.get('/admin/users?status=inactive')) == ['sleeper@example.com']
+        assert sorted(self.emails(client.get('/admin/users?role=none'))) == [
+            'no%roles@example.com', 'no_roles@example.com']
+        assert 'Inga användare hittades för de valda filtren' in client.get(
+            '/admin/users?q=nobody').get_data(as_text=True)
+
+    def test_pagination(self, factory_app):
+        client = self.admin_client(factory_app)
+        for number in range(30):
+            make_user(f'user{number:02d}@example.com', roles=['parent'])
+        first = client.get('/admin/users?role=parent&per_page=10')
+        assert len(self.emails(first)) == 10
+        page = first.get_data(as_text=True)
+        assert '30 användare' in page
+        assert 'page=3' in page and 'role=parent' in page and 'per_page=10' in page
+        last = self.emails(client.get('/admin/users?role=parent&per_page=10&page=3'))
+        assert len(last) == 10 and not set(last) & set(self.emails(first))
+        assert self.emails(client.get('/admin/users?page=99')) == []
+
+    def test_query_count_is_constant(self, factory_app, count_queries):
+        """Groups come from one selectinload, whatever the page size"""
+        client = self.admin_client(factory_app)
+        for number in range(60):
+            make_user(f'user{number:02d}@example.com', roles=['parent', 'event_manager'][:number % 2 + 1])
+        client.get('/admin/users')
+
+        def counted(per_page):
+            with count_queries() as counter:
+                assert len(self.emails(client.get(f'/admin/users?per_page={per_page}'))) == per_page
+            return counter.count
+
+        assert counted(5) == counted(50)
+
+
+def make_event(title, days_ahead=7, coordinator=None, tasks=0, completed=0):
+    """Create an upcoming Event with tasks in the factory_app database"""
+    from app import db
+    from models import Event, EventTask
+    event = Event(title=title, event_date=datetime.utcnow() + timedelta(days=days_ahead),
+                  is_active=True, coordinator=coordinator)
+    event.tasks = [EventTask(title=f'{title} uppgift {number}', completed=number < completed)
+                   for number in range(tasks)]
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+class TestEventsPage:
+    """Test the /evenemang query plan: coordinators and task counts without N+1"""
+
+    def test_task_counts_and_coordinator(self, factory_app):
+        from conftest import login_as
+        manager = make_user('manager@example.com', roles=['event_manager'])
+        make_event('Vårkonsert', coordinator=manager, tasks=3, completed=1)
+        make_event('Luciakonsert', days_ahead=30)
+        client = factory_app.test_client()
+        login_as(client, manager.id)
+        page = client.get('/evenemang').get_data(as_text=True)
+        assert 'Evenemangskoordinator:</strong> Test User' in page
+        assert '3 uppgifter tillgängliga, 1 slutförda' in page
+        assert 'Hantera uppgifter (3)' in page
+        assert page.count('Hantera uppgifter') == 1
+        assert page.index('Vårkonsert') < page.index('Luciakonsert')
+
+    def test_query_count_is_constant(self, factory_app, count_queries):
+        """The page runs the same queries for 1 event as for 20"""
+        from conftest import login_as
+        manager = make_user('manager@example.com', roles=['event_manager'])
+        client = factory_app.test_client()
+        login_as(client, manager.id)
+        make_event('Event 0', coordinator=manager, tasks=2, completed=1)
+        client.get('/evenemang')
+
+        def counted():
+            with count_queries() as counter:
+                assert client.get('/evenemang').status_code == 200
+            return counter.count
+
+        single = counted()
+        for number in range(1, 20):
+            coordinator = make_user(f'coordinator{number}@example.com', roles=['event_manager'])
+            make_event(f'Event {number}', days_ahead=number, coordinator=coordinator, tasks=3, completed=number % 3)
+        assert counted() == single
+
+
+
+class TestTaskAssignment:
+    """Test the task assignment typeahead on admin_event_tasks"""
+
+    def manager_client(self, factory_app):
+        from conftest import login_as
+        manager = make_user('manager@example.com', roles=['event_manager'])
+        client = factory_app.test_client()
+        login_as(client, manager.id)
+        return client, manager
+
+    def test_user_search(self, factory_app):
+        from app import db
+        client, manager = self.manager_client(factory_app)
+        anna = make_user('anna@example.com', roles=['parent'])
+        anna.first_name, anna.last_name = 'Anna', 'Andersson'
+        make_user('anders@example.com', roles=['parent'], active=False)
+        make_user('andreas@example.com')  # no role: not assignable
+        for number in range(15):
+            make_user(f'parent{number:02d}@example.com', roles=['parent'])
+        db.session.commit()
+
+        def search(query):
+            response = client.get(f'/admin/users/search?{query}')
+            assert response.status_code == 200
+            return [user['email'] for user in response.get_json()['users']]
+
+        assert search('q=and') == ['anna@example.com']
+        assert search('q=anna andersson') == ['anna@example.com']
+        assert search('q=and&exclude=%d' % anna.id) == []
+        assert search('q=a') == []  # too short
+        assert len(search('q=parent')) == 10
+        assert search('q=manager') == ['manager@example.com']
+        assert client.get('/admin/users/search?q=and').get_json()['users'][0] == {
+            'id': anna.id, 'name': 'Anna Andersson', 'email': 'anna@example.com'}
+
+    def test_user_search_requires_task_manager(self, factory_app):
+        from conftest import login_as
+        parent = make_user('parent@example.com', roles=['parent'])
+        client = factory_app.test_client()
+        login_as(client, parent.id)
+        assert client.get('/admin/users/search?q=parent').status_code != 200
+
+    def test_reassign(self, factory_app):
+        from app import db
+        from models import EventTask
+        client, manager = self.manager_client(factory_app)
+        parent = make_user('parent@example.com', roles=['parent'])
+        event = make_event('Vårkonsert', tasks=1)
+        task = event.tasks[0]
+        task.assigned_to = manager
+        db.session.commit()
+
+        page = client.get(f'/admin/events/{event.id}/tasks').get_data(as_text=True)
+        assert 'Tilldelad till Test User' in page
+        assert f'data-exclude="{manager.id}"' in page
+
+        response = client.post(f'/admin/tasks/{task.id}/reassign', data={'new_assignee': parent.id},
+                               follow_redirects=True)
+        assert 'omtilldelad från Test User till Test User' in response.get_data(as_text=True)
+        assert db.session.get(EventTask, task.id).assigned_to_user_id == parent.id
+
+        inactive = make_user('inactive@example.com', roles=['parent'], active=False)
+        client.post(f'/admin/tasks/{task.id}/reassign', data={'new_assignee': inactive.id})
+        assert db.session.get(EventTask, task.id).assigned_to_user_id == parent.id
+
+    def test_page_is_linear_in_tasks(self, factory_app, count_queries):
+        """No per-user markup and no per-task queries"""
+        from app import db
+        client, manager = self.manager_client(factory_app)
+        for number in range(40):
+            make_user(f'parent{number:02d}@example.com', roles=['parent'])
+        event = make_event('Vårkonsert', tasks=2, completed=1)
+        client.get(f'/admin/events/{event.id}/tasks')
+
+        def page():
+            db.session.expire_all()
+            with count_queries() as counter:
+                body = client.get(f'/admin/events/{event.id}/tasks').get_data(as_text=True)
+            return body, counter.count
+
+        small, queries = page()
+        assert 'parent00@example.com' not in small and 'parent00' not in small
+        tasks = make_event('Luciakonsert', tasks=20, completed=5).tasks
+        for number, task in enumerate(tasks):
+            task.event = event
+            task.assigned_to = manager if number % 2 else None
+            task.completed_by = manager if task.completed else None
+        db.session.commit()
+        large, more_queries = page()
+        assert more_queries == queries
+        assert large.count('user-typeahead-input') == 22  # one per open task
+
+
+def _explain_hot_query(name, seed, client):
+    """Run the app code behind one hot query"""
+    from conftest import login_as
+    from models import SwishPayment
+    from utils import create_confirmation_code
+    if name == 'homepage':
+        client.get('/')
+    elif name == 'events':
+        client.get('/evenemang')
+    elif name.startswith('applications'):
+        login_as(client, make_user(f'{name}@example.com', roles=['admin']).id)
+        query = {'applications_status_year': f"?status=offered&year={seed['year']}",
+                 'applications_year': f"?year={seed['year']}",
+                 'applications': ''}[name]
+        client.get('/admin/applications' + query)
+    elif name.startswith('payments'):
+        login_as(client, make_user(f'{name}@example.com', roles=['admin']).id)
+        oldest = SwishPayment.query.order_by(SwishPayment.date_created).first()
+        query = {'payments': {},
+                 'payments_older': {'after': f'{oldest.date_created.isoformat()}|{oldest.id}'},
+                 'payments_status': {'status': 'PENDING'},
+                 'payments_range': {'from': oldest.date_created.date().isoformat(),
+                                    'to': oldest.date_created.date().isoformat(), 'min': 100}}[name]
+        client.get('/admin/payments', query_string=query)
+    elif name == 'pending_payments':
+        SwishPayment.query.filter_by(status='PENDING').all()
+    elif name == 'user_tasks':
+        login_as(client, seed['parent_id'])
+        client.get('/user/tasks')
+    elif name == 'admin_event_tasks':
+        login_as(client, seed['manager_id'])
+        client.get(f"/admin/events/{seed['event_id']}/tasks")
+    elif name == 'task_form':
+        login_as(client, seed['manager_id'])
+        client.get(f"/admin/events/{seed['event_id']}/tasks/new")
+    elif name == 'confirmation_code':
+        create_confirmation_code('seed42@example.com', 'password_reset')
+    elif name == 'confirm_email':
+        code = create_confirmation_code(seed['applicant_email'], 'email_verification').code
+        client.get(f'/confirm-email/{code}')
+
+
+class TestQueryPlans:
+    """
+    Query-plan regression tests: seed realistic volumes, run each hot query
+    through the app and EXPLAIN every filtered or sorted statement it issues.
+    None may read a seeded table without an index, and the index named for
+    the case must be used.
+    """
+
+    HOT_QUERIES = [
+        ('homepage', ['ix_event_active_date', 'ix_news_post_published_date']),
+        ('events', ['ix_event_active_date']),
+        ('applications_status_year', ['ix_application_status_year_created']),
+        ('applications_year', ['ix_application_year_created']),
+        ('applications', ['ix_application_created']),
+        ('payments', ['ix_swish_payment_created_id']),
+        ('payments_older', ['ix_swish_payment_created_id']),
+        ('payments_status', ['ix_swish_payment_status_created_id']),
+        ('payments_range', ['ix_swish_payment_created_id']),
+        ('pending_payments', ['ix_swish_payment_status_created_id']),
+        ('user_tasks', ['ix_event_tasks_assigned_to_user_id']),
+        ('admin_event_tasks', ['ix_event_tasks_event_id']),
+        ('task_form', []),
+        ('confirmation_code', ['ix_confirmation_codes_email_purpose_used']),
+        ('confirm_email', ['ix_application_parent_email']),
+    ]
+    # The assignable-user choice list holds nearly every user, so reading
+    # the whole table is the cheapest plan (and the result is cached)
+    ALLOWED_SCANS = {'task_form': {'users'}}
+
+    @pytest.mark.parametrize('name,indexes', HOT_QUERIES, ids=[case[0] for case in HOT_QUERIES])
+    def test_hot_query_uses_index(self, seeded_app, name, indexes):
+        import re
+        from app import db
+        from conftest import SEED_VOLUMES, QueryCounter, explain, full_scans
+        client = seeded_app.test_client()
+        with QueryCounter(db.engine) as counter:
+            _explain_hot_query(name, seeded_app.config['SEED'], client)
+
+        plans = []
+        connection = db.session.connection()
+        for statement, parameters in zip(counter.statements, counter.parameters):
+            if not re.search(r'\b(WHERE|ORDER BY)\b', statement) or statement.lstrip().startswith('INSERT'):
+                continue
+            plan = explain(connection, statement, parameters)
+            tables = set(SEED_VOLUMES) - self.ALLOWED_SCANS.get(name, set())
+            assert not full_scans(plan, tables), (statement, plan)
+            plans.append('\n'.join(plan))
+        for index in indexes:
+            assert any(index in plan for plan in plans), (index, plans)
+
+
 if __name__ == '__main__':
     # Run tests with pytest
     pytest.main([__file__, '-v'])
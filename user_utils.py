@@ -1,28 +1,76 @@
 """
 Utility functions for user role management and selection
+
+The form choice lists are built by one DISTINCT query each and memoized in
+the 'user_choices' cache namespace. The namespace is cleared by commits that
+change what the lists show: group memberships, User.active, a user's name
+or email, a group's name, or adding or deleting a user or group with
+members. Logins and other user updates leave it alone.
 """
-from models import Group
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from cache import cache
+from models import Group, User
+from permissions import role_mask
+
+USER_CHOICES_NAMESPACE = 'user_choices'
+USER_CHOICES_TTL = 600  # seconds; bounds staleness in other workers (memory backend)
+
+ASSIGNABLE_ROLES = ('parent', 'event_manager', 'admin')
+COORDINATOR_ROLES = ('event_manager', 'admin')
+USER_SEARCH_LIMIT = 10
+
+TASK_MANAGER_ROLES = role_mask(['event_manager', 'admin'])
+TASK_ACCESS_ROLES = role_mask(['parent', 'event_manager', 'admin'])
+
+def _active_users_in_roles(role_names):
+    """
+    Active members of any of the groups, once each, sorted by name:
+    a single join/DISTINCT query returning (id, first_name, last_name, email) rows
+    """
+    from app import db
+    return db.session.execute(
+        select(User.id, User.first_name, User.last_name, User.email)
+        .join(User.groups)
+        .where(Group.name.in_(role_names), User.active == True)
+        .distinct()
+        .order_by(User.first_name, User.last_name, User.id)).all()
 
 def get_assignable_users():
     """
     Get all users who can be assigned tasks (parent, event_manager, or admin)
-    Returns a list of unique active users sorted by name
-    """
-    assignable_users = []
-    for group_name in ['parent', 'event_manager', 'admin']:
-        group = Group.query.filter_by(name=group_name).first()
-        if group:
-            assignable_users.extend([user for user in group.users if user.active])
-    
-    # Remove duplicates (users might have multiple roles)
-    seen_users = set()
-    unique_users = []
-    for user in assignable_users:
-        if user.id not in seen_users:
-            unique_users.append(user)
-            seen_users.add(user.id)
-    
-    return sorted(unique_users, key=lambda u: (u.first_name, u.last_name))
+    Returns rows of active users (id, first_name, last_name, email) sorted by name
+    """
+    return _active_users_in_roles(ASSIGNABLE_ROLES)
+
+def name_or_email_matches(term):
+    """
+    SQL condition: the user's full name or email contains term
+    (case-insensitive, with % and _ matched literally)
+    """
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f'%{escaped}%'
+    full_name = User.first_name + ' ' + User.last_name
+    return or_(full_name.ilike(pattern, escape='\\'), User.email.ilike(pattern, escape='\\'))
+
+def search_assignable_users(term, exclude_id=None, limit=USER_SEARCH_LIMIT):
+    """
+    Active users who can be assigned tasks and match term, for the
+    assignment typeahead. Returns dicts (id, name, email) sorted by name.
+    """
+    from app import db
+    query = select(User.id, User.first_name, User.last_name, User.email).where(
+        User.active == True,
+        User.groups.any(Group.name.in_(ASSIGNABLE_ROLES)),
+        name_or_email_matches(term),
+    )
+    if exclude_id is not None:
+        query = query.where(User.id != exclude_id)
+    rows = db.session.execute(
+        query.order_by(User.first_name, User.last_name, User.id).limit(limit))
+    return [{'id': row.id, 'name': f'{row.first_name} {row.last_name}', 'email': row.email}
+            for row in rows]
 
 def can_manage_tasks(user):
     """
@@ -30,7 +78,7 @@ def can_manage_tasks(user):
     """
     if not user or not user.is_authenticated:
         return False
-    return user.has_role('event_manager') or user.has_role('admin')
+    return bool(user.role_mask & TASK_MANAGER_ROLES)
 
 def can_access_tasks(user):
     """
@@ -38,10 +86,9 @@ def can_access_tasks(user):
     """
     if not user or not user.is_authenticated:
         return False
-    return (user.has_role('parent') or 
-            user.has_role('event_manager') or 
-            user.has_role('admin'))
+    return bool(user.role_mask & TASK_ACCESS_ROLES)
 
+@cache.memoize(USER_CHOICES_NAMESPACE, ttl=USER_CHOICES_TTL)
 def get_user_choices_for_forms():
     """
     Get formatted choices list for form dropdowns
@@ -55,30 +102,55 @@ def get_user_choices_for_forms():
     ])
     return choices
 
+@cache.memoize(USER_CHOICES_NAMESPACE, ttl=USER_CHOICES_TTL)
 def get_event_manager_choices():
     """
     Get event managers for coordinator selection
     Returns list of (id, display_name) tuples for event coordinators
     """
-    coordinators = []
-    for group_name in ['event_manager', 'admin']:
-        group = Group.query.filter_by(name=group_name).first()
-        if group:
-            coordinators.extend([user for user in group.users if user.active])
-    
-    # Remove duplicates
-    seen_users = set()
-    unique_coordinators = []
-    for user in coordinators:
-        if user.id not in seen_users:
-            unique_coordinators.append(user)
-            seen_users.add(user.id)
-    
-    unique_coordinators = sorted(unique_coordinators, key=lambda u: (u.first_name, u.last_name))
-    
     choices = [(0, 'Ingen koordinator vald')]
     choices.extend([
-        (user.id, f"{user.first_name} {user.last_name}") 
-        for user in unique_coordinators
+        (user.id, f"{user.first_name} {user.last_name}")
+        for user in _active_users_in_roles(COORDINATOR_ROLES)
     ])
-    return choices
\ No newline at end of file
+    return choices
+
+
+# Attributes shown in or deciding membership of the choice lists
+_USER_CHOICE_ATTRIBUTES = ('active', 'first_name', 'last_name', 'email', 'groups')
+_GROUP_CHOICE_ATTRIBUTES = ('name', 'users')
+
+
+def _changes_choices(session, obj):
+    if isinstance(obj, User):
+        attributes = _USER_CHOICE_ATTRIBUTES
+    elif isinstance(obj, Group):
+        attributes = _GROUP_CHOICE_ATTRIBUTES
+    else:
+        return False
+    if obj in session.deleted:
+        return True
+    state = inspect(obj)
+    if obj in session.new:
+        # A new user or group only shows up once it has memberships
+        return bool(state.attrs.groups.value if isinstance(obj, User) else state.attrs.users.value)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_user_choice_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if _changes_choices(session, obj):
+            session.info['user_choices_invalidate'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_user_choices(session):
+    if session.info.pop('user_choices_invalidate', False):
+        cache.clear(USER_CHOICES_NAMESPACE)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_choice_changes(session):
+    session.info.pop('user_choices_invalidate', None)
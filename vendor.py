@@ -0,0 +1,540 @@
+"""
+Self-hosted, purged CSS/JS/font bundle
+
+`flask --app main assets vendor` replaces the third-party CDNs in base.html
+(Bootstrap, Font Awesome, Google Fonts) with one locally served bundle:
+
+- the pinned upstream files are downloaded once into instance/vendor_src/
+  (or taken from `--source DIR` for offline builds)
+- Bootstrap and Font Awesome CSS are purged of every rule whose classes no
+  template or script uses, and merged into static/vendor/css/vendor.css
+- the Font Awesome fonts are subset to the icons that survived the purge
+- Playfair Display and Source Sans Pro are self-hosted with
+  `font-display: swap`
+- the Bootstrap JS bundle is copied as is
+
+Run it before `flask assets build`, which fingerprints the bundle and
+rewrites its font URLs. base.html uses the bundle once it exists and falls
+back to the CDN links before that.
+
+Class usage is collected from every word in templates/ and static/js/, plus
+the state classes Bootstrap's JavaScript adds (SAFELIST). Classes built from
+a prefix and a runtime value, like `bg-{{ color }}` or `bg-${type}`, keep
+every `prefix-<word>` rule whose word appears somewhere. A class that is
+only assembled in Python or JavaScript from other pieces must be added to
+SAFELIST. Subsetting needs fontTools and brotli.
+"""
+import os
+import re
+import shutil
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+VENDOR_DIR = 'vendor'
+BUNDLE_CSS = 'vendor/css/vendor.css'
+BUNDLE_JS = 'vendor/js/bootstrap.bundle.min.js'
+
+BOOTSTRAP_VERSION = '5.3.0'
+FONTAWESOME_VERSION = '6.4.0'
+GOOGLE_FONTS_URL = ('https://fonts.googleapis.com/css2?family=Playfair+Display:wght@400;600;700'
+                    '&family=Source+Sans+Pro:wght@300;400;600&display=swap')
+# Swedish text only needs latin; latin-ext covers names from elsewhere in Europe
+FONT_SUBSETS = ('latin', 'latin-ext')
+# Google Fonts only serves woff2 to browsers it recognises
+FONT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+_JSDELIVR = 'https://cdn.jsdelivr.net/npm'
+# Path under the source directory -> pinned upstream URL
+SOURCES = {
+    'bootstrap/bootstrap.min.css': f'{_JSDELIVR}/bootstrap@{BOOTSTRAP_VERSION}/dist/css/bootstrap.min.css',
+    'bootstrap/bootstrap.bundle.min.js': f'{_JSDELIVR}/bootstrap@{BOOTSTRAP_VERSION}/dist/js/bootstrap.bundle.min.js',
+    'fontawesome/css/all.min.css': f'{_JSDELIVR}/@fortawesome/fontawesome-free@{FONTAWESOME_VERSION}/css/all.min.css',
+}
+# Icon fonts are subset from the TrueType files; fontTools can't decode every
+# upstream woff2 (fa-regular-400.woff2 in 6.4.0 fails to load)
+for _name in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400'):
+    SOURCES[f'fontawesome/webfonts/{_name}.ttf'] = \
+        f'{_JSDELIVR}/@fortawesome/fontawesome-free@{FONTAWESOME_VERSION}/webfonts/{_name}.ttf'
+
+# Classes Bootstrap's JavaScript adds at runtime
+SAFELIST = {
+    'active', 'disabled', 'show', 'showing', 'hide', 'fade', 'collapse', 'collapsing',
+    'collapsed', 'collapse-horizontal', 'modal-open', 'modal-backdrop', 'modal-static',
+    'offcanvas-backdrop', 'dropup', 'dropend', 'dropstart', 'dropdown-menu-end',
+    'tooltip', 'tooltip-inner', 'tooltip-arrow', 'bs-tooltip-auto', 'popover',
+    'popover-arrow', 'popover-header', 'popover-body', 'bs-popover-auto',
+    'carousel-item-next', 'carousel-item-prev', 'carousel-item-start', 'carousel-item-end',
+    'pointer-event', 'was-validated', 'is-valid', 'is-invalid',
+}
+
+# At-rules whose blocks contain ordinary rules
+GROUPING_RULES = ('@media', '@supports', '@layer', '@container')
+
+_WORD = re.compile(r'[A-Za-z0-9_-]+')
+_DYNAMIC_PREFIX = re.compile(r'([A-Za-z0-9_-]+)-(?:\{\{|\$\{)')
+_CLASS = re.compile(r'\.((?:\\.|[\w-])+)')
+_ICON_CONTENT = re.compile(r'content:\s*"\\([0-9a-fA-F]{4,6})"')
+_FONT_FAMILY = re.compile(r'font-family:\s*(["\']?)([^;"\']+)\1')
+_FONT_URL = re.compile(r'url\(([^)]+)\)')
+QUOTES = '\'"'
+
+
+# -- CSS parsing ---------------------------------------------------------------
+
+def _skip_string(text, pos):
+    """Position just past the string starting at text[pos]"""
+    quote = text[pos]
+    pos += 1
+    while pos < len(text) and text[pos] != quote:
+        pos += 2 if text[pos] == '\\' else 1
+    return pos + 1
+
+
+def strip_comments(text):
+    """Remove comments; returns (css, license comments) - /*! ... */ are kept aside"""
+    out, licenses, pos = [], [], 0
+    while pos < len(text):
+        char = text[pos]
+        if char in '"\'':
+            end = _skip_string(text, pos)
+            out.append(text[pos:end])
+            pos = end
+        elif text.startswith('/*', pos):
+            end = text.find('*/', pos + 2)
+            end = len(text) if end == -1 else end + 2
+            if text.startswith('/*!', pos):
+                licenses.append(text[pos:end])
+            pos = end
+        else:
+            out.append(char)
+            pos += 1
+    return ''.join(out), licenses
+
+
+def _read_until(text, pos, stops):
+    """Advance to the first stop character outside strings and brackets"""
+    depth = 0
+    while pos < len(text):
+        char = text[pos]
+        if char in '"\'':
+            pos = _skip_string(text, pos)
+            continue
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif depth == 0 and char in stops:
+            return pos
+        pos += 1
+    return pos
+
+
+def _skip_brackets(text, pos):
+    """Position just past the bracketed group opened at text[pos]"""
+    depth = 0
+    while pos < len(text):
+        char = text[pos]
+        if char in '"\'':
+            pos = _skip_string(text, pos)
+            continue
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return pos
+
+
+def _read_block(text, pos):
+    """Body of the block opened at text[pos] ('{'); returns (body, position after '}')"""
+    depth, start = 0, pos + 1
+    while pos < len(text):
+        char = text[pos]
+        if char in '"\'':
+            pos = _skip_string(text, pos)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:pos], pos + 1
+        pos += 1
+    return text[start:], pos
+
+
+def parse_css(text):
+    """Comment-free CSS to nodes: ('rule', prelude, body), ('group', prelude, nodes)
+    or ('statement', prelude)"""
+    nodes, pos = [], 0
+    while pos < len(text):
+        end = _read_until(text, pos, '{;}')
+        prelude = text[pos:end].strip()
+        if end >= len(text) or text[end] == '}':
+            pos = end + 1
+            continue
+        if text[end] == ';':
+            if prelude:
+                nodes.append(('statement', prelude))
+            pos = end + 1
+            continue
+        body, pos = _read_block(text, end)
+        if prelude.lower().startswith(GROUPING_RULES):
+            nodes.append(('group', prelude, parse_css(body)))
+        else:
+            nodes.append(('rule', prelude, body.strip()))
+    return nodes
+
+
+def serialize_css(nodes):
+    parts = []
+    for node in nodes:
+        if node[0] == 'statement':
+            parts.append(f'{node[1]};')
+        elif node[0] == 'group':
+            parts.append(f'{node[1]}{{{serialize_css(node[2])}}}')
+        else:
+            parts.append(f'{node[1]}{{{node[2]}}}')
+    return ''.join(parts)
+
+
+def split_selectors(prelude):
+    """Split a selector list on its top-level commas"""
+    selectors, pos, start = [], 0, 0
+    while pos <= len(prelude):
+        end = _read_until(prelude, pos, ',')
+        selectors.append(prelude[start:end].strip())
+        pos = start = end + 1
+    return [selector for selector in selectors if selector]
+
+
+def selector_classes(selector):
+    """Classes a selector needs to match, ignoring functional pseudo-classes and attributes"""
+    # :not(.x), :is(.a, .b), ... can match without the classes they mention
+    plain, pos = [], 0
+    while pos < len(selector):
+        char = selector[pos]
+        if char in '"\'':
+            pos = _skip_string(selector, pos)
+        elif char in '([':
+            pos = _skip_brackets(selector, pos)
+        else:
+            plain.append(char)
+            pos += 1
+    return {re.sub(r'\\(.)', r'\1', name) for name in _CLASS.findall(''.join(plain))}
+
+
+# -- usage scan ----------------------------------------------------------------
+
+class ClassUsage:
+    """Words used by templates and scripts, and the prefixes of runtime-built classes"""
+
+    def __init__(self, words=(), dynamic_prefixes=()):
+        self.words = set(words) | SAFELIST
+        self.dynamic_prefixes = set(dynamic_prefixes)
+
+    @classmethod
+    def scan(cls, paths):
+        usage = cls()
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            usage.words.update(_WORD.findall(text))
+            usage.dynamic_prefixes.update(_DYNAMIC_PREFIX.findall(text))
+        return usage
+
+    def uses(self, name):
+        if name in self.words:
+            return True
+        return any(name.startswith(prefix + '-') and name[len(prefix) + 1:] in self.words
+                   for prefix in self.dynamic_prefixes)
+
+
+def usage_sources(app):
+    """Template and script files whose class names the bundle has to keep"""
+    roots = [os.path.join(app.root_path, app.template_folder),
+             os.path.join(app.static_folder, 'js')]
+    for root in roots:
+        for directory, _, files in os.walk(root):
+            for name in sorted(files):
+                if name.endswith(('.html', '.js')):
+                    yield os.path.join(directory, name)
+
+
+# -- purging -------------------------------------------------------------------
+
+def _purge_nodes(nodes, usage):
+    kept = []
+    for node in nodes:
+        if node[0] == 'group':
+            children = _purge_nodes(node[2], usage)
+            if children:
+                kept.append(('group', node[1], children))
+        elif node[0] == 'rule' and not node[1].startswith('@'):
+            selectors = [selector for selector in split_selectors(node[1])
+                         if all(usage.uses(name) for name in selector_classes(selector))]
+            if selectors:
+                kept.append(('rule', ','.join(selectors), node[2]))
+        elif node[0] == 'statement' and node[1].lower().startswith('@charset'):
+            continue  # only valid at the very start of a file; bundles are served as UTF-8
+        else:
+            kept.append(node)
+    return kept
+
+
+def _declarations(nodes):
+    """Declaration text of all ordinary rules, used to find referenced fonts and animations"""
+    parts = []
+    for node in nodes:
+        if node[0] == 'group':
+            parts.append(_declarations(node[2]))
+        elif node[0] == 'rule' and not node[1].startswith('@'):
+            parts.append(node[2])
+    return ' '.join(parts)
+
+
+def _drop_unreferenced(nodes, declarations):
+    kept = []
+    for node in nodes:
+        if node[0] == 'group':
+            node = ('group', node[1], _drop_unreferenced(node[2], declarations))
+            if not node[2]:
+                continue
+        elif node[0] == 'rule' and node[1].lower().startswith('@keyframes'):
+            name = node[1].split(None, 1)[1].strip()
+            if not re.search(rf'(?<![\w-]){re.escape(name)}(?![\w-])', declarations):
+                continue
+        elif node[0] == 'rule' and node[1].lower() == '@font-face':
+            family = _FONT_FAMILY.search(node[2])
+            if family and family.group(2).strip() not in declarations:
+                continue
+        kept.append(node)
+    return kept
+
+
+def purge_css(text, usage):
+    """Drop rules no used class can match, then unused @font-face and @keyframes"""
+    css, licenses = strip_comments(text)
+    nodes = _purge_nodes(parse_css(css), usage)
+    nodes = _drop_unreferenced(nodes, _declarations(nodes))
+    return '\n'.join(licenses + [serialize_css(nodes)])
+
+
+def strip_font_fallbacks(css):
+    """Keep only the woff2 source of each @font-face; every supported browser reads it"""
+    return re.sub(r',\s*url\([^)]*\)\s*format\(["\']?(?:truetype|woff|embedded-opentype|svg)["\']?\)',
+                  '', css)
+
+
+def icon_codepoints(css):
+    """Codepoints of the icon glyphs a Font Awesome stylesheet still refers to"""
+    return {int(value, 16) for value in _ICON_CONTENT.findall(css)}
+
+
+def _font_faces(css):
+    """(font URL, @font-face rule) for every face in a stylesheet"""
+    faces = []
+    for match in re.finditer(r'@font-face\s*\{[^}]*\}', css):
+        url = _FONT_URL.search(match.group(0))
+        if url:
+            faces.append((url.group(1).strip(QUOTES), match.group(0)))
+    return faces
+
+
+def subset_font(source, target, codepoints):
+    """Write a woff2 subset with the given codepoints; returns False if none are in the font"""
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    font = TTFont(source)
+    available = set(font.getBestCmap()) & set(codepoints)
+    if not available:
+        return False
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = []
+    options.name_IDs = ['*']
+    options.notdef_outline = True
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=available)
+    subsetter.subset(font)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    font.flavor = 'woff2'
+    font.save(target)
+    return True
+
+
+# -- fetching ------------------------------------------------------------------
+
+def _font_file_name(face):
+    family = _FONT_FAMILY.search(face).group(2).strip().lower().replace(' ', '-')
+    weight = re.search(r'font-weight:\s*(\d+)', face)
+    style = re.search(r'font-style:\s*(\w+)', face)
+    return '-'.join([family, weight.group(1) if weight else '400', style.group(1) if style else 'normal'])
+
+
+def localize_font_css(css):
+    """Keep the FONT_SUBSETS faces of a Google Fonts stylesheet with local file names.
+
+    Returns (stylesheet, {local name: remote URL})."""
+    faces, downloads = [], {}
+    for subset_name, face in re.findall(r'/\*\s*([\w-]+)\s*\*/\s*(@font-face\s*\{[^}]*\})', css):
+        if subset_name not in FONT_SUBSETS:
+            continue
+        url = _FONT_URL.search(face).group(1).strip(QUOTES)
+        name = f'{_font_file_name(face)}-{subset_name}.woff2'
+        downloads[name] = url
+        face = face.replace(url, name)
+        if 'font-display' in face:
+            face = re.sub(r'font-display:\s*\w+', 'font-display: swap', face)
+        else:
+            face = face.replace('{', '{\n  font-display: swap;', 1)
+        faces.append(f'/* {subset_name} */\n{face}')
+    return '\n'.join(faces) + '\n', downloads
+
+
+def missing_sources(source_dir):
+    """Upstream files a build needs that are not in source_dir"""
+    needed = list(SOURCES) + [os.path.join('fonts', 'fonts.css')]
+    return [relative for relative in needed if not os.path.exists(os.path.join(source_dir, relative))]
+
+
+def fetch_sources(source_dir, session=None, force=False):
+    """Download the pinned upstream files that are not in source_dir yet; returns their paths"""
+    import requests
+    session = session or requests.Session()
+    fetched = []
+
+    def download(relative, url, headers=None):
+        target = os.path.join(source_dir, relative)
+        if os.path.exists(target) and not force:
+            return target
+        response = session.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(response.content)
+        fetched.append(relative)
+        return target
+
+    for relative, url in SOURCES.items():
+        download(relative, url)
+
+    fonts_css = os.path.join(source_dir, 'fonts', 'fonts.css')
+    if not os.path.exists(fonts_css) or force:
+        response = session.get(GOOGLE_FONTS_URL, headers={'User-Agent': FONT_USER_AGENT}, timeout=30)
+        response.raise_for_status()
+        css, downloads = localize_font_css(response.text)
+        for name, url in downloads.items():
+            download(f'fonts/{name}', url)
+        with open(fonts_css, 'w') as f:
+            f.write(css)
+        fetched.append('fonts/fonts.css')
+    return fetched
+
+
+# -- building ------------------------------------------------------------------
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def build_vendor(static_folder, source_dir, usage):
+    """Write the purged bundle into static/vendor; returns size statistics"""
+    output_dir = os.path.join(static_folder, VENDOR_DIR)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(os.path.join(output_dir, 'css'))
+    stats = {'css_before': 0, 'fonts_before': 0, 'fonts_after': 0}
+
+    # Text fonts: every face is kept, files sit next to the stylesheet's fonts/ dir
+    fonts_css = _read(os.path.join(source_dir, 'fonts', 'fonts.css'))
+    stats['css_before'] += len(fonts_css)
+    for url, _ in _font_faces(fonts_css):
+        source = os.path.join(source_dir, 'fonts', url)
+        target = os.path.join(output_dir, 'fonts', url)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source, target)
+        stats['fonts_before'] += os.path.getsize(source)
+        stats['fonts_after'] += os.path.getsize(target)
+    fonts_css = _FONT_URL.sub(lambda match: f"url(../fonts/{match.group(1).strip(QUOTES)})", fonts_css)
+
+    bootstrap_css = _read(os.path.join(source_dir, 'bootstrap', 'bootstrap.min.css'))
+    stats['css_before'] += len(bootstrap_css)
+    bootstrap_css = purge_css(bootstrap_css, usage)
+
+    # Icons: purge first, then subset each font to the icons that are left
+    icons_css = _read(os.path.join(source_dir, 'fontawesome', 'css', 'all.min.css'))
+    stats['css_before'] += len(icons_css)
+    icons_css = strip_font_fallbacks(purge_css(icons_css, usage))
+    codepoints = icon_codepoints(icons_css)
+    for url, face in _font_faces(icons_css):
+        name = os.path.basename(url)
+        source = os.path.join(source_dir, 'fontawesome', 'webfonts', os.path.splitext(name)[0] + '.ttf')
+        target = os.path.join(output_dir, 'webfonts', name)
+        if not os.path.exists(target):
+            if not os.path.exists(source) or not subset_font(source, target, codepoints):
+                icons_css = icons_css.replace(face, '')
+                continue
+            stats['fonts_before'] += os.path.getsize(source)
+            stats['fonts_after'] += os.path.getsize(target)
+    stats['icons'] = len(codepoints)
+
+    bundle = '\n'.join([fonts_css, bootstrap_css, icons_css])
+    with open(os.path.join(static_folder, BUNDLE_CSS), 'w', encoding='utf-8') as f:
+        f.write(bundle)
+    stats['css_after'] = len(bundle)
+
+    os.makedirs(os.path.dirname(os.path.join(static_folder, BUNDLE_JS)))
+    shutil.copyfile(os.path.join(source_dir, 'bootstrap', 'bootstrap.bundle.min.js'),
+                    os.path.join(static_folder, BUNDLE_JS))
+    return stats
+
+
+def vendor_bundle_built(app):
+    return os.path.isfile(os.path.join(app.static_folder, BUNDLE_CSS))
+
+
+def init_vendor(app):
+    """Tell base.html whether to use the local bundle or the CDNs"""
+    app.add_template_global(vendor_bundle_built(app), 'vendor_bundle')
+
+
+def _kb(size):
+    return f'{size / 1024:.0f} KB'
+
+
+@click.command('vendor')
+@click.option('--source', 'source_dir', type=click.Path(file_okay=False), default=None,
+              help='Directory with the upstream files (default: instance/vendor_src, fetched when missing)')
+@click.option('--offline', is_flag=True, help='Do not download missing upstream files')
+@with_appcontext
+def vendor_command(source_dir, offline):
+    """Build the self-hosted Bootstrap/Font Awesome/font bundle into static/vendor"""
+    import requests
+    source_dir = source_dir or os.path.join(current_app.instance_path, 'vendor_src')
+    if not offline:
+        try:
+            fetched = fetch_sources(source_dir)
+        except requests.RequestException as exc:
+            raise click.ClickException(
+                f'Downloading the upstream files into {source_dir} failed: {exc}\n'
+                'jsDelivr or Google Fonts may be unreachable. Retry later, or build from a '
+                'copy of the files with --source DIR --offline.')
+        for relative in fetched:
+            click.echo(f'Downloaded {relative}')
+    missing = missing_sources(source_dir)
+    if missing:
+        raise click.ClickException(f"Missing in {source_dir}: {', '.join(missing)}. "
+                                   'Run without --offline to download them.')
+    usage = ClassUsage.scan(usage_sources(current_app))
+    stats = build_vendor(current_app.static_folder, source_dir, usage)
+    click.echo(f"CSS: {_kb(stats['css_before'])} -> {_kb(stats['css_after'])}; "
+               f"fonts: {_kb(stats['fonts_before'])} -> {_kb(stats['fonts_after'])} "
+               f"({stats['icons']} icons)")
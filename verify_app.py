@@ -4,7 +4,9 @@ Quick verification script to test critical application functionality
 Prevents server crashes and template errors
 """
 import sys
-from app import app
+from app import create_app
+
+app = create_app()
 
 def test_critical_routes():
     """Test that critical routes don't crash"""
@@ -0,0 +1,89 @@
+"""
+Startup warmup for production workers
+
+gunicorn_config.py preloads the app in the gunicorn master and calls
+warmup_master() before any worker is forked, so the compiled templates and
+primed caches are shared copy-on-write by every worker instead of being built
+again on each worker's first requests. Database connections can't be shared
+across fork(), so each worker opens its own pooled connection in
+warmup_worker() before it starts accepting requests.
+"""
+import logging
+import time
+
+from sqlalchemy import text
+
+from instagram import start_feed_refresher
+from template_cache import compile_templates
+
+warmup_log = logging.getLogger('warmup')
+
+
+def prime_caches(app):
+    """Fill the caches that would otherwise be built on the first requests"""
+    from sqlalchemy.exc import SQLAlchemyError
+    from app import db
+    from homepage import get_homepage_data
+    from passwords import dummy_verify
+    from user_utils import get_event_manager_choices, get_user_choices_for_forms
+    with app.app_context():
+        # Builds the dummy hash used for logins with unknown emails
+        dummy_verify('warmup')
+        try:
+            get_homepage_data()
+            get_user_choices_for_forms()
+            get_event_manager_choices()
+        except SQLAlchemyError:
+            # A database that isn't reachable yet only costs the first requests
+            warmup_log.warning("Could not prime the database-backed caches", exc_info=True)
+        finally:
+            db.session.remove()
+            # Don't hand the connections opened here down to the workers
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def open_db_connections(app):
+    """Check out and return one connection per engine so each pool holds one"""
+    from app import db
+    with app.app_context():
+        engines = dict(db.engines)
+    for engine in engines.values():
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    return len(engines)
+
+
+def reset_db_pools(app):
+    """Forget connections inherited from the parent process (after fork)"""
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def _timed(timings, step, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def warmup_master(app):
+    """Warm everything that fork() can share; returns step timings in ms"""
+    timings = {}
+    templates = _timed(timings, 'templates', compile_templates, app)
+    _timed(timings, 'caches', prime_caches, app)
+    warmup_log.info("Master warmup done", extra={'templates': templates, 'timings_ms': timings})
+    return timings
+
+
+def warmup_worker(app):
+    """Per-worker warmup after fork; returns step timings in ms"""
+    timings = {}
+    reset_db_pools(app)
+    engines = _timed(timings, 'db_connect', open_db_connections, app)
+    # Threads don't survive fork(), so each worker runs its own refresher
+    start_feed_refresher(app)
+    warmup_log.info("Worker warmup done", extra={'engines': engines, 'timings_ms': timings})
+    return timings